@@ -0,0 +1,73 @@
+"""
+Access control for the advisories of protected TLPs: every TLP but the public ones, TLP:CLEAR, TLP:GREEN and
+TLP:WHITE unless configured otherwise, so that e.g. 'amber+strict' and 'unlabeled' are protected, too.
+
+A request for a protected TLP is let through if it carries the credentials of one of the configured basic auth
+users, or if the client presented one of the configured certificates during the TLS handshake. The server only
+asks for client certificates when started with --client-ca, and only the gunicorn and werkzeug backends pass
+them on to the app: the ASGI servers do not expose them.
+
+Both checks are cheap enough to not slow down bulk downloads: accepted Authorization headers are computed once
+per configuration, and a client certificate is fingerprinted once per connection.
+"""
+
+import base64
+import functools
+import hashlib
+import ssl
+import threading
+import weakref
+
+
+PUBLIC_TLPS = ('clear', 'green', 'white')
+
+
+def basic_authorizations(users: dict[str, str]) -> frozenset[str]:
+    """The Authorization header values of the users, so that checking a request is a single set lookup."""
+    return frozenset(
+        'Basic ' + base64.b64encode(f'{user}:{password}'.encode('utf-8')).decode('ascii')
+        for user, password in users.items()
+    )
+
+
+def normalize_fingerprint(fingerprint: str) -> str:
+    """Turn 'AB:CD:...' or 'abcd...' into 'abcd...'. Raises ValueError unless it is a SHA-256 fingerprint."""
+    normalized = fingerprint.replace(':', '').lower()
+    if len(normalized) != 64 or any(c not in '0123456789abcdef' for c in normalized):
+        raise ValueError(f"not a SHA-256 fingerprint: {fingerprint!r}")
+    return normalized
+
+
+@functools.lru_cache(maxsize=1024)
+def _pem_fingerprint(pem: str) -> str:
+    return hashlib.sha256(ssl.PEM_cert_to_DER_cert(pem)).hexdigest()
+
+
+# Fingerprint of the certificate presented on each gunicorn connection, dropped along with the connection.
+_connection_fingerprints = weakref.WeakKeyDictionary()
+_connection_fingerprints_lock = threading.Lock()
+
+
+def client_fingerprint(environ: dict) -> str | None:
+    """SHA-256 fingerprint of the certificate the client presented, if any."""
+    pem = environ.get('SSL_CLIENT_CERT')
+    if pem:
+        # Set by the werkzeug server.
+        return _pem_fingerprint(pem)
+    sock = environ.get('gunicorn.socket')
+    if not isinstance(sock, ssl.SSLSocket):
+        return None
+    with _connection_fingerprints_lock:
+        if sock in _connection_fingerprints:
+            return _connection_fingerprints[sock]
+    certificate = sock.getpeercert(binary_form=True)
+    fingerprint = hashlib.sha256(certificate).hexdigest() if certificate else None
+    with _connection_fingerprints_lock:
+        _connection_fingerprints[sock] = fingerprint
+    return fingerprint
+
+
+def is_authorized(environ: dict, authorizations: frozenset[str], fingerprints: frozenset[str]) -> bool:
+    if environ.get('HTTP_AUTHORIZATION') in authorizations:
+        return True
+    return bool(fingerprints) and client_fingerprint(environ) in fingerprints
@@ -0,0 +1,198 @@
+"""
+ASGI variant of the server, for clients that hold hundreds or thousands of concurrent keep-alive connections.
+
+Requests are handled by the very same Flask app as in server.py, so routes, hooks and /config behave
+identically. Only producing the response headers occupies a thread. Bodies are sent asynchronously,
+and file reads and body generation are handed to the thread pool one chunk at a time, so an idle or
+slow connection costs a coroutine rather than a thread.
+
+Runs with `--backend uvicorn`, or with any ASGI server, e.g. `uvicorn fake_csaf_provider.asgi:app`.
+"""
+
+import asyncio
+import concurrent.futures
+import io
+import sys
+import time
+from werkzeug.wsgi import FileWrapper
+
+from .consts import corpus_poll_interval_seconds
+from .faults import ENVIRON_KEY as FAULT_ENVIRON_KEY, HANDLED_KEY as FAULTS_HANDLED_KEY, THROTTLE_PIECE, Fault, draw_fault, truncated_length
+from .providers import route_request
+from .server import app as flask_app
+from .state import get_corpus_version, get_fault_rules, get_provider_names, initialize_corpus
+from .watcher import start_corpus_watcher
+
+
+# Advisories are read and sent in chunks of this size.
+CHUNK_SIZE = 64 * 1024
+# Threads for handling requests up to their headers, and for reading body chunks.
+THREADS = 32
+
+_executor = concurrent.futures.ThreadPoolExecutor(max_workers=THREADS, thread_name_prefix='asgi')
+
+
+class AsyncFileWrapper(FileWrapper):
+    """Used as wsgi.file_wrapper, so that file responses are recognised and read chunk by chunk off the event loop."""
+
+
+def _environ(scope: dict, body: bytes) -> dict:
+    server = scope.get('server') or ('localhost', 443)
+    client = scope.get('client') or ('', 0)
+    environ = {
+        'REQUEST_METHOD': scope['method'],
+        'SCRIPT_NAME': scope.get('root_path', '').encode('utf-8').decode('latin-1'),
+        'PATH_INFO': scope['path'].encode('utf-8').decode('latin-1'),
+        'QUERY_STRING': scope['query_string'].decode('latin-1'),
+        'SERVER_NAME': server[0],
+        'SERVER_PORT': str(server[1]),
+        'SERVER_PROTOCOL': f"HTTP/{scope['http_version']}",
+        'REMOTE_ADDR': client[0],
+        'REMOTE_PORT': str(client[1]),
+        'wsgi.version': (1, 0),
+        'wsgi.url_scheme': scope.get('scheme', 'https'),
+        'wsgi.input': io.BytesIO(body),
+        'wsgi.errors': sys.stderr,
+        'wsgi.multithread': True,
+        'wsgi.multiprocess': False,
+        'wsgi.run_once': False,
+        'wsgi.file_wrapper': AsyncFileWrapper,
+        FAULTS_HANDLED_KEY: True,
+    }
+    for name, value in scope['headers']:
+        key = name.decode('latin-1').upper().replace('-', '_')
+        if key not in ('CONTENT_TYPE', 'CONTENT_LENGTH'):
+            key = f'HTTP_{key}'
+        value = value.decode('latin-1')
+        environ[key] = f'{environ[key]},{value}' if key in environ else value
+    return environ
+
+
+def _handle(environ: dict) -> tuple[str, list, object]:
+    started = []
+
+    def start_response(status, headers, exc_info=None):
+        started[:] = [status, headers]
+
+    body = flask_app.wsgi_app(environ, start_response)
+    return started[0], started[1], body
+
+
+async def _read_body(receive) -> bytes:
+    chunks = []
+    while True:
+        message = await receive()
+        if message['type'] == 'http.disconnect':
+            return b''.join(chunks)
+        chunks.append(message.get('body', b''))
+        if not message.get('more_body'):
+            return b''.join(chunks)
+
+
+async def _watch_disconnect(receive, disconnected: asyncio.Event):
+    while (await receive())['type'] != 'http.disconnect':
+        pass
+    disconnected.set()
+
+
+class _Sender:
+    """Sends body chunks in slices, applying the bandwidth cap and truncation of an injected fault with asyncio."""
+
+    def __init__(self, send, fault: Fault | None, headers: list):
+        self.send = send
+        self.bandwidth = fault.bandwidth if fault else 0
+        self.limit = truncated_length(fault, headers) if fault else None
+        self.piece = THROTTLE_PIECE if self.bandwidth else CHUNK_SIZE
+        self.sent = 0
+        self.began = time.monotonic()
+
+    async def __call__(self, chunk: bytes) -> bool:
+        """Send the chunk. Returns False once the body has been cut off."""
+        # Sending large chunks in slices lets the server apply backpressure, rather than buffer
+        # a whole copy of a large feed for every slow connection.
+        for start in range(0, len(chunk), self.piece):
+            piece = chunk[start:start + self.piece]
+            if self.limit is not None and self.sent + len(piece) > self.limit:
+                await self.send({'type': 'http.response.body', 'body': piece[:self.limit - self.sent], 'more_body': True})
+                return False
+            if self.bandwidth:
+                # Hold each piece back until the cap allows for it to have arrived.
+                ahead = (self.sent + len(piece)) / self.bandwidth - (time.monotonic() - self.began)
+                if ahead > 0:
+                    await asyncio.sleep(ahead)
+            await self.send({'type': 'http.response.body', 'body': piece, 'more_body': True})
+            self.sent += len(piece)
+        return True
+
+
+async def _send_body(body, sender: _Sender, disconnected: asyncio.Event) -> bool:
+    """Send the whole body. Returns False if it was cut off."""
+    loop = asyncio.get_running_loop()
+    if isinstance(body, AsyncFileWrapper):
+        read = body.file.read
+        next_chunk = lambda: read(CHUNK_SIZE)
+    else:
+        iterator = iter(body)
+        next_chunk = lambda: next(iterator, b'')
+    while not disconnected.is_set():
+        chunk = await loop.run_in_executor(_executor, next_chunk)
+        if not chunk:
+            return True
+        if not await sender(chunk):
+            return False
+    return True
+
+
+async def _http(scope, receive, send):
+    loop = asyncio.get_running_loop()
+    environ = _environ(scope, await _read_body(receive))
+    # Requests for unknown providers are left unrouted, and answered with 404 by the app's middleware.
+    fault = draw_fault(environ['PATH_INFO'], get_fault_rules(environ)) if route_request(environ, get_provider_names()) else None
+    if fault:
+        environ[FAULT_ENVIRON_KEY] = fault
+        if fault.delay:
+            await asyncio.sleep(fault.delay)
+        if fault.reset:
+            # ASGI cannot drop a connection before the response starts. Returning right after its start
+            # makes the server close the connection, so the client receives no more than a status line.
+            await send({'type': 'http.response.start', 'status': 200, 'headers': []})
+            return
+    status, headers, body = await loop.run_in_executor(_executor, _handle, environ)
+    disconnected = asyncio.Event()
+    watcher = asyncio.create_task(_watch_disconnect(receive, disconnected))
+    try:
+        await send({
+            'type': 'http.response.start',
+            'status': int(status.split(' ', 1)[0]),
+            # The ASGI server adds its own Date header.
+            'headers': [(name.lower().encode('latin-1'), value.encode('latin-1')) for name, value in headers if name.lower() != 'date'],
+        })
+        # A truncated body is never completed, which makes the server close the connection.
+        if await _send_body(body, _Sender(send, fault, headers), disconnected):
+            await send({'type': 'http.response.body', 'body': b'', 'more_body': False})
+    finally:
+        watcher.cancel()
+        close = getattr(body, 'close', None)
+        if close:
+            close()
+
+
+async def _lifespan(receive, send):
+    while True:
+        message = await receive()
+        if message['type'] == 'lifespan.startup':
+            # When not started via main.py, which has already indexed the corpus.
+            if get_corpus_version() == 0:
+                await asyncio.get_running_loop().run_in_executor(_executor, initialize_corpus)
+                start_corpus_watcher(corpus_poll_interval_seconds)
+            await send({'type': 'lifespan.startup.complete'})
+        elif message['type'] == 'lifespan.shutdown':
+            await send({'type': 'lifespan.shutdown.complete'})
+            return
+
+
+async def app(scope, receive, send):
+    if scope['type'] == 'http':
+        await _http(scope, receive, send)
+    elif scope['type'] == 'lifespan':
+        await _lifespan(receive, send)
@@ -0,0 +1,107 @@
+import ctypes
+import json
+import multiprocessing
+import os
+import sqlite3
+import threading
+from contextlib import closing
+from pathlib import Path
+
+from .ratelimit import RateLimitStore
+
+
+# How many rate-limit checks a process performs between purges of idle clients from the shared store.
+EVICTION_INTERVAL = 1024
+
+
+class InMemoryBackend:
+    """Keeps configuration and rate-limit bookkeeping in module memory, visible to one process only."""
+
+    def __init__(self):
+        self._config: dict = {}
+        self._version = 0
+        self._config_lock = threading.Lock()
+        self._rate_limits = RateLimitStore()
+
+    def config_version(self) -> int:
+        return self._version
+
+    def load_config(self) -> dict:
+        with self._config_lock:
+            return dict(self._config)
+
+    def publish_config(self, config: dict):
+        with self._config_lock:
+            self._config = dict(config)
+            self._version += 1
+
+    def hit_rate_limit(self, client: str, algorithm, now: float, limit: int, period: float):
+        return self._rate_limits.hit(client, algorithm, now, limit, period)
+
+    def clear_rate_limits(self):
+        self._rate_limits.clear()
+
+
+class SharedBackend:
+    """Shares configuration and rate-limit bookkeeping between worker processes.
+
+    Must be created before the workers are forked. The configuration lives in a SQLite file,
+    while its version is a counter in anonymous shared memory. Checking whether the configuration
+    changed is therefore a plain memory read, and SQLite is only queried after a change.
+    """
+
+    def __init__(self, path: Path):
+        self._path = path
+        self._generation = multiprocessing.RawValue(ctypes.c_uint64, 0)
+        self._local = threading.local()
+        self._hits_since_eviction = 0
+        with closing(sqlite3.connect(self._path, isolation_level=None)) as connection:
+            connection.execute("PRAGMA journal_mode=WAL")
+            connection.execute("CREATE TABLE IF NOT EXISTS config (id INTEGER PRIMARY KEY CHECK (id = 0), version INTEGER, json TEXT)")
+            connection.execute("INSERT OR IGNORE INTO config VALUES (0, 0, '{}')")
+            connection.execute("CREATE TABLE IF NOT EXISTS rate_limits (client TEXT PRIMARY KEY, last_seen REAL, state TEXT)")
+
+    def _connect(self) -> sqlite3.Connection:
+        # Connections must neither be shared between threads nor survive a fork.
+        connection = getattr(self._local, 'connection', None)
+        if connection is None or self._local.pid != os.getpid():
+            connection = sqlite3.connect(self._path, timeout=10, isolation_level=None)
+            connection.execute("PRAGMA busy_timeout=10000")
+            self._local.connection = connection
+            self._local.pid = os.getpid()
+        return connection
+
+    def config_version(self) -> int:
+        return self._generation.value
+
+    def load_config(self) -> dict:
+        row = self._connect().execute("SELECT json FROM config WHERE id = 0").fetchone()
+        return json.loads(row[0])
+
+    def publish_config(self, config: dict):
+        connection = self._connect()
+        row = connection.execute(
+            "UPDATE config SET version = version + 1, json = ? WHERE id = 0 RETURNING version",
+            (json.dumps(config),),
+        ).fetchone()
+        self._generation.value = row[0]
+
+    def hit_rate_limit(self, client: str, algorithm, now: float, limit: int, period: float):
+        connection = self._connect()
+        connection.execute("BEGIN IMMEDIATE")
+        try:
+            row = connection.execute("SELECT state FROM rate_limits WHERE client = ? AND last_seen > ?", (client, now - period)).fetchone()
+            state, allowed, remaining, reset = algorithm(json.loads(row[0]) if row else None, now, limit, period)
+            connection.execute("INSERT OR REPLACE INTO rate_limits VALUES (?, ?, ?)", (client, now, json.dumps(list(state))))
+            self._hits_since_eviction += 1
+            if self._hits_since_eviction >= EVICTION_INTERVAL:
+                self._hits_since_eviction = 0
+                connection.execute("DELETE FROM rate_limits WHERE last_seen <= ?", (now - period,))
+            connection.execute("COMMIT")
+        except BaseException:
+            connection.execute("ROLLBACK")
+            raise
+        return allowed, remaining, reset
+
+    def clear_rate_limits(self):
+        self._connect().execute("DELETE FROM rate_limits")
@@ -0,0 +1,379 @@
+"""
+Benchmark every endpoint of the fake CSAF provider.
+
+Starts the server with the generated TLS certificate, enables all of its endpoints, and drives each
+endpoint with a number of concurrent keep-alive connections. Reports throughput, latency percentiles
+and the server's memory, and saves the results as JSON, so that runs can be compared with each other.
+"""
+
+import argparse
+import asyncio
+import datetime
+import json
+import os
+import platform
+import random
+import shlex
+import socket
+import ssl
+import subprocess
+import sys
+import time
+import urllib.parse
+from pathlib import Path
+
+from .consts import directory_listing_base_path, port
+
+
+project_root = Path(__file__).resolve().parents[1]
+ca_path = project_root / "crypto" / "ca.crt.pem"
+
+ALL_FEATURES = {
+    "well_known_meta": True,
+    "security_data_meta": True,
+    "advisories_csaf_meta": True,
+    "security_csaf_meta": True,
+    "well_known_security_txt": True,
+    "root_security_txt": True,
+    "directory_listing": True,
+    "rolie_feed": True,
+}
+# Statuses that count as success. Anything else, and any failed connection, is an error.
+OK_STATUSES = (200, 206, 304)
+
+
+class HTTPError(Exception):
+    pass
+
+
+class Connection:
+    """A minimal HTTP/1.1 client connection with keep-alive, enough for benchmarking without dependencies."""
+
+    def __init__(self, host: str, port: int, ssl_context: ssl.SSLContext, host_header: str | None = None):
+        self.host = host
+        self.port = port
+        self.ssl_context = ssl_context
+        self.host_header = host_header or f'localhost:{port}'
+        self.reader = None
+        self.writer = None
+
+    async def _connect(self):
+        self.reader, self.writer = await asyncio.open_connection(
+            self.host, self.port, ssl=self.ssl_context, server_hostname='localhost')
+
+    def close(self):
+        if self.writer:
+            self.writer.close()
+        self.reader = self.writer = None
+
+    async def request(self, method: str, path: str, headers: dict | None = None, body: bytes = b'') -> tuple[int, dict, bytes]:
+        if self.writer is None:
+            await self._connect()
+        lines = [f'{method} {path} HTTP/1.1', f'Host: {self.host_header}', f'Content-Length: {len(body)}']
+        lines.extend(f'{name}: {value}' for name, value in (headers or {}).items())
+        self.writer.write(('\r\n'.join(lines) + '\r\n\r\n').encode('latin-1') + body)
+        try:
+            status, response_headers, response_body = await self._read_response(method)
+        except BaseException:
+            self.close()
+            raise
+        if response_headers.get('connection', '').lower() == 'close':
+            self.close()
+        return status, response_headers, response_body
+
+    async def _read_response(self, method: str) -> tuple[int, dict, bytes]:
+        status_line = await self.reader.readline()
+        if not status_line:
+            raise HTTPError("Connection closed by server")
+        status = int(status_line.split()[1])
+        headers = {}
+        while True:
+            line = await self.reader.readline()
+            if line in (b'\r\n', b'\n', b''):
+                break
+            name, _, value = line.decode('latin-1').partition(':')
+            headers[name.strip().lower()] = value.strip()
+        if method == 'HEAD' or status in (204, 304) or 100 <= status < 200:
+            return status, headers, b''
+        if headers.get('transfer-encoding', '').lower() == 'chunked':
+            chunks = []
+            while True:
+                size = int((await self.reader.readline()).split(b';')[0], 16)
+                chunk = await self.reader.readexactly(size + 2)
+                if size == 0:
+                    break
+                chunks.append(chunk[:-2])
+            return status, headers, b''.join(chunks)
+        if 'content-length' in headers:
+            return status, headers, await self.reader.readexactly(int(headers['content-length']))
+        headers['connection'] = 'close'
+        return status, headers, await self.reader.read()
+
+
+def make_ssl_context() -> ssl.SSLContext:
+    if not ca_path.exists():
+        raise FileNotFoundError(f"CA certificate not found: {ca_path}\nHave you run the setup script?")
+    return ssl.create_default_context(cafile=str(ca_path))
+
+
+def percentile(sorted_values: list[float], fraction: float) -> float:
+    """Nearest-rank percentile of an already sorted list."""
+    if not sorted_values:
+        return 0.0
+    rank = max(1, round(fraction * len(sorted_values) + 0.5))
+    return sorted_values[min(rank, len(sorted_values)) - 1]
+
+
+def server_memory(pid: int) -> dict[str, int]:
+    """Resident and peak resident memory in KiB of the server and all of its worker processes, read from /proc."""
+    pids = {pid}
+    try:
+        processes = [entry for entry in os.listdir('/proc') if entry.isdigit()]
+    except OSError:
+        return {}
+    # Walk the process tree breadth first; workers may have been forked from workers.
+    changed = True
+    parents = {}
+    for entry in processes:
+        try:
+            with open(f'/proc/{entry}/stat') as f:
+                parents[int(entry)] = int(f.read().rsplit(')', 1)[1].split()[1])
+        except (OSError, ValueError, IndexError):
+            continue
+    while changed:
+        children = {child for child, parent in parents.items() if parent in pids}
+        changed = not children <= pids
+        pids |= children
+
+    memory = {'rss_kib': 0, 'peak_rss_kib': 0, 'processes': 0}
+    for process in pids:
+        try:
+            with open(f'/proc/{process}/status') as f:
+                status = dict(line.split(':', 1) for line in f if ':' in line)
+        except OSError:
+            continue
+        memory['rss_kib'] += int(status.get('VmRSS', '0 kB').split()[0])
+        memory['peak_rss_kib'] += int(status.get('VmHWM', '0 kB').split()[0])
+        memory['processes'] += 1
+    return memory
+
+
+async def run_endpoint(name: str, paths: list[str], headers: dict, args, ssl_context: ssl.SSLContext) -> dict:
+    """Drive one endpoint with `args.concurrency` connections, cycling through its paths."""
+    latencies = []
+    statuses = {}
+    errors = 0
+    transferred = 0
+    started = time.perf_counter()
+    deadline = started + args.duration
+    issued = 0
+
+    async def client(offset: int):
+        nonlocal errors, transferred, issued
+        connection = Connection('127.0.0.1', args.port, ssl_context)
+        position = offset
+        try:
+            while time.perf_counter() < deadline and (not args.requests or issued < args.requests):
+                issued += 1
+                path = paths[position % len(paths)]
+                position += args.concurrency
+                request_started = time.perf_counter()
+                try:
+                    status, _, body = await connection.request('GET', path, headers)
+                except (OSError, HTTPError, asyncio.IncompleteReadError, ValueError):
+                    errors += 1
+                    connection.close()
+                    continue
+                latencies.append(time.perf_counter() - request_started)
+                statuses[status] = statuses.get(status, 0) + 1
+                transferred += len(body)
+                if status not in OK_STATUSES:
+                    errors += 1
+        finally:
+            connection.close()
+
+    await asyncio.gather(*(client(offset) for offset in range(args.concurrency)))
+    elapsed = time.perf_counter() - started
+    latencies.sort()
+    milliseconds = [latency * 1000 for latency in latencies]
+    return {
+        'endpoint': name,
+        'paths': len(paths),
+        'requests': len(latencies),
+        'errors': errors,
+        'statuses': {str(status): count for status, count in sorted(statuses.items())},
+        'seconds': round(elapsed, 3),
+        'requests_per_second': round(len(latencies) / elapsed, 1) if elapsed else 0.0,
+        'megabytes_per_second': round(transferred / elapsed / 1e6, 2) if elapsed else 0.0,
+        'latency_ms': {
+            'p50': round(percentile(milliseconds, 0.50), 3),
+            'p95': round(percentile(milliseconds, 0.95), 3),
+            'p99': round(percentile(milliseconds, 0.99), 3),
+            'max': round(milliseconds[-1], 3) if milliseconds else 0.0,
+        },
+    }
+
+
+async def discover_endpoints(args, ssl_context: ssl.SSLContext) -> dict[str, tuple[list[str], dict]]:
+    """Configure the server and collect the paths of every endpoint, following the metadata like a client would."""
+    connection = Connection('127.0.0.1', args.port, ssl_context)
+    try:
+        config = {**ALL_FEATURES, **json.loads(args.config)}
+        status, _, _ = await connection.request('PATCH', '/config', {'Content-Type': 'application/json'}, json.dumps(config).encode())
+        if status != 200:
+            raise HTTPError(f"Configuring the server failed with status {status}")
+
+        endpoints = {
+            'well-known-metadata': ['/.well-known/csaf/provider-metadata.json'],
+            'security-data-metadata': ['/security/data/csaf/provider-metadata.json'],
+            'advisories-csaf-metadata': ['/advisories/csaf/provider-metadata.json'],
+            'security-csaf-metadata': ['/security/csaf/provider-metadata.json'],
+            'obscure-metadata': ['/obscure/path/to/provider-metadata.json'],
+            'well-known-security-txt': ['/.well-known/security.txt'],
+            'root-security-txt': ['/security.txt'],
+            'index-txt': [f'{directory_listing_base_path}/index.txt'],
+            'changes-csv': [f'{directory_listing_base_path}/changes.csv'],
+        }
+        status, _, body = await connection.request('GET', endpoints['well-known-metadata'][0])
+        metadata = json.loads(body)
+        feeds = [urllib.parse.urlsplit(feed['url']).path
+                 for distribution in metadata.get('distributions', [])
+                 for feed in distribution.get('rolie', {}).get('feeds', [])]
+        endpoints['rolie-feed'] = feeds
+
+        status, _, body = await connection.request('GET', endpoints['index-txt'][0])
+        listed = [line for line in body.decode('utf-8').splitlines() if line.strip()]
+        advisories = [f'{directory_listing_base_path}/{line}' for line in listed]
+        random.Random(args.seed).shuffle(advisories)
+        advisories = advisories[:args.sample]
+        endpoints['advisory'] = advisories
+        # Not every advisory comes with sidecars, so only those that do are benchmarked.
+        sidecars = []
+        for path in advisories:
+            status, _, _ = await connection.request('GET', f'{path}.sha256')
+            if status == 200:
+                sidecars.append(f'{path}.sha256')
+        endpoints['advisory-sha256'] = sidecars
+    finally:
+        connection.close()
+
+    result = {name: (paths, {}) for name, paths in endpoints.items() if paths}
+    if advisories:
+        result['advisory-gzip'] = (advisories, {'Accept-Encoding': 'gzip, br'})
+    return result
+
+
+async def run_benchmark(args, server_pid: int | None) -> dict:
+    ssl_context = make_ssl_context()
+    endpoints = await discover_endpoints(args, ssl_context)
+    if args.endpoints:
+        endpoints = {name: endpoints[name] for name in args.endpoints if name in endpoints}
+    results = []
+    for name, (paths, headers) in endpoints.items():
+        result = await run_endpoint(name, paths, headers, args, ssl_context)
+        if server_pid:
+            result['memory'] = server_memory(server_pid)
+        results.append(result)
+        print_result(result)
+    return {
+        'timestamp': datetime.datetime.now(datetime.timezone.utc).isoformat(),
+        'commit': git_commit(),
+        'python': platform.python_version(),
+        'server_args': args.server_args,
+        'concurrency': args.concurrency,
+        'duration_seconds': args.duration,
+        'results': results,
+    }
+
+
+def git_commit() -> str | None:
+    try:
+        return subprocess.run(['git', 'rev-parse', 'HEAD'], cwd=project_root, capture_output=True,
+                              text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def print_result(result: dict):
+    latency = result['latency_ms']
+    memory = result.get('memory')
+    rss = f"{memory['rss_kib'] / 1024:8.1f} MiB" if memory else ''
+    print(f"{result['endpoint']:<26} {result['requests_per_second']:>9.1f} req/s {result['megabytes_per_second']:>8.2f} MB/s "
+          f"p50 {latency['p50']:>8.2f} ms  p95 {latency['p95']:>8.2f} ms  p99 {latency['p99']:>8.2f} ms  "
+          f"errors {result['errors']:<5} {rss}")
+
+
+def compare(results: dict, baseline_path: Path, tolerance: float) -> bool:
+    """Print the change against a previous run. Returns False if any endpoint's throughput regressed beyond the tolerance."""
+    baseline = {result['endpoint']: result for result in json.loads(baseline_path.read_text())['results']}
+    passed = True
+    print(f"\nCompared to {baseline_path}:")
+    for result in results['results']:
+        previous = baseline.get(result['endpoint'])
+        if not previous or not previous['requests_per_second']:
+            continue
+        throughput = result['requests_per_second'] / previous['requests_per_second'] - 1
+        p99 = result['latency_ms']['p99'] / previous['latency_ms']['p99'] - 1 if previous['latency_ms']['p99'] else 0.0
+        regressed = throughput < -tolerance
+        passed = passed and not regressed
+        print(f"{result['endpoint']:<26} throughput {throughput:+7.1%}  p99 {p99:+7.1%}{'  REGRESSION' if regressed else ''}")
+    return passed
+
+
+def port_open(port: int) -> bool:
+    try:
+        with socket.create_connection(('127.0.0.1', port), timeout=1):
+            return True
+    except OSError:
+        return False
+
+
+def start_server(server_args: str, port: int, timeout: float) -> subprocess.Popen:
+    if port_open(port):
+        raise RuntimeError(f"Port {port} is already in use. Stop the running server, or benchmark it with --no-start.")
+    server = subprocess.Popen([sys.executable, '-m', 'fake_csaf_provider.main', *shlex.split(server_args)], cwd=project_root)
+    deadline = time.monotonic() + timeout
+    while not port_open(port):
+        if server.poll() is not None or time.monotonic() > deadline:
+            server.kill()
+            raise RuntimeError("The server did not start")
+        time.sleep(0.2)
+    return server
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--concurrency', type=int, default=16, help="Concurrent connections per endpoint.")
+    parser.add_argument('--duration', type=float, default=5, help="Seconds to drive each endpoint.")
+    parser.add_argument('--requests', type=int, default=0, help="Stop each endpoint after this many requests (0 for no limit).")
+    parser.add_argument('--endpoints', type=lambda value: value.split(','), default=None,
+                        help="Comma-separated endpoints to benchmark, e.g. 'index-txt,advisory'. Defaults to all.")
+    parser.add_argument('--sample', type=int, default=1000, help="Number of distinct advisories to download.")
+    parser.add_argument('--seed', type=int, default=0, help="Seed for sampling advisories.")
+    parser.add_argument('--config', default='{}', help="JSON merged into the configuration sent to /config.")
+    parser.add_argument('--server-args', default='', help="Arguments for the server, e.g. '--workers 4 --virtual-corpus 100000'.")
+    parser.add_argument('--startup-timeout', type=float, default=300, help="Seconds to wait for the server to accept connections.")
+    parser.add_argument('--no-start', action='store_true', help="Benchmark an already running server instead of starting one.")
+    parser.add_argument('--port', type=int, default=port)
+    parser.add_argument('--output', type=Path, default=None, help="Where to save the results. Defaults to benchmarks/<timestamp>.json.")
+    parser.add_argument('--baseline', type=Path, default=None, help="Results of a previous run to compare against.")
+    parser.add_argument('--tolerance', type=float, default=0.1,
+                        help="Exit with an error if throughput dropped by more than this fraction against the baseline.")
+    return parser.parse_args()
+
+
+if __name__ == '__main__':
+    args = parse_args()
+    server = None if args.no_start else start_server(args.server_args, args.port, args.startup_timeout)
+    try:
+        results = asyncio.run(run_benchmark(args, server.pid if server else None))
+    finally:
+        if server:
+            server.terminate()
+            server.wait()
+    output = args.output or project_root / 'benchmarks' / f"{datetime.datetime.now():%Y%m%d-%H%M%S}.json"
+    output.parent.mkdir(parents=True, exist_ok=True)
+    output.write_text(json.dumps(results, indent=2))
+    print(f"Saved results to {output}")
+    if args.baseline and not compare(results, args.baseline, args.tolerance):
+        sys.exit(1)
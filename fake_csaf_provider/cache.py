@@ -0,0 +1,106 @@
+import datetime
+import flask
+import hashlib
+import itertools
+import threading
+from werkzeug.http import is_resource_modified
+
+from .compression import MIN_SIZE, compress, compress_stream, negotiate_encoding, variant_etag
+from .consts import streaming_threshold_entries
+from .metrics import record_cache
+
+
+class CachedResponse:
+    """A fully rendered response body, together with the validators clients use for conditional requests."""
+
+    def __init__(self, body: bytes, mimetype: str, last_modified: datetime.datetime | None = None):
+        self.body = body
+        self.mimetype = mimetype
+        self.etag = hashlib.sha256(body).hexdigest()[:32]
+        self.last_modified = last_modified.replace(microsecond=0) if last_modified else None
+        self._variants: dict[str, bytes] = {}
+        self._variants_lock = threading.Lock()
+
+    def variant(self, encoding: str | None) -> bytes:
+        """The body in the given content coding, compressed on first use and kept for as long as this response."""
+        if encoding is None:
+            return self.body
+        with self._variants_lock:
+            body = self._variants.get(encoding)
+            if body is None:
+                body = compress(self.body, encoding)
+                self._variants[encoding] = body
+        return body
+
+
+_responses: dict[str, tuple[object, CachedResponse]] = {}
+_responses_lock = threading.Lock()
+
+
+def get_cached(key: str, version, build) -> CachedResponse:
+    """Return the cached response for key, rebuilding it only if it was built for a different version."""
+    with _responses_lock:
+        hit = _responses.get(key)
+    if hit and hit[0] == version:
+        record_cache(key.split('/')[0], True)
+        return hit[1]
+    record_cache(key.split('/')[0], False)
+    response = build()
+    with _responses_lock:
+        _responses[key] = (version, response)
+    return response
+
+
+def send_cached(cached: CachedResponse):
+    encoding = negotiate_encoding(flask.request) if len(cached.body) >= MIN_SIZE else None
+    response = flask.Response(cached.variant(encoding), mimetype=cached.mimetype)
+    response.set_etag(variant_etag(cached.etag, encoding))
+    response.vary.add('Accept-Encoding')
+    if encoding:
+        response.headers['Content-Encoding'] = encoding
+    if cached.last_modified:
+        response.last_modified = cached.last_modified
+    return response.make_conditional(flask.request)
+
+
+def encode_lines(lines, lines_per_chunk: int = 1000):
+    """Turn an iterable of text lines into a few large byte chunks, rather than one write per line."""
+    lines = iter(lines)
+    while True:
+        batch = ''.join(itertools.islice(lines, lines_per_chunk))
+        if not batch:
+            return
+        yield batch.encode('utf-8')
+
+
+def send_streamed(chunks, mimetype: str, etag: str, last_modified: datetime.datetime | None = None):
+    """Stream a body generated chunk by chunk, so that memory use does not depend on its size."""
+    environ = flask.request.environ
+    encoding = negotiate_encoding(flask.request)
+    etag = variant_etag(etag, encoding)
+    last_modified = last_modified.replace(microsecond=0) if last_modified else None
+    if not is_resource_modified(environ, etag=etag, last_modified=last_modified):
+        response = flask.Response(status=304)
+    else:
+        body = chunks()
+        if encoding:
+            body = compress_stream(body, encoding)
+        response = flask.Response(body, mimetype=mimetype)
+        if encoding:
+            response.headers['Content-Encoding'] = encoding
+    response.set_etag(etag)
+    response.vary.add('Accept-Encoding')
+    if last_modified:
+        response.last_modified = last_modified
+    return response
+
+
+def send_rendered(key: str, version, entry_count: int, chunks, mimetype: str, etag: str, last_modified: datetime.datetime | None = None):
+    """Send a body rendered from the corpus index.
+
+    Up to streaming_threshold_entries entries, the body is rendered once and cached.
+    Beyond that, it is streamed on every request instead, trading CPU for a flat memory profile.
+    """
+    if entry_count < streaming_threshold_entries:
+        return send_cached(get_cached(key, version, lambda: CachedResponse(b''.join(chunks()), mimetype, last_modified)))
+    return send_streamed(chunks, mimetype, etag, last_modified)
@@ -0,0 +1,70 @@
+import gzip
+import zlib
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+
+# Compressing less than this rarely saves a network packet.
+MIN_SIZE = 1024
+SUFFIXES = {'br': '.br', 'gzip': '.gz'}
+
+
+def supported_encodings() -> list[str]:
+    return ['br', 'gzip'] if brotli else ['gzip']
+
+
+def negotiate_encoding(request) -> str | None:
+    """The best content coding that both the client accepts and the server supports, or None for identity."""
+    return request.accept_encodings.best_match(supported_encodings())
+
+
+def compress(data: bytes, encoding: str, best: bool = True) -> bytes:
+    """Compress with the highest level for bodies compressed once and cached, and a fast level for everything else."""
+    if encoding == 'br':
+        return brotli.compress(data, quality=11 if best else 4)
+    if encoding == 'gzip':
+        return gzip.compress(data, compresslevel=9 if best else 6, mtime=0)
+    raise ValueError(f"Unsupported content coding: {encoding}")
+
+
+def compress_stream(chunks, encoding: str):
+    """Compress a stream of chunks incrementally, so that the full body is never held in memory."""
+    if encoding == 'br':
+        compressor = brotli.Compressor(quality=4)
+        process, finish = compressor.process, compressor.finish
+    elif encoding == 'gzip':
+        # wbits=31 selects the gzip container.
+        compressor = zlib.compressobj(6, zlib.DEFLATED, 31)
+        process, finish = compressor.compress, compressor.flush
+    else:
+        raise ValueError(f"Unsupported content coding: {encoding}")
+    for chunk in chunks:
+        data = process(chunk)
+        if data:
+            yield data
+    yield finish()
+
+
+def variant_etag(etag: str, encoding: str | None) -> str:
+    # Each representation needs its own ETag, or caches would hand compressed bytes to clients that did not ask for them.
+    return f'{etag}-{encoding}' if encoding else etag
+
+
+def compress_response(response, request):
+    """Compress dynamic responses on the fly. Responses that handle their own encodings carry an ETag and are left alone."""
+    if response.status_code != 200 or response.direct_passthrough or response.is_streamed:
+        return response
+    if 'Content-Encoding' in response.headers or response.get_etag()[0]:
+        return response
+    data = response.get_data()
+    if len(data) < MIN_SIZE:
+        return response
+    response.vary.add('Accept-Encoding')
+    encoding = negotiate_encoding(request)
+    if encoding:
+        response.set_data(compress(data, encoding, best=False))
+        response.headers['Content-Encoding'] = encoding
+    return response
@@ -2,5 +2,14 @@ port = 34443
 domain = f'localhost:{port}'
 # These paths are chosen deliberately obscure, so that clients rely on the metadata instead of on assumptions.
 directory_listing_base_path = "/some-csaf-base-path"
-rolie_feed_path_white = "/some-white-rolie-dir/some-feed.json"
-rolie_feed_csaf_dir_white = "/some-white-csaf-dir-for-rolie"
+rolie_feed_dir_pattern = "/some-{tlp}-rolie-dir"
+rolie_feed_csaf_dir_pattern = "/some-{tlp}-csaf-dir-for-rolie"
+rolie_feed_path_white = rolie_feed_dir_pattern.format(tlp='white') + "/some-feed.json"
+rolie_feed_csaf_dir_white = rolie_feed_csaf_dir_pattern.format(tlp='white')
+openpgp_public_key_path = "/some-openpgp-dir/csaf-signing-key.asc"
+# Never rate limited or faulted, so that a misbehaving server can still be reconfigured and observed.
+admin_paths = ('/config', '/metrics', '/journal', '/journal/dump')
+# How often the corpus directory is checked for added, changed or removed advisories.
+corpus_poll_interval_seconds = 5
+# Listings and feeds covering more advisories than this are streamed instead of cached in memory.
+streaming_threshold_entries = 20000
@@ -0,0 +1,465 @@
+import bisect
+import concurrent.futures
+import datetime
+import hashlib
+import itertools
+import json
+import os
+import sqlite3
+import time
+from array import array
+from contextlib import closing
+from pathlib import Path
+
+
+SIDECAR_SUFFIXES = ('.asc', '.sha256', '.sha512')
+HASH_SUFFIXES = ('.sha256', '.sha512')
+# Below this many documents to parse, starting worker processes costs more than it saves.
+PARALLEL_SCAN_THRESHOLD = 256
+# Advisories are read and hashed in chunks of this size.
+READ_CHUNK_SIZE = 64 * 1024
+
+
+class CorpusEntry:
+    """Everything the server needs to know about one advisory, extracted in a single read."""
+
+    __slots__ = (
+        'tlp',
+        'year',
+        'filename',
+        'id',
+        'current_release_date',
+        'initial_release_date',
+        'tlp_label',
+        'size',
+        'mtime',
+        'asc',
+        'sha256',
+        'sha512',
+        'digest',
+        'etag',
+        'location',
+    )
+
+    def __init__(self, tlp: str, year: str, filename: str):
+        self.tlp = tlp
+        self.year = year
+        self.filename = filename
+        self.id = ''
+        self.current_release_date: datetime.datetime | None = None
+        self.initial_release_date: datetime.datetime | None = None
+        self.tlp_label: str | None = None
+        self.size = 0
+        self.mtime = 0.0
+        self.asc = False
+        self.sha256 = False
+        self.sha512 = False
+        # The SHA-256 digest of the advisory, computed while parsing it. Its SHA-512 digest is only needed for
+        # '.sha512' sidecars served from the index, and computed on request, see files.sha512_hexdigest().
+        self.digest: bytes | None = None
+        # Filled in on first download, see files.document_etag().
+        self.etag: str | None = None
+        # Row of the advisory in the pack it is served from, see pack.py.
+        self.location: int | None = None
+
+    @property
+    def key(self) -> tuple[str, str, str]:
+        return (self.tlp, self.year, self.filename)
+
+    @property
+    def relative_path(self) -> str:
+        return f'{self.tlp}/{self.year}/{self.filename}'
+
+    def has_sidecar(self, suffix: str) -> bool:
+        return getattr(self, suffix.lstrip('.'), False)
+
+    def hexdigest(self) -> str | None:
+        """The SHA-256 digest, as published in the '.sha256' sidecar, as far as known."""
+        return self.digest.hex() if self.digest is not None else None
+
+    def same_file(self, other: 'CorpusEntry') -> bool:
+        return self.mtime == other.mtime and self.size == other.size
+
+    def copy_advisory_fields(self, other: 'CorpusEntry'):
+        self.id = other.id
+        self.current_release_date = other.current_release_date
+        self.initial_release_date = other.initial_release_date
+        self.tlp_label = other.tlp_label
+        self.digest = other.digest
+
+
+def _newest_first(entry: CorpusEntry) -> float:
+    return -entry.current_release_date.timestamp()
+
+
+class ReleaseDates:
+    """The dated advisories of one TLP, newest first, in a compact form for listings and range queries.
+
+    Rather than one object per advisory, the release dates are an array of epoch timestamps, and the lines of
+    index.txt and changes.csv are rendered once into a buffer each, next to an array of line offsets. The first
+    n advisories of a listing, e.g. those released since a given moment, are then a slice of its buffer.
+    """
+
+    __slots__ = ('_negated', '_index_txt', '_index_txt_offsets', '_changes_csv', '_changes_csv_offsets')
+
+    def __init__(self, entries: list[CorpusEntry]):
+        # Negated, so that bisect works on the newest-first order.
+        self._negated = array('d', (_newest_first(entry) for entry in entries))
+        paths = [f'{entry.year}/{entry.filename}'.encode('utf-8') for entry in entries]
+        index_txt = [path + b'\n' for path in paths]
+        changes_csv = [
+            b'"%s","%s"\n' % (path, entry.current_release_date.replace(microsecond=0).isoformat().encode('ascii'))
+            for path, entry in zip(paths, entries)
+        ]
+        self._index_txt = b''.join(index_txt)
+        self._index_txt_offsets = array('Q', itertools.accumulate(map(len, index_txt), initial=0))
+        self._changes_csv = b''.join(changes_csv)
+        self._changes_csv_offsets = array('Q', itertools.accumulate(map(len, changes_csv), initial=0))
+
+    def __len__(self) -> int:
+        return len(self._negated)
+
+    def latest(self) -> datetime.datetime | None:
+        if not self._negated:
+            return None
+        return datetime.datetime.fromtimestamp(-self._negated[0], datetime.timezone.utc)
+
+    def count_since(self, moment: datetime.datetime) -> int:
+        """How many of the advisories were released after moment. As they are the newest, they come first."""
+        return bisect.bisect_left(self._negated, -moment.timestamp())
+
+    def index_txt(self, count: int | None = None) -> memoryview:
+        """The lines of index.txt for the newest count advisories, or all of them."""
+        return memoryview(self._index_txt)[:self._index_txt_offsets[len(self) if count is None else count]]
+
+    def changes_csv(self, count: int | None = None) -> memoryview:
+        """The lines of changes.csv for the newest count advisories, or all of them."""
+        return memoryview(self._changes_csv)[:self._changes_csv_offsets[len(self) if count is None else count]]
+
+
+class CorpusIndex:
+    """All advisories of the corpus, addressable by (tlp, year, filename).
+
+    An index is never modified once published. Changes produce a new index via with_changes(),
+    which reuses the entry objects of all unchanged advisories, and the orderings of all unchanged TLPs.
+    """
+
+    def __init__(self, entries: list[CorpusEntry], _dated: dict[str, list[CorpusEntry]] | None = None,
+                 _fingerprints: dict[str, str] | None = None):
+        self._entries: dict[tuple[str, str, str], CorpusEntry] = {}
+        self._by_tlp: dict[str, list[CorpusEntry]] = {}
+        for entry in entries:
+            self._entries[entry.key] = entry
+            self._by_tlp.setdefault(entry.tlp, []).append(entry)
+        if _dated is None:
+            _dated = {}
+            for tlp, tlp_entries in self._by_tlp.items():
+                _dated[tlp] = sorted((e for e in tlp_entries if e.current_release_date), key=_newest_first)
+        self._dated = _dated
+        # Per TLP, so that changing the advisories of one TLP leaves everything derived for the others valid.
+        self._fingerprints: dict[str, str] = dict(_fingerprints or {})
+        # Derived orderings, computed on first use. Safe to memoize, since an index never changes.
+        self._views: dict[tuple, list] = {}
+
+    def fingerprint(self, tlp: str) -> str:
+        """Identifies the indexed state of the TLP's advisories, stable across processes and restarts."""
+        fingerprint = self._fingerprints.get(tlp)
+        if fingerprint is None:
+            digest = hashlib.blake2b(digest_size=16)
+            for entry in sorted(self.entries(tlp), key=lambda e: e.key):
+                digest.update(f'{entry.relative_path}\0{entry.mtime}\0{entry.size}\n'.encode('utf-8'))
+            fingerprint = digest.hexdigest()
+            self._fingerprints[tlp] = fingerprint
+        return fingerprint
+
+    def with_changes(self, changed: list[CorpusEntry], removed: list[tuple[str, str, str]]) -> 'CorpusIndex':
+        """Return a new index with the changed entries added or replaced, and the removed ones dropped."""
+        dropped = set(removed) | {entry.key for entry in changed}
+        entries = [entry for entry in self._entries.values() if entry.key not in dropped] + changed
+        touched = {key[0] for key in dropped}
+        dated = {}
+        for tlp in {entry.tlp for entry in entries}:
+            if tlp not in touched:
+                dated[tlp] = self._dated.get(tlp, [])
+                continue
+            kept = [entry for entry in self._dated.get(tlp, []) if entry.key not in dropped]
+            for entry in changed:
+                if entry.tlp == tlp and entry.current_release_date:
+                    bisect.insort(kept, entry, key=_newest_first)
+            dated[tlp] = kept
+        index = CorpusIndex(entries, _dated=dated, _fingerprints={
+            tlp: fingerprint for tlp, fingerprint in self._fingerprints.items() if tlp not in touched
+        })
+        index._views = {key: view for key, view in self._views.items() if key[0] not in touched}
+        return index
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def get(self, tlp: str, year: str, filename: str) -> CorpusEntry | None:
+        return self._entries.get((tlp, year, filename))
+
+    def tlps(self) -> list[str]:
+        return sorted(self._by_tlp)
+
+    def entries(self, tlp: str) -> list[CorpusEntry]:
+        return self._by_tlp.get(tlp, [])
+
+    def sorted_by_release_date(self, tlp: str) -> list[CorpusEntry]:
+        """The entries with a current_release_date, newest first. Maintained on change, never sorted per call."""
+        return self._dated.get(tlp, [])
+
+    def release_dates(self, tlp: str) -> ReleaseDates:
+        """The dated entries of the TLP in compact form. Built once per index, and kept for unchanged TLPs."""
+        dates = self._views.get((tlp, 'release_dates'))
+        if dates is None:
+            dates = ReleaseDates(self.sorted_by_release_date(tlp))
+            self._views[(tlp, 'release_dates')] = dates
+        return dates
+
+    def years(self, tlp: str) -> list[str]:
+        """The years of the TLP's advisories, newest first."""
+        years = self._views.get((tlp, 'years'))
+        if years is None:
+            years = sorted({entry.year for entry in self.entries(tlp)}, reverse=True)
+            self._views[(tlp, 'years')] = years
+        return years
+
+    def newest_first(self, tlp: str, year: str | None = None) -> list[CorpusEntry]:
+        """All entries of the TLP (and year), newest first and those without a date last. Computed once per index."""
+        order = self._views.get((tlp, year))
+        if order is None:
+            undated = [entry for entry in self.entries(tlp) if entry.current_release_date is None]
+            order = self.sorted_by_release_date(tlp) + undated
+            if year:
+                order = [entry for entry in order if entry.year == year]
+            self._views[(tlp, year)] = order
+        return order
+
+
+def parse_date(datestring) -> datetime.datetime | None:
+    if not isinstance(datestring, str):
+        return None
+    try:
+        return datetime.datetime.fromisoformat(datestring.replace('Z', '+00:00'))
+    except ValueError:
+        return None
+
+
+def read_advisory_fields(path: str) -> tuple[str, str | None, str | None, str | None, bytes] | None:
+    """Extract (id, current_release_date, initial_release_date, tlp_label, sha256) from an advisory file.
+
+    The file is read once, in chunks that are hashed as they arrive, and parsed from the chunks, as parsing needs the
+    whole document anyway. Runs in worker processes, so it only deals in plain, picklable values.
+    """
+    digest = hashlib.sha256()
+    chunks = []
+    try:
+        with open(path, 'rb') as f:
+            while chunk := f.read(READ_CHUNK_SIZE):
+                digest.update(chunk)
+                chunks.append(chunk)
+        data = json.loads(b''.join(chunks))
+    except (OSError, ValueError):
+        return None
+
+    def as_dict(value) -> dict:
+        # Malformed advisories are indexed with whatever fields they do have, rather than aborting the scan.
+        return value if isinstance(value, dict) else {}
+
+    def as_str(value):
+        return value if isinstance(value, str) else None
+
+    document = as_dict(as_dict(data).get('document'))
+    tracking = as_dict(document.get('tracking'))
+    label = as_dict(as_dict(document.get('distribution')).get('tlp')).get('label')
+
+    return (
+        as_str(tracking.get('id')) or '',
+        as_str(tracking.get('current_release_date')),
+        as_str(tracking.get('initial_release_date')),
+        as_str(label),
+        digest.digest(),
+    )
+
+
+def apply_advisory_fields(entry: CorpusEntry, fields: tuple[str, str | None, str | None, str | None, bytes | None]):
+    entry.id, current, initial, entry.tlp_label, entry.digest = fields
+    entry.current_release_date = parse_date(current)
+    entry.initial_release_date = parse_date(initial)
+
+
+def find_tlps(csaf_dir: Path) -> list[str]:
+    """The TLP directories of the corpus, e.g. white, green, amber and red."""
+    return sorted(entry.name for entry in os.scandir(csaf_dir) if entry.is_dir() and not entry.name.startswith('.'))
+
+
+def list_corpus_files(csaf_dir: Path, tlps: list[str]) -> list[CorpusEntry]:
+    """List all advisories with their stat data and sidecars, without opening any of them."""
+    entries = []
+    for tlp in tlps:
+        tlp_path = csaf_dir / tlp
+        if not tlp_path.is_dir():
+            continue
+        for year_dir in os.scandir(tlp_path):
+            if not year_dir.is_dir() or not year_dir.name.isdigit():
+                continue
+            dir_entries = {e.name: e for e in os.scandir(year_dir.path) if e.is_file()}
+            for name, dir_entry in dir_entries.items():
+                if not name.endswith('.json'):
+                    continue
+                entry = CorpusEntry(tlp, year_dir.name, name)
+                stat = dir_entry.stat()
+                entry.size = stat.st_size
+                entry.mtime = stat.st_mtime
+                entry.asc = f'{name}.asc' in dir_entries
+                entry.sha256 = f'{name}.sha256' in dir_entries
+                entry.sha512 = f'{name}.sha512' in dir_entries
+                entries.append(entry)
+    return entries
+
+
+def _parse_entries(csaf_dir: Path, stale: list[CorpusEntry], workers: int | None) -> list[CorpusEntry]:
+    """Parse the given advisories, spreading the work over a process pool if there are enough of them."""
+    stale_paths = [str(csaf_dir / entry.relative_path) for entry in stale]
+    if len(stale) >= PARALLEL_SCAN_THRESHOLD:
+        with concurrent.futures.ProcessPoolExecutor(max_workers=workers) as pool:
+            chunksize = max(1, len(stale) // ((workers or os.cpu_count() or 1) * 8))
+            results = list(pool.map(read_advisory_fields, stale_paths, chunksize=chunksize))
+    else:
+        results = [read_advisory_fields(path) for path in stale_paths]
+
+    parsed = []
+    for entry, fields in zip(stale, results):
+        if fields is None:
+            continue
+        apply_advisory_fields(entry, fields)
+        parsed.append(entry)
+    return parsed
+
+
+def _cache_rows(entries: list[CorpusEntry]) -> dict[str, tuple]:
+    return {
+        entry.relative_path: (
+            entry.mtime,
+            entry.size,
+            entry.id,
+            entry.current_release_date.isoformat() if entry.current_release_date else None,
+            entry.initial_release_date.isoformat() if entry.initial_release_date else None,
+            entry.tlp_label,
+            entry.digest,
+        )
+        for entry in entries
+    }
+
+
+def scan_corpus(csaf_dir: Path, tlps: list[str], cache_path: Path | None = None, workers: int | None = None) -> CorpusIndex:
+    """Index the corpus, parsing only the advisories that changed since the cached scan.
+
+    The advisories that need parsing are distributed over a process pool.
+    """
+    started = time.perf_counter()
+    candidates = list_corpus_files(csaf_dir, tlps)
+
+    cache = IndexCache(cache_path) if cache_path else None
+    cached = cache.load() if cache else {}
+
+    entries = []
+    stale = []
+    for entry in candidates:
+        hit = cached.get(entry.relative_path)
+        if hit and hit[0] == entry.mtime and hit[1] == entry.size:
+            apply_advisory_fields(entry, hit[2:])
+            entries.append(entry)
+        else:
+            stale.append(entry)
+
+    parsed = _parse_entries(csaf_dir, stale, workers)
+    entries.extend(parsed)
+
+    if cache:
+        cache.store(_cache_rows(parsed), keep={entry.relative_path for entry in candidates})
+
+    elapsed = time.perf_counter() - started
+    rate = len(candidates) / elapsed if elapsed > 0 else float('inf')
+    print(f"Indexed {len(entries)} CSAF documents ({len(stale)} parsed, {len(candidates) - len(stale)} from cache) "
+          f"in {elapsed:.2f}s ({rate:.0f} files/s)")
+    return CorpusIndex(entries)
+
+
+def update_corpus(index: CorpusIndex, csaf_dir: Path, tlps: list[str], cache_path: Path | None = None) -> CorpusIndex | None:
+    """Bring the index up to date with the directory tree, re-reading only the advisories that changed.
+
+    Returns None if nothing changed, so callers can keep serving everything they derived from the old index.
+    """
+    candidates = list_corpus_files(csaf_dir, tlps)
+    changed = []
+    stale = []
+    for entry in candidates:
+        known = index.get(*entry.key)
+        if known is None or not known.same_file(entry):
+            stale.append(entry)
+        elif (known.asc, known.sha256, known.sha512) != (entry.asc, entry.sha256, entry.sha512):
+            entry.copy_advisory_fields(known)
+            changed.append(entry)
+
+    seen = {entry.key for entry in candidates}
+    removed = [key for key in (entry.key for tlp in tlps for entry in index.entries(tlp)) if key not in seen]
+    parsed = _parse_entries(csaf_dir, stale, workers=None)
+    changed.extend(parsed)
+    # A changed advisory that no longer parses is dropped, as a full scan would skip it.
+    kept = {entry.key for entry in parsed}
+    removed.extend(entry.key for entry in stale if entry.key not in kept and index.get(*entry.key) is not None)
+    if not changed and not removed:
+        return None
+
+    if cache_path:
+        IndexCache(cache_path).store(_cache_rows(parsed), keep={entry.relative_path for entry in candidates})
+    print(f"Corpus changed: {len(changed)} documents added or updated, {len(removed)} removed")
+    return index.with_changes(changed, removed)
+
+
+class IndexCache:
+    """Persists the parsed advisory fields in SQLite, keyed by relative path, mtime and size."""
+
+    # Caches written with a different layout are discarded, and rebuilt by the next scan.
+    SCHEMA_VERSION = 3
+
+    def __init__(self, path: Path):
+        self.path = path
+
+    def _connect(self) -> sqlite3.Connection:
+        connection = sqlite3.connect(self.path)
+        if connection.execute("PRAGMA user_version").fetchone()[0] != self.SCHEMA_VERSION:
+            connection.execute("DROP TABLE IF EXISTS advisories")
+            connection.execute(f"PRAGMA user_version = {self.SCHEMA_VERSION}")
+        connection.execute(
+            "CREATE TABLE IF NOT EXISTS advisories ("
+            "path TEXT PRIMARY KEY, mtime REAL, size INTEGER, id TEXT, "
+            "current_release_date TEXT, initial_release_date TEXT, tlp_label TEXT, sha256 BLOB)"
+        )
+        return connection
+
+    def load(self) -> dict[str, tuple]:
+        try:
+            with closing(self._connect()) as connection:
+                rows = connection.execute("SELECT * FROM advisories").fetchall()
+        except sqlite3.Error as err:
+            print(f"Ignoring unreadable index cache {self.path}: {err}")
+            return {}
+        return {row[0]: row[1:] for row in rows}
+
+    def store(self, parsed: dict[str, tuple], keep: set[str]):
+        try:
+            with closing(self._connect()) as connection, connection:
+                connection.executemany(
+                    "INSERT OR REPLACE INTO advisories VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                    ((path, *row) for path, row in parsed.items()),
+                )
+                known = [row[0] for row in connection.execute("SELECT path FROM advisories")]
+                connection.executemany(
+                    "DELETE FROM advisories WHERE path = ?",
+                    ((path,) for path in known if path not in keep),
+                )
+        except sqlite3.Error as err:
+            print(f"Could not write index cache {self.path}: {err}")
@@ -1,14 +1,51 @@
-from .state import get_sorted_release_dates
-
-def index_txt():
-    filenames = [f'{year}/{file}' for (year, file), _ in get_sorted_release_dates()]
-    content = '\n'.join(filenames) + '\n'
-    return content
-
-def changes_csv():
-    lines = []
-    for (year, filename), date in get_sorted_release_dates():
-        date_str = date.replace(microsecond=0).isoformat()
-        lines.append(f'"{year}/{filename}","{date_str}"')
-    content = '\n'.join(lines) + '\n'
-    return content
+import datetime
+import flask
+
+from .cache import send_rendered, send_streamed
+from .consts import directory_listing_base_path
+from .corpus import parse_date
+from .files import get_corpus_index
+
+# Listings are sent in slices of this size.
+CHUNK_SIZE = 64 * 1024
+
+def directory_listing_path(tlp: str) -> str:
+    """TLP:WHITE is listed at the base path itself, every other TLP in a directory of its own below it."""
+    return directory_listing_base_path if tlp == 'white' else f'{directory_listing_base_path}/{tlp}'
+
+def index_txt(tlp: str):
+    index = get_corpus_index()
+    dates = _release_dates(index, tlp)
+    fingerprint = index.fingerprint(tlp)
+    return send_rendered(f'index_txt/{tlp}', fingerprint, len(dates), lambda: _listing_chunks(dates.index_txt()),
+                         'text/plain', f'{fingerprint}-index', dates.latest())
+
+def changes_csv(tlp: str):
+    """changes.csv, or with ?since=<ISO 8601 date> only the advisories released after that, for incremental clients."""
+    index = get_corpus_index()
+    dates = _release_dates(index, tlp)
+    fingerprint = index.fingerprint(tlp)
+    since = flask.request.args.get('since')
+    if since is None:
+        return send_rendered(f'changes_csv/{tlp}', fingerprint, len(dates), lambda: _listing_chunks(dates.changes_csv()),
+                             'text/csv', f'{fingerprint}-changes', dates.latest())
+    moment = parse_date(since)
+    if moment is None:
+        flask.abort(400, description="since must be an ISO 8601 date")
+    if moment.tzinfo is None:
+        moment = moment.replace(tzinfo=datetime.timezone.utc)
+    # The listing of the newest advisories is a prefix of the full one, so it is identified by its length.
+    count = dates.count_since(moment)
+    return send_streamed(lambda: _listing_chunks(dates.changes_csv(count)),
+                         'text/csv', f'{fingerprint}-changes-{count}', dates.latest())
+
+def _release_dates(index, tlp: str):
+    if tlp not in index.tlps():
+        flask.abort(404)
+    return index.release_dates(tlp)
+
+def _listing_chunks(lines: memoryview):
+    if not lines:
+        yield b'\n'
+    for start in range(0, len(lines), CHUNK_SIZE):
+        yield bytes(lines[start:start + CHUNK_SIZE])
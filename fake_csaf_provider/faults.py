@@ -0,0 +1,271 @@
+"""
+Fault injection, configured via the "faults" list of /config.
+
+Each rule applies to the request paths matching its glob pattern, the first matching rule winning:
+
+    {
+        "path": "/some-white-csaf-dir-for-rolie/*",
+        "latency_ms": 200,                      # added before the response headers
+        "latency_distribution": "normal",       # fixed, uniform, normal or exponential
+        "latency_jitter_ms": 50,                # half the range of uniform, standard deviation of normal
+        "bandwidth_bytes_per_second": 100000,   # per connection
+        "error_rate": 0.1,                      # answered with error_status instead
+        "error_status": 503,
+        "reset_rate": 0.05,                     # connection closed without a complete response
+        "truncate_rate": 0.1,                   # body cut off at truncate_fraction, then the connection closed
+        "truncate_fraction": 0.5
+    }
+
+The ASGI variant waits with asyncio, so injected slowness costs no thread. The WSGI servers have no event loop to
+hand the wait to, so FaultMiddleware sleeps in the worker thread: there, slow responses do occupy threads. So that
+they cannot occupy all of them, limit_slow_requests() caps how many requests are slowed down at once. Further
+requests drawing latency or a bandwidth limit are rejected with 503 and Retry-After instead, rather than silently
+served at full speed, and counted in /metrics as fake_csaf_faults_rejected_total. Use the uvicorn backend to slow
+down any number of requests at once.
+"""
+
+import errno
+import fnmatch
+import random
+import threading
+import time
+from typing import NamedTuple
+
+from .consts import admin_paths
+
+
+ENVIRON_KEY = 'fake_csaf_provider.fault'
+# Set by servers that apply faults themselves, see asgi.py.
+HANDLED_KEY = 'fake_csaf_provider.faults_handled'
+DISTRIBUTIONS = ('fixed', 'uniform', 'normal', 'exponential')
+# Throttled bodies are sent in pieces of at most this many bytes.
+THROTTLE_PIECE = 16 * 1024
+
+# Held by each request FaultMiddleware is slowing down, None for no limit.
+_slow_slots: threading.BoundedSemaphore | None = None
+# Answered to requests that would be slowed down while all slots are taken.
+REJECTED_STATUS = 503
+# Whether requests are being rejected, so that only the start of each such period is logged.
+_rejecting = False
+
+
+def limit_slow_requests(count: int | None):
+    """Slow down at most count requests at once in this process, e.g. a share of the threads of a gunicorn worker.
+    Must be called before serving."""
+    global _slow_slots
+    _slow_slots = threading.BoundedSemaphore(count) if count else None
+
+
+class Fault(NamedTuple):
+    delay: float
+    bandwidth: int
+    error_status: int | None
+    reset: bool
+    truncate_fraction: float | None
+    # Rejected with error_status because every slot for slowed requests was taken, see limit_slow_requests().
+    rejected: bool = False
+
+
+class FaultRule:
+    """One validated entry of the "faults" configuration."""
+
+    __slots__ = (
+        'path',
+        'latency',
+        'distribution',
+        'jitter',
+        'bandwidth',
+        'error_rate',
+        'error_status',
+        'reset_rate',
+        'truncate_rate',
+        'truncate_fraction',
+    )
+
+    def __init__(self, rule: dict):
+        if not isinstance(rule, dict):
+            raise ValueError("each fault must be a JSON object")
+        self.path = _get(rule, 'path', str, '*')
+        self.latency = _get(rule, 'latency_ms', (int, float), 0) / 1000
+        self.distribution = _get(rule, 'latency_distribution', str, 'fixed')
+        if self.distribution not in DISTRIBUTIONS:
+            raise ValueError(f"latency_distribution must be one of {', '.join(DISTRIBUTIONS)}")
+        self.jitter = _get(rule, 'latency_jitter_ms', (int, float), 0) / 1000
+        self.bandwidth = _get(rule, 'bandwidth_bytes_per_second', int, 0)
+        self.error_rate = _rate(rule, 'error_rate')
+        self.error_status = _get(rule, 'error_status', int, 503)
+        if not 500 <= self.error_status <= 599:
+            raise ValueError("error_status must be a 5xx status")
+        self.reset_rate = _rate(rule, 'reset_rate')
+        self.truncate_rate = _rate(rule, 'truncate_rate')
+        self.truncate_fraction = _get(rule, 'truncate_fraction', (int, float), 0.5)
+        if not 0 <= self.truncate_fraction < 1:
+            raise ValueError("truncate_fraction must be at least 0 and less than 1")
+        if min(self.latency, self.jitter, self.bandwidth) < 0:
+            raise ValueError("latencies and bandwidths must not be negative")
+
+    def draw(self) -> Fault:
+        if self.distribution == 'uniform':
+            delay = random.uniform(self.latency - self.jitter, self.latency + self.jitter)
+        elif self.distribution == 'normal':
+            delay = random.gauss(self.latency, self.jitter)
+        elif self.distribution == 'exponential':
+            delay = random.expovariate(1 / self.latency) if self.latency else 0.0
+        else:
+            delay = self.latency
+        roll = random.random()
+        return Fault(
+            delay=max(0.0, delay),
+            bandwidth=self.bandwidth,
+            error_status=self.error_status if roll < self.error_rate else None,
+            reset=self.error_rate <= roll < self.error_rate + self.reset_rate,
+            truncate_fraction=self.truncate_fraction if random.random() < self.truncate_rate else None,
+        )
+
+
+def _get(rule: dict, key: str, types, default):
+    value = rule.get(key, default)
+    if isinstance(value, bool) or not isinstance(value, types):
+        raise ValueError(f"invalid value for {key}: {value!r}")
+    return value
+
+
+def _rate(rule: dict, key: str) -> float:
+    value = _get(rule, key, (int, float), 0)
+    if not 0 <= value <= 1:
+        raise ValueError(f"{key} must be between 0 and 1")
+    return value
+
+
+def parse_faults(faults) -> list[FaultRule]:
+    """Validate the "faults" configuration. Raises ValueError if it is malformed."""
+    if not isinstance(faults, list):
+        raise ValueError("faults must be a list")
+    rules = [FaultRule(rule) for rule in faults]
+    for rule in rules:
+        if rule.error_rate + rule.reset_rate > 1:
+            raise ValueError("error_rate and reset_rate must not add up to more than 1")
+    return rules
+
+
+def draw_fault(path: str, rules: list[FaultRule]) -> Fault | None:
+    """Decide what goes wrong with the request for path, if anything."""
+    if path in admin_paths:
+        return None
+    for rule in rules:
+        if fnmatch.fnmatchcase(path, rule.path):
+            fault = rule.draw()
+            if fault.delay or fault.bandwidth or fault.error_status or fault.reset or fault.truncate_fraction is not None:
+                return fault
+            return None
+    return None
+
+
+def truncated_length(fault: Fault, headers) -> int | None:
+    """How many body bytes to send before cutting the response off, or None to send all of it."""
+    if fault.truncate_fraction is None:
+        return None
+    for name, value in headers:
+        if name.lower() == 'content-length':
+            return int(int(value) * fault.truncate_fraction)
+    # Without a declared length, cut the stream off after its first piece.
+    return 0
+
+
+class FaultMiddleware:
+    """Applies the latency, bandwidth, reset and truncation of a fault for the synchronous WSGI servers.
+
+    Error statuses are answered by the Flask app itself, see server.py, so that they pass through its hooks.
+    """
+
+    def __init__(self, app, get_rules):
+        self.app = app
+        self.get_rules = get_rules
+
+    def __call__(self, environ, start_response):
+        if environ.get(HANDLED_KEY):
+            return self.app(environ, start_response)
+        fault = draw_fault(environ.get('PATH_INFO', ''), self.get_rules(environ))
+        if fault is None:
+            return self.app(environ, start_response)
+        global _rejecting
+        release = None
+        slots = _slow_slots
+        if slots is not None and (fault.delay or fault.bandwidth):
+            if slots.acquire(blocking=False):
+                release = slots.release
+                _rejecting = False
+            else:
+                # Every slot is taken. Rejected visibly, by the app, rather than holding up another thread.
+                if not _rejecting:
+                    _rejecting = True
+                    print(f"All slots for slowed requests are taken, answering further ones with {REJECTED_STATUS}")
+                fault = Fault(0.0, 0, REJECTED_STATUS, False, None, rejected=True)
+        environ[ENVIRON_KEY] = fault
+        try:
+            if fault.delay:
+                time.sleep(fault.delay)
+            if fault.reset:
+                # The servers drop connections reset by the peer quietly, without sending a response.
+                raise ConnectionResetError(errno.ECONNRESET, "Injected connection reset")
+            if not fault.bandwidth and fault.truncate_fraction is None:
+                return self.app(environ, start_response)
+
+            started = []
+
+            def capture_start_response(status, headers, exc_info=None):
+                started[:] = [headers]
+                return start_response(status, headers, exc_info)
+
+            body = self.app(environ, capture_start_response)
+            if fault.bandwidth:
+                # A throttled body keeps its slot until the server closes it.
+                shaped, release = ShapedBody(body, fault, started, release), None
+                return shaped
+            return ShapedBody(body, fault, started)
+        finally:
+            if release:
+                release()
+
+
+class ShapedBody:
+    """A response body sent at a capped bandwidth or cut off. WSGI servers call close() on it whether or not they
+    iterated it, so that is where the app's body is closed and the slot of a slowed request released."""
+
+    def __init__(self, body, fault: Fault, started: list, release=None):
+        self.body = body
+        self.release = release
+        self.pieces = self._shape(body, fault, started)
+
+    def __iter__(self):
+        return self.pieces
+
+    def close(self):
+        try:
+            self.pieces.close()
+            close = getattr(self.body, 'close', None)
+            if close:
+                close()
+        finally:
+            release, self.release = self.release, None
+            if release:
+                release()
+
+    @staticmethod
+    def _shape(body, fault: Fault, started: list):
+        limit = truncated_length(fault, started[0] if started else [])
+        sent = 0
+        began = time.monotonic()
+        for chunk in body:
+            pieces = [chunk[i:i + THROTTLE_PIECE] for i in range(0, len(chunk), THROTTLE_PIECE)] if fault.bandwidth else [chunk]
+            for piece in pieces:
+                if limit is not None and sent + len(piece) > limit:
+                    yield piece[:limit - sent]
+                    raise ConnectionResetError(errno.ECONNRESET, "Injected truncation")
+                if fault.bandwidth:
+                    # Hold each piece back until the cap allows for it to have arrived.
+                    ahead = (sent + len(piece)) / fault.bandwidth - (time.monotonic() - began)
+                    if ahead > 0:
+                        time.sleep(ahead)
+                yield piece
+                sent += len(piece)
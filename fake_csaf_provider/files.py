@@ -1,7 +1,17 @@
 import datetime
 import flask
-import json
+import hashlib
+import os
+import tempfile
+import threading
 from pathlib import Path
+from werkzeug.http import is_resource_modified
+from werkzeug.wsgi import wrap_file
+
+from .compression import MIN_SIZE, SUFFIXES, compress, negotiate_encoding, variant_etag
+from .corpus import CorpusEntry, CorpusIndex, HASH_SUFFIXES, SIDECAR_SUFFIXES, find_tlps, scan_corpus, update_corpus
+from .pack import PackSlice
+from .signing import SignatureCache, signature
 
 
 def find_csaf_dir():
@@ -15,67 +25,291 @@ def find_csaf_dir():
     return csaf_dir
 
 
-_csaf_dir = find_csaf_dir()
+# Resolved on first use, as packs and virtual corpora are served without a directory tree.
+_csaf_dir: Path | None = None
+_csaf_dir_lock = threading.Lock()
+_signature_cache: SignatureCache | None = None
+
+_corpus_index = CorpusIndex([])
+_corpus_index_lock = threading.Lock()
+# Set when serving a generated corpus from memory instead of the directory tree, see generate.VirtualCorpus.
+_virtual_corpus = None
+# Set when serving a memory-mapped pack instead of the directory tree, see pack.Pack.
+_pack = None
+
+
+def get_csaf_dir() -> Path:
+    global _csaf_dir
+    with _csaf_dir_lock:
+        if _csaf_dir is None:
+            _csaf_dir = find_csaf_dir()
+        return _csaf_dir
+
+
+def _cache_path(name: str) -> Path:
+    """Where the cache with the given name is kept: next to the pack or to 'csafs/some' rather than inside them, so
+    that it is never mistaken for an advisory, or in the temporary directory for a virtual corpus."""
+    if _pack is not None:
+        return _pack.path.with_name(f'{_pack.path.stem}.{name}')
+    if _virtual_corpus is not None:
+        return Path(tempfile.gettempdir()) / f'fake_csaf_provider.virtual.{name}'
+    return get_csaf_dir().parent / f'some.{name}'
+
+
+def initialize_corpus_index(workers: int | None = None):
+    csaf_dir = get_csaf_dir()
+    index = scan_corpus(csaf_dir, find_tlps(csaf_dir), cache_path=_cache_path('index.sqlite'), workers=workers)
+    global _corpus_index
+    with _corpus_index_lock:
+        _corpus_index = index
+
+
+def use_virtual_corpus(virtual_corpus):
+    index = virtual_corpus.index()
+    global _corpus_index, _virtual_corpus
+    with _corpus_index_lock:
+        _corpus_index = index
+        _virtual_corpus = virtual_corpus
+
+
+def use_pack(pack):
+    index = pack.index()
+    global _corpus_index, _pack
+    with _corpus_index_lock:
+        _corpus_index = index
+        _pack = pack
+
+
+def refresh_corpus_index() -> bool:
+    """Apply changes in the directory tree to the index. Returns whether anything changed."""
+    if _virtual_corpus is not None or _pack is not None:
+        return False
+    index = get_corpus_index()
+    # Also the TLPs known to the index, so that the advisories of a removed TLP directory are dropped.
+    csaf_dir = get_csaf_dir()
+    tlps = sorted(set(find_tlps(csaf_dir)) | set(index.tlps()))
+    index = update_corpus(index, csaf_dir, tlps, cache_path=_cache_path('index.sqlite'))
+    if index is None:
+        return False
+    global _corpus_index
+    with _corpus_index_lock:
+        _corpus_index = index
+    return True
+
+
+def get_corpus_index() -> CorpusIndex:
+    with _corpus_index_lock:
+        return _corpus_index
+
+
+def corpus_path(entry: CorpusEntry, suffix: str = '') -> Path:
+    """Where the advisory, or its sidecar with the given suffix, is stored."""
+    return get_csaf_dir() / f'{entry.relative_path}{suffix}'
+
 
+def read_document(entry: CorpusEntry) -> bytes:
+    if _pack is not None:
+        return _pack.read(entry)
+    return corpus_path(entry).read_bytes()
 
-def find_white_year_dirs():
-    path = _csaf_dir / 'white'
-    dirs = []
-    for entry in path.iterdir():
-        if entry.is_dir() and entry.name.isdigit():
-            dirs.append(entry.name)
-    return dirs
 
+def get_signature_cache() -> SignatureCache:
+    global _signature_cache
+    # Resolved before taking the lock, which get_csaf_dir() takes, too.
+    path = _cache_path('signatures.sqlite') if _signature_cache is None else None
+    with _csaf_dir_lock:
+        if _signature_cache is None:
+            _signature_cache = SignatureCache(path)
+        return _signature_cache
 
-def find_white_advisory_files():
-    path = _csaf_dir / 'white'
-    files = []
-    for year in find_white_year_dirs():
-        year_path = path / year
-        for entry in year_path.iterdir():
-            if entry.is_file() and entry.name.endswith('.json'):
-                files.append((year, entry.name))
-    return files
 
+def offers_sidecar(entry: CorpusEntry, suffix: str, hashes_from_index: bool = False, signatures: str = 'disk') -> bool:
+    """Whether the advisory's sidecar is offered: from disk, from the index, or signed with the test key."""
+    if suffix in HASH_SUFFIXES:
+        return entry.has_sidecar(suffix) or (hashes_from_index and entry.digest is not None)
+    if signatures == 'disk':
+        return entry.has_sidecar(suffix)
+    # Signed on request, which takes the advisory's digest; the virtual corpus renders it to get one.
+    return signatures != 'missing' and (_virtual_corpus is not None or entry.digest is not None)
 
-def csaf_file_exists(tlp, year, filename):
-    path = _csaf_dir / tlp / year / filename
-    return path.is_file()
 
+def find_corpus_entry(tlp: str, year: str, filename: str, hashes_from_index: bool = False,
+                      signatures: str = 'disk') -> tuple[CorpusEntry | None, str]:
+    """Resolve a requested file name to its advisory, also accepting the advisory's sidecar files."""
+    index = get_corpus_index()
+    for suffix in SIDECAR_SUFFIXES:
+        if filename.endswith(suffix):
+            entry = index.get(tlp, year, filename[:-len(suffix)])
+            if entry and offers_sidecar(entry, suffix, hashes_from_index, signatures):
+                return entry, suffix
+            return None, suffix
+    return index.get(tlp, year, filename), ''
 
-def send_csaf(tlp, year, filename):
-    path = _csaf_dir / tlp / year / filename
-    if not path.is_file():
+
+def document_etag(entry: CorpusEntry) -> str:
+    """A strong ETag for the advisory: its SHA-256 as computed while indexing, else derived from mtime and size."""
+    if entry.etag is None:
+        entry.etag = entry.hexdigest() or f'{entry.mtime:.6f}-{entry.size}'
+    return entry.etag
+
+
+# Compressed advisories known to be up to date, keyed by advisory and encoding.
+# A variant is only valid for the very index entry it was checked against.
+_variants: dict[tuple[tuple[str, str, str], str], tuple[CorpusEntry, Path, int]] = {}
+_variants_lock = threading.Lock()
+
+
+def compressed_variant(entry: CorpusEntry, encoding: str) -> tuple[Path, int]:
+    """Path and size of the compressed advisory, compressing it on first request and keeping it on disk across restarts."""
+    with _variants_lock:
+        hit = _variants.get((entry.key, encoding))
+    if hit and hit[0] is entry:
+        return hit[1], hit[2]
+
+    path = _cache_path('compressed') / f'{entry.relative_path}{SUFFIXES[encoding]}'
+    try:
+        stat = path.stat()
+        up_to_date = abs(stat.st_mtime - entry.mtime) < 0.001
+        size = stat.st_size
+    except FileNotFoundError:
+        up_to_date = False
+    if not up_to_date:
+        data = compress(read_document(entry), encoding)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        temp_path = path.with_name(f'{path.name}.{os.getpid()}.{threading.get_ident()}.tmp')
+        temp_path.write_bytes(data)
+        # The variant inherits the advisory's mtime, which is how it is recognised as current after a restart.
+        os.utime(temp_path, (entry.mtime, entry.mtime))
+        os.replace(temp_path, path)
+        size = len(data)
+    with _variants_lock:
+        _variants[(entry.key, encoding)] = (entry, path, size)
+    return path, size
+
+
+def send_csaf(tlp, year, filename, hashes_from_index: bool = False, signatures: str = 'disk'):
+    entry, suffix = find_corpus_entry(tlp, year, filename, hashes_from_index, signatures)
+    if entry is None:
         flask.abort(404, description="CSAF file not found")
-    return flask.send_file(str(path), mimetype='application/json')
+    if suffix == '.asc' and signatures in ('valid', 'invalid'):
+        return _send_signature(entry, signatures == 'valid')
+    if _virtual_corpus is not None:
+        return _send_virtual(entry, suffix)
+    if hashes_from_index and suffix in HASH_SUFFIXES:
+        return _send_hash(entry, suffix)
+    if suffix and _pack is not None:
+        return _send_packed_sidecar(entry, suffix)
+    if suffix:
+        # Sidecars are tiny and not part of the index, so werkzeug may as well stat them.
+        return flask.send_file(str(corpus_path(entry, suffix)), mimetype='application/json')
 
+    # Everything needed for the headers is in the index, so an unchanged advisory is answered without touching the disk.
+    encoding = negotiate_encoding(flask.request) if entry.size >= MIN_SIZE else None
+    etag = variant_etag(document_etag(entry), encoding)
+    last_modified = datetime.datetime.fromtimestamp(entry.mtime, datetime.timezone.utc)
+    environ = flask.request.environ
+    if not is_resource_modified(environ, etag=etag, last_modified=last_modified):
+        response = flask.Response(status=304)
+        response.set_etag(etag)
+        response.last_modified = last_modified
+        response.vary.add('Accept-Encoding')
+        return response
 
-def read_current_release_date(path: str) -> datetime.datetime:
-    p = Path(path)
-    with p.open('r', encoding='utf-8') as f:
-        data = json.load(f)
+    size = entry.size
     try:
-        datestring = data['document']['tracking']['current_release_date']
-        return datetime.datetime.fromisoformat(datestring.replace('Z', '+00:00'))
-    except (KeyError, TypeError) as err:
-        raise ValueError("current_release_date not found in JSON") from err
+        if encoding:
+            path, size = compressed_variant(entry, encoding)
+        elif _pack is None:
+            path = corpus_path(entry)
+        if _pack is not None and not encoding:
+            # A slice of the mapping, so the advisory is neither opened nor read into memory up front.
+            body = PackSlice(_pack.view(entry))
+        else:
+            # wrap_file uses the server's wsgi.file_wrapper, which sends the file with sendfile() where supported.
+            body = wrap_file(environ, open(path, 'rb'))
+    except OSError:
+        flask.abort(404, description="CSAF file not found")
+    response = flask.Response(body, mimetype='application/json', direct_passthrough=True)
+    response.content_length = size
+    response.vary.add('Accept-Encoding')
+    if encoding:
+        response.headers['Content-Encoding'] = encoding
+    response.set_etag(etag)
+    response.last_modified = last_modified
+    response.cache_control.no_cache = True
+    response.accept_ranges = 'bytes'
+    return response.make_conditional(environ, accept_ranges=True, complete_length=size)
 
 
-def collect_current_release_dates() -> dict[(str, str), datetime.datetime]:
-    dates = {}
-    for year, filename in find_white_advisory_files():
-        path = _csaf_dir / 'white' / year / filename
+def _send_packed_sidecar(entry: CorpusEntry, suffix: str):
+    response = flask.Response(_pack.read(entry, suffix), mimetype='application/json')
+    response.set_etag(f'{document_etag(entry)}{suffix}')
+    response.last_modified = datetime.datetime.fromtimestamp(entry.mtime, datetime.timezone.utc)
+    response.cache_control.no_cache = True
+    return response.make_conditional(flask.request)
+
+
+def sha512_hexdigest(entry: CorpusEntry) -> str:
+    """The SHA-512 digest of the advisory, which the index does not keep. Hashed in chunks, from the pack's mapping or
+    from the file."""
+    if _pack is not None:
+        return hashlib.sha512(_pack.view(entry)).hexdigest()
+    with open(corpus_path(entry), 'rb') as f:
+        return hashlib.file_digest(f, 'sha512').hexdigest()
+
+
+def _send_hash(entry: CorpusEntry, suffix: str):
+    """Answer with the sidecar's content, in the format of sha256sum and sha512sum. The SHA-256 digest was computed
+    while indexing, the SHA-512 digest is only computed for requests the ETag does not answer."""
+    etag = f'{document_etag(entry)}{suffix}'
+    last_modified = datetime.datetime.fromtimestamp(entry.mtime, datetime.timezone.utc)
+    if not is_resource_modified(flask.request.environ, etag=etag, last_modified=last_modified):
+        response = flask.Response(status=304)
+    else:
         try:
-            date = read_current_release_date(path)
-            dates[(year, filename)] = date
-        except ValueError:
-            continue
-    return dates
-
-
-def read_csaf_id(year: str, file: str) -> str:
-    path = _csaf_dir / 'white' / year / file
-    with path.open('r', encoding='utf-8') as f:
-        csaf = f.read()
-    csaf_json = json.loads(csaf)
-    return csaf_json.get("document", {}).get("tracking", {}).get("id", "")
\ No newline at end of file
+            hexdigest = entry.hexdigest() if suffix == '.sha256' else sha512_hexdigest(entry)
+        except OSError:
+            flask.abort(404, description="CSAF file not found")
+        response = flask.Response(f'{hexdigest}  {entry.filename}\n', mimetype='text/plain')
+    response.set_etag(etag)
+    response.last_modified = last_modified
+    response.cache_control.no_cache = True
+    return response
+
+
+def _send_signature(entry: CorpusEntry, valid: bool):
+    """Answer with a detached signature made with the test key, or with one that does not verify."""
+    if _virtual_corpus is not None:
+        read = lambda: _virtual_corpus.read(entry)
+        sha256 = hashlib.sha256(read()).digest()
+    elif entry.digest is not None:
+        read = lambda: read_document(entry)
+        sha256 = entry.digest
+    else:
+        flask.abort(404, description="CSAF file not found")
+    armored = signature(get_signature_cache(), sha256, read, valid)
+    if armored is None:
+        flask.abort(404, description="No OpenPGP key to sign with")
+    response = flask.Response(armored, mimetype='application/pgp-signature')
+    response.set_etag(hashlib.sha256(armored).hexdigest()[:32])
+    response.cache_control.no_cache = True
+    return response.make_conditional(flask.request)
+
+
+def _send_virtual(entry: CorpusEntry, suffix: str):
+    data = _virtual_corpus.read(entry, suffix)
+    encoding = negotiate_encoding(flask.request) if not suffix and len(data) >= MIN_SIZE else None
+    if entry.etag is None:
+        entry.etag = hashlib.sha256(_virtual_corpus.read(entry)).hexdigest()
+    etag = variant_etag(f'{entry.etag}{suffix}', encoding)
+    if encoding:
+        data = compress(data, encoding, best=False)
+    response = flask.Response(data, mimetype='application/json')
+    response.vary.add('Accept-Encoding')
+    if encoding:
+        response.headers['Content-Encoding'] = encoding
+    response.set_etag(etag)
+    response.last_modified = datetime.datetime.fromtimestamp(entry.mtime, datetime.timezone.utc)
+    response.cache_control.no_cache = True
+    response.accept_ranges = 'bytes'
+    return response.make_conditional(flask.request.environ, accept_ranges=True, complete_length=len(data))
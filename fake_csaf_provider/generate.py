@@ -0,0 +1,238 @@
+"""
+Generate synthetic CSAF 2.0 documents, to scale the test corpus far beyond the downloaded examples.
+
+Every document is derived from the seed and its number alone, so a corpus is reproducible and can be
+generated in parallel, either onto disk or as a virtual corpus that is rendered from memory on request.
+
+Documents come with .sha256 and .sha512 sidecars, but without .asc signatures: those are made with the test key,
+by the server with `--signatures valid` or `invalid`, or on disk by `python -m fake_csaf_provider.sidecars --sign`.
+"""
+
+import argparse
+import concurrent.futures
+import datetime
+import functools
+import hashlib
+import json
+import os
+import pathlib
+import random
+import time
+from typing import NamedTuple
+
+from .corpus import CorpusEntry, CorpusIndex, PARALLEL_SCAN_THRESHOLD
+
+
+TLP_LABELS = {'white': 'WHITE', 'green': 'GREEN', 'amber': 'AMBER', 'red': 'RED'}
+DEFAULT_YEARS = (2016, 2025)
+# Documents are generated and written in chunks of this many, one chunk per task of the process pool.
+CHUNK_SIZE = 1000
+
+_WORDS = (
+    'advisory affected attacker authentication buffer bypass certificate component configuration crafted '
+    'denial device disclosure execution exploit firmware function handling improper information injection '
+    'input kernel library local malicious memory network overflow packet parser password privilege product '
+    'remote request sensitive server service session update user validation version vulnerability'
+).split()
+
+
+class DocumentSpec(NamedTuple):
+    seed: int
+    number: int
+    tlp: str
+    year: str
+    id: str
+    filename: str
+    initial_release_date: datetime.datetime
+    current_release_date: datetime.datetime
+    revisions: int
+    notes_length: int
+
+
+def document_spec(seed: int, number: int, tlps: tuple[str, ...], years: tuple[int, int]) -> DocumentSpec:
+    """Draw everything but the text of document `number`. Cheap enough to index a million documents."""
+    rng = random.Random(f'{seed}:{number}')
+    tlp = rng.choice(tlps)
+    year = rng.randint(*years)
+    initial = datetime.datetime(year, 1, 1, tzinfo=datetime.timezone.utc) + datetime.timedelta(seconds=rng.randrange(365 * 86400))
+    revisions = rng.choice((1, 1, 1, 2, 2, 3, 5))
+    current = initial + datetime.timedelta(seconds=rng.randrange(180 * 86400)) if revisions > 1 else initial
+    # Log-normal, like real advisories: most are a few kilobytes, a few are hundreds.
+    notes_length = min(500_000, int(rng.lognormvariate(8, 1.2)))
+    id = f'FAKE-{TLP_LABELS[tlp]}-{year}-{number:07d}'
+    # File names as required by CSAF 2.0, section 5.1.
+    filename = f'{id.lower()}.json'
+    return DocumentSpec(seed, number, tlp, str(year), id, filename, initial, current, revisions, notes_length)
+
+
+def _iso(date: datetime.datetime) -> str:
+    return date.isoformat().replace('+00:00', 'Z')
+
+
+@functools.lru_cache(maxsize=128)
+def render_document(spec: DocumentSpec) -> bytes:
+    """A valid CSAF 2.0 document of profile 'CSAF Base'."""
+    rng = random.Random(f'{spec.seed}:{spec.number}:text')
+    words = rng.choices(_WORDS, k=max(1, spec.notes_length // 8))
+    step = (spec.current_release_date - spec.initial_release_date) / max(1, spec.revisions - 1)
+    document = {
+      "document": {
+        "category": "csaf_base",
+        "csaf_version": "2.0",
+        "distribution": {
+          "tlp": {
+            "label": TLP_LABELS[spec.tlp],
+            "url": "https://www.first.org/tlp/"
+          }
+        },
+        "lang": "en",
+        "notes": [
+          {
+            "category": "summary",
+            "text": ' '.join(words)
+          }
+        ],
+        "publisher": {
+          "category": "vendor",
+          "name": "Some Fake CSAF Provider",
+          "namespace": "https://example.com"
+        },
+        "title": f"Synthetic advisory {spec.id}",
+        "tracking": {
+          "current_release_date": _iso(spec.current_release_date),
+          "id": spec.id,
+          "initial_release_date": _iso(spec.initial_release_date),
+          "revision_history": [
+            {
+              "date": _iso(spec.initial_release_date + step * revision),
+              "number": str(revision + 1),
+              "summary": "Initial version." if revision == 0 else "Update."
+            }
+            for revision in range(spec.revisions)
+          ],
+          "status": "final",
+          "version": str(spec.revisions)
+        }
+      }
+    }
+    return json.dumps(document, indent=2).encode('utf-8')
+
+
+def render_sidecar(spec: DocumentSpec, suffix: str) -> bytes:
+    data = render_document(spec)
+    if suffix == '.sha256':
+        return f'{hashlib.sha256(data).hexdigest()}  {spec.filename}\n'.encode('ascii')
+    if suffix == '.sha512':
+        return f'{hashlib.sha512(data).hexdigest()}  {spec.filename}\n'.encode('ascii')
+    raise ValueError(f"Unknown sidecar: {suffix}")
+
+
+def _specs(seed: int, numbers: range, tlps: tuple[str, ...], years: tuple[int, int]) -> list[DocumentSpec]:
+    return [document_spec(seed, number, tlps, years) for number in numbers]
+
+
+def _write_chunk(output: str, seed: int, numbers: range, tlps: tuple[str, ...], years: tuple[int, int]) -> int:
+    written = 0
+    for spec in _specs(seed, numbers, tlps, years):
+        directory = pathlib.Path(output) / spec.tlp / spec.year
+        directory.mkdir(parents=True, exist_ok=True)
+        path = directory / spec.filename
+        path.write_bytes(render_document(spec))
+        for suffix in ('.sha256', '.sha512'):
+            path.with_name(f'{spec.filename}{suffix}').write_bytes(render_sidecar(spec, suffix))
+        # The modification time follows the document, which keeps Last-Modified plausible.
+        mtime = spec.current_release_date.timestamp()
+        os.utime(path, (mtime, mtime))
+        written += 1
+    return written
+
+
+def _chunks(count: int) -> list[range]:
+    return [range(start, min(start + CHUNK_SIZE, count)) for start in range(0, count, CHUNK_SIZE)]
+
+
+def generate_corpus(output: pathlib.Path, count: int, seed: int = 0, tlps: tuple[str, ...] = ('white',),
+                    years: tuple[int, int] = DEFAULT_YEARS, workers: int | None = None) -> int:
+    """Write `count` documents with their sidecars into `output`, laid out as <tlp>/<year>/<file>."""
+    chunks = _chunks(count)
+    with concurrent.futures.ProcessPoolExecutor(max_workers=workers) as pool:
+        futures = [pool.submit(_write_chunk, str(output), seed, chunk, tlps, years) for chunk in chunks]
+        return sum(future.result() for future in futures)
+
+
+class VirtualCorpus:
+    """A generated corpus that exists in memory only. Documents are rendered when requested, never stored."""
+
+    def __init__(self, count: int, seed: int = 0, tlps: tuple[str, ...] = ('white',),
+                 years: tuple[int, int] = DEFAULT_YEARS, workers: int | None = None):
+        self.count = count
+        self.seed = seed
+        self.tlps = tlps
+        self.years = years
+        self.workers = workers
+
+    def index(self) -> CorpusIndex:
+        started = time.perf_counter()
+        if self.count >= PARALLEL_SCAN_THRESHOLD:
+            with concurrent.futures.ProcessPoolExecutor(max_workers=self.workers) as pool:
+                futures = [pool.submit(_specs, self.seed, chunk, self.tlps, self.years) for chunk in _chunks(self.count)]
+                specs = [spec for future in futures for spec in future.result()]
+        else:
+            specs = _specs(self.seed, range(self.count), self.tlps, self.years)
+        entries = [self._entry(spec) for spec in specs]
+        print(f"Generated a virtual corpus of {len(entries)} CSAF documents in {time.perf_counter() - started:.2f}s")
+        return CorpusIndex(entries)
+
+    @staticmethod
+    def _entry(spec: DocumentSpec) -> CorpusEntry:
+        entry = CorpusEntry(spec.tlp, spec.year, spec.filename)
+        entry.id = spec.id
+        entry.current_release_date = spec.current_release_date
+        entry.initial_release_date = spec.initial_release_date
+        entry.tlp_label = TLP_LABELS[spec.tlp]
+        # The size is only known once rendered; the release date stands in for the modification time.
+        entry.mtime = spec.current_release_date.timestamp()
+        entry.sha256 = entry.sha512 = True
+        return entry
+
+    def spec(self, entry: CorpusEntry) -> DocumentSpec:
+        number = int(entry.id.rsplit('-', 1)[1])
+        return document_spec(self.seed, number, self.tlps, self.years)
+
+    def read(self, entry: CorpusEntry, suffix: str = '') -> bytes:
+        spec = self.spec(entry)
+        return render_sidecar(spec, suffix) if suffix else render_document(spec)
+
+
+def parse_years(value: str) -> tuple[int, int]:
+    first, _, last = value.partition('-')
+    return int(first), int(last or first)
+
+
+def parse_tlps(value: str) -> tuple[str, ...]:
+    tlps = tuple(tlp.strip().lower() for tlp in value.split(',') if tlp.strip())
+    unknown = [tlp for tlp in tlps if tlp not in TLP_LABELS]
+    if unknown or not tlps:
+        raise argparse.ArgumentTypeError(f"TLPs must be some of {', '.join(TLP_LABELS)}")
+    return tlps
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--count', type=int, required=True, help="Number of documents to generate.")
+    parser.add_argument('--output', type=pathlib.Path,
+                        default=pathlib.Path(__file__).resolve().parents[1] / 'csafs' / 'some',
+                        help="Directory to write to. Defaults to the directory the server serves.")
+    parser.add_argument('--seed', type=int, default=0, help="The same seed and count always yield the same corpus.")
+    parser.add_argument('--tlps', type=parse_tlps, default=('white',), help="Comma-separated TLPs to spread documents over.")
+    parser.add_argument('--years', type=parse_years, default=DEFAULT_YEARS, help="Range of initial release years, e.g. 2016-2025.")
+    parser.add_argument('--workers', type=int, default=None, help="Number of worker processes.")
+    return parser.parse_args()
+
+
+if __name__ == '__main__':
+    args = parse_args()
+    started = time.perf_counter()
+    written = generate_corpus(args.output, args.count, args.seed, args.tlps, args.years, args.workers)
+    elapsed = time.perf_counter() - started
+    print(f"Generated {written} CSAF documents in {args.output} in {elapsed:.2f}s ({written / elapsed:.0f} documents/s)")
@@ -0,0 +1,313 @@
+"""
+A journal of the most recent requests: who fetched what, when, with which status, size and latency.
+
+Records are kept in a fixed-size ring buffer, so memory stays bounded and the oldest records are overwritten.
+Appending takes no lock: the slot is claimed with next() on an itertools.count and filled with a single store,
+both atomic under the GIL. With several worker processes, each keeps its own ring, and writes it to a shared
+directory only when the journal is queried.
+
+/journal summarizes the records per client, e.g. how much of the corpus a crawler downloaded and how often it
+downloaded the same document again. /journal/dump returns the records in a compact binary form, which
+`python -m fake_csaf_provider.replay` re-issues against the server.
+"""
+
+import flask
+import itertools
+import os
+import struct
+import threading
+import time
+from pathlib import Path
+from typing import NamedTuple
+
+from .providers import BASE_URL_KEY, DEFAULT_BASE_URL, DEFAULT_PROVIDER, ENVIRON_KEY as PROVIDER_ENVIRON_KEY
+
+
+DEFAULT_CAPACITY = 65536
+MAGIC = b'CSAFJRNL'
+VERSION = 1
+# Magic, version, requests recorded in total, strings, records.
+HEADER = struct.Struct('<8sIQII')
+STRING_LENGTH = struct.Struct('<H')
+# Time, latency, the string indices of client, provider, base URL, method, path, route and document, status, size.
+RECORD = struct.Struct('<dfIIIIIIIHQ')
+FLUSH_INTERVAL_SECONDS = 1.0
+# Successful fetches of a document, as opposed to revalidations.
+DOWNLOAD_STATUSES = (200, 206)
+
+
+class JournalRecord(NamedTuple):
+    # When the request arrived, and how long until its response headers were ready.
+    time: float
+    latency: float
+    client: str
+    provider: str
+    base_url: str
+    method: str
+    # Below the base URL, with the query string.
+    path: str
+    route: str
+    # '<tlp>/<year>/<filename>' for requests of an advisory, else ''.
+    document: str
+    status: int
+    size: int
+
+
+class Journal:
+    """A ring buffer of the last capacity records. Written without locks, and read as a snapshot."""
+
+    def __init__(self, capacity: int):
+        self.capacity = capacity
+        self._slots: list[tuple | None] = [None] * capacity
+        self._sequence = itertools.count()
+
+    def append(self, record: JournalRecord):
+        sequence = next(self._sequence)
+        self._slots[sequence % self.capacity] = (sequence, record)
+
+    def snapshot(self) -> tuple[int, list[JournalRecord]]:
+        """How many records were appended in total, and the retained ones, oldest first."""
+        # Copying a list holds the GIL throughout, so no slot changes halfway.
+        slots = sorted(slot for slot in list(self._slots) if slot is not None)
+        recorded = slots[-1][0] + 1 if slots else 0
+        return recorded, [record for _, record in slots]
+
+
+_journal: Journal | None = Journal(DEFAULT_CAPACITY)
+_journal_dir: Path | None = None
+# The latest query of the journal this process has flushed for, as the mtime of the request file.
+_answered = 0.0
+
+
+def use_journal(capacity: int, path: Path | None = None):
+    """Keep the last capacity requests, or none for 0. With several workers, path is where they share their
+    journals. Must be called before serving."""
+    global _journal, _journal_dir
+    _journal = Journal(capacity) if capacity > 0 else None
+    _journal_dir = path
+
+
+def start_request():
+    flask.g.journal_started = time.perf_counter()
+
+
+def finish_request(response, client: str):
+    """Record the request. The latency is the time until the response headers are ready."""
+    started = getattr(flask.g, 'journal_started', None)
+    if _journal is None or started is None:
+        return response
+    request = flask.request
+    rule = request.url_rule
+    route = rule.rule if rule else 'unmatched'
+    if route.startswith('/journal'):
+        return response
+    environ = request.environ
+    arguments = request.view_args or {}
+    filename = arguments.get('filename', '')
+    document = f"{arguments['tlp']}/{arguments['year']}/{filename}" if filename.endswith('.json') else ''
+    query = environ.get('QUERY_STRING')
+    latency = time.perf_counter() - started
+    record = JournalRecord(
+        time.time() - latency,
+        latency,
+        client,
+        environ.get(PROVIDER_ENVIRON_KEY, DEFAULT_PROVIDER),
+        environ.get(BASE_URL_KEY, DEFAULT_BASE_URL),
+        request.method,
+        f'{request.path}?{query}' if query else request.path,
+        route,
+        document,
+        response.status_code,
+        response.content_length or 0,
+    )
+    if response.content_length is None and response.is_streamed and not response.direct_passthrough:
+        # The size of a streamed body is only known once it is sent.
+        response.response = _recording(response.response, record)
+    else:
+        _journal.append(record)
+    return response
+
+
+def _recording(chunks, record: JournalRecord):
+    sent = 0
+    try:
+        for chunk in chunks:
+            sent += len(chunk)
+            yield chunk
+    finally:
+        _journal.append(record._replace(size=sent))
+
+
+def encode(recorded: int, records: list[JournalRecord]) -> bytes:
+    """The compact form: a table of the distinct strings, and a fixed-size record referring to them."""
+    strings: dict[str, int] = {}
+    packed = []
+    for record in records:
+        indices = [strings.setdefault(value, len(strings)) for value in record[2:9]]
+        packed.append(RECORD.pack(record.time, record.latency, *indices, record.status, record.size))
+    table = []
+    for value in strings:
+        data = value.encode('utf-8')
+        table.append(STRING_LENGTH.pack(len(data)) + data)
+    return b''.join([HEADER.pack(MAGIC, VERSION, recorded, len(strings), len(records)), *table, *packed])
+
+
+def decode(data: bytes) -> tuple[int, list[JournalRecord]]:
+    magic, version, recorded, string_count, record_count = HEADER.unpack_from(data, 0)
+    if magic != MAGIC or version != VERSION:
+        raise ValueError(f"not a request journal of version {VERSION}")
+    offset = HEADER.size
+    strings = []
+    for _ in range(string_count):
+        (length,) = STRING_LENGTH.unpack_from(data, offset)
+        offset += STRING_LENGTH.size
+        strings.append(data[offset:offset + length].decode('utf-8'))
+        offset += length
+    records = []
+    for fields in RECORD.iter_unpack(data[offset:offset + record_count * RECORD.size]):
+        records.append(JournalRecord(fields[0], fields[1], *(strings[index] for index in fields[2:9]), fields[9], fields[10]))
+    return recorded, records
+
+
+def _snapshot_path(pid: int) -> Path:
+    return _journal_dir / f'journal-{pid}.bin'
+
+
+def _request_path() -> Path:
+    return _journal_dir / 'journal.requested'
+
+
+def flush():
+    """Write this process' journal for the other workers to see."""
+    path = _snapshot_path(os.getpid())
+    temp_path = path.with_name(f'{path.name}.{threading.get_ident()}.tmp')
+    temp_path.write_bytes(encode(*_journal.snapshot()))
+    os.replace(temp_path, path)
+
+
+def _alive(path: Path) -> bool:
+    try:
+        os.kill(int(path.stem.removeprefix('journal-')), 0)
+    except ProcessLookupError:
+        return False
+    except (OSError, ValueError):
+        pass
+    return True
+
+
+def _flush_on_request():
+    global _answered
+    # An empty journal up front tells collect() to wait for this worker.
+    flush()
+    while True:
+        time.sleep(FLUSH_INTERVAL_SECONDS / 4)
+        try:
+            requested = _request_path().stat().st_mtime
+            if requested > _answered:
+                _answered = requested
+                flush()
+        except FileNotFoundError:
+            continue
+        except OSError as err:
+            print(f"Could not write journal: {err}")
+
+
+def start_journal_flusher() -> threading.Thread | None:
+    if _journal is None or _journal_dir is None:
+        return None
+    thread = threading.Thread(target=_flush_on_request, name='journal-flusher', daemon=True)
+    thread.start()
+    return thread
+
+
+def collect() -> tuple[int, list[JournalRecord]]:
+    """The records of all worker processes, oldest first."""
+    if _journal_dir is None:
+        return _journal.snapshot()
+    request_path = _request_path()
+    request_path.touch()
+    # Compared with the mtimes of the journals rather than with the clock, as file times are coarser.
+    requested = request_path.stat().st_mtime
+    flush()
+    # Waits for the other workers to flush, or for as long as it takes them at most. Journals of exited
+    # workers are kept, like their metrics, but not waited for.
+    deadline = time.monotonic() + 2 * FLUSH_INTERVAL_SECONDS
+    paths = list(_journal_dir.glob('journal-*.bin'))
+    waiting = [path for path in paths if _alive(path)]
+    while time.monotonic() < deadline and any(path.stat().st_mtime < requested for path in waiting):
+        time.sleep(FLUSH_INTERVAL_SECONDS / 10)
+    recorded, records = 0, []
+    for path in paths:
+        try:
+            count, snapshot = decode(path.read_bytes())
+        except (OSError, ValueError):
+            continue
+        recorded += count
+        records.extend(snapshot)
+    records.sort(key=lambda record: record.time)
+    return recorded, records
+
+
+def summarize(records: list[JournalRecord], corpus_size: int) -> list[dict]:
+    """Per provider and client: requests, bytes, errors, and how much of the corpus was downloaded how often."""
+    clients: dict[tuple[str, str], dict] = {}
+    for record in records:
+        key = (record.provider, record.client)
+        summary = clients.get(key)
+        if summary is None:
+            summary = clients[key] = {
+                "provider": record.provider,
+                "client": record.client,
+                "requests": 0,
+                "bytes": 0,
+                "errors": 0,
+                "first": record.time,
+                "last": record.time,
+                "downloads": 0,
+                "documents": set(),
+                "downloaded": set(),
+            }
+        summary["requests"] += 1
+        summary["bytes"] += record.size
+        summary["last"] = record.time
+        if record.status >= 400:
+            summary["errors"] += 1
+        if record.document and record.status < 400:
+            # A revalidation answered with 304 covers the document, too.
+            summary["documents"].add(record.document)
+            if record.status in DOWNLOAD_STATUSES:
+                summary["downloads"] += 1
+                summary["downloaded"].add(record.document)
+    result = []
+    for summary in clients.values():
+        documents = len(summary.pop("documents"))
+        summary["documents"] = documents
+        summary["duplicate_downloads"] = summary["downloads"] - len(summary.pop("downloaded"))
+        summary["coverage"] = round(documents / corpus_size, 6) if corpus_size else 0.0
+        result.append(summary)
+    return sorted(result, key=lambda summary: (summary["provider"], summary["client"]))
+
+
+def journal_response(corpus_size: int):
+    """The journal summarized per client, optionally only for ?client=<address>."""
+    if _journal is None:
+        flask.abort(404, description="The request journal is disabled")
+    recorded, records = collect()
+    client = flask.request.args.get('client')
+    if client is not None:
+        records = [record for record in records if record.client == client]
+    return flask.jsonify({
+        "capacity": _journal.capacity,
+        "recorded": recorded,
+        "retained": len(records),
+        "corpus_documents": corpus_size,
+        "clients": summarize(records, corpus_size),
+    })
+
+
+def dump_response():
+    if _journal is None:
+        flask.abort(404, description="The request journal is disabled")
+    response = flask.Response(encode(*collect()), mimetype='application/octet-stream')
+    response.headers['Content-Disposition'] = 'attachment; filename="requests.journal"'
+    return response
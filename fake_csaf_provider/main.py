@@ -2,21 +2,115 @@
 A simple, dynamically configurable, fake CSAF provider server used for testing.
 """
 
+import argparse
 import pathlib
+import tempfile
 
-from .consts import port
+from .asgi import app as asgi_app
+from .backends import InMemoryBackend, SharedBackend
+from .consts import corpus_poll_interval_seconds, port
+from .faults import limit_slow_requests
+from .generate import VirtualCorpus
+from .journal import DEFAULT_CAPACITY as DEFAULT_JOURNAL_CAPACITY, start_journal_flusher, use_journal
+from .pack import Pack
+from .metrics import start_metrics_flusher, use_metrics_dir
+from .providers import validate_provider_name
+from .serve import BACKENDS, serve_gunicorn, serve_hypercorn, serve_uvicorn, serve_werkzeug, werkzeug_ssl_context
 from .server import app
-from .state import initialize_current_release_dates
+from .state import initialize_corpus, initialize_pack, initialize_virtual_corpus, use_providers
+from .watcher import start_corpus_watcher
 
 
-initialize_current_release_dates()
-
 project_root = pathlib.Path(__file__).resolve().parents[1]
 cert_path = project_root / "crypto" / "server.crt.pem"
 key_path = project_root / "crypto" / "server.key.pem"
 
+
+def parse_args():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--backend', choices=BACKENDS, default='gunicorn',
+                        help="Server implementation. 'hypercorn' adds HTTP/2 and 'uvicorn' serves the ASGI variant for "
+                             "many concurrent connections, but both need to be installed separately.")
+    parser.add_argument('--workers', type=int, default=1,
+                        help="Number of worker processes (gunicorn and werkzeug only, hypercorn and uvicorn run a single process).")
+    parser.add_argument('--threads', type=int, default=8, help="Threads per worker process (gunicorn only).")
+    parser.add_argument('--slow-requests', type=int, default=None, metavar='COUNT',
+                        help="Apply injected latency and bandwidth faults to at most COUNT requests at once per worker, and "
+                             "answer further ones with 503, as each slowed request holds a thread of the WSGI servers. "
+                             "Defaults to half of --threads for gunicorn. The uvicorn backend waits without threads, "
+                             "and slows down any number of requests.")
+    parser.add_argument('--state-backend', choices=['memory', 'shared'], default=None,
+                        help="Where configuration and rate limits are kept. Defaults to 'shared' for more than one worker.")
+    parser.add_argument('--virtual-corpus', type=int, default=None, metavar='COUNT',
+                        help="Serve COUNT generated documents from memory instead of the documents in 'csafs/some'.")
+    parser.add_argument('--seed', type=int, default=0, help="Seed of the virtual corpus.")
+    parser.add_argument('--pack', type=pathlib.Path, default=None, metavar='PATH',
+                        help="Serve the documents from a pack built by 'python -m fake_csaf_provider.pack', e.g. csafs/some.pack, "
+                             "instead of the documents in 'csafs/some'.")
+    parser.add_argument('--provider', action='append', default=[], metavar='NAME',
+                        help="Also host a virtual provider at https://NAME.providers.localhost:34443 and https://localhost:34443/providers/NAME, "
+                             "with a configuration of its own. Can be repeated.")
+    parser.add_argument('--journal-size', type=int, default=DEFAULT_JOURNAL_CAPACITY, metavar='COUNT',
+                        help="Keep the last COUNT requests per worker for /journal and /journal/dump (0 disables the journal).")
+    parser.add_argument('--client-ca', default=None, metavar='PATH',
+                        help="Ask clients for a certificate issued by this CA, e.g. crypto/ca.crt.pem, to authorize them for "
+                             "protected TLPs (gunicorn and werkzeug only).")
+    parser.add_argument('--debug', action='store_true',
+                        help="Run Flask's development server with debugger and reloader instead.")
+    return parser.parse_args()
+
+
+def start_worker():
+    start_metrics_flusher()
+    start_journal_flusher()
+    if args.virtual_corpus is None and args.pack is None:
+        start_corpus_watcher(corpus_poll_interval_seconds)
+
+
 if __name__ == '__main__':
+    args = parse_args()
+    if args.client_ca and args.backend in ('hypercorn', 'uvicorn') and not args.debug:
+        raise SystemExit("--client-ca is only supported by the gunicorn and werkzeug backends")
+    if args.workers > 1 and (args.debug or args.backend in ('hypercorn', 'uvicorn')):
+        # Rather than ignoring it, while paying for sharing state between processes that do not exist.
+        raise SystemExit("--workers is only supported by the gunicorn and werkzeug backends")
+    for name in args.provider:
+        try:
+            validate_provider_name(name)
+        except ValueError as err:
+            raise SystemExit(str(err)) from None
     if not cert_path.exists() or not key_path.exists():
         raise FileNotFoundError(f"TLS certificate or key not found: {cert_path}, {key_path}\nHave you run the setup script?")
     ssl_ctx = (str(cert_path), str(key_path))
-    app.run(host='127.0.0.1', port=port, debug=True, ssl_context=ssl_ctx)
+    if args.virtual_corpus is not None and args.pack is not None:
+        raise SystemExit("--virtual-corpus and --pack are mutually exclusive")
+    if args.pack is not None:
+        initialize_pack(Pack(args.pack))
+    elif args.virtual_corpus is not None:
+        initialize_virtual_corpus(VirtualCorpus(args.virtual_corpus, args.seed))
+    else:
+        initialize_corpus()
+    state_backend = args.state_backend or ('shared' if args.workers > 1 else 'memory')
+    if state_backend == 'shared':
+        state_dir = pathlib.Path(tempfile.mkdtemp(prefix='fake_csaf_provider_'))
+        use_providers(args.provider, lambda name: SharedBackend(state_dir / f'{name}.state.sqlite'))
+        use_metrics_dir(state_dir)
+        use_journal(args.journal_size, state_dir)
+    else:
+        use_providers(args.provider, lambda name: InMemoryBackend())
+        use_journal(args.journal_size)
+    if args.slow_requests is not None:
+        limit_slow_requests(args.slow_requests)
+    elif args.backend == 'gunicorn' and not args.debug:
+        limit_slow_requests(max(1, args.threads // 2))
+    if args.debug:
+        start_worker()
+        app.run(host='127.0.0.1', port=port, debug=True, ssl_context=werkzeug_ssl_context(ssl_ctx, args.client_ca))
+    elif args.backend == 'gunicorn':
+        serve_gunicorn(app, '127.0.0.1', port, ssl_ctx, args.workers, args.threads, start_worker, args.client_ca)
+    elif args.backend == 'uvicorn':
+        serve_uvicorn(asgi_app, '127.0.0.1', port, ssl_ctx, start_worker)
+    elif args.backend == 'hypercorn':
+        serve_hypercorn(app, '127.0.0.1', port, ssl_ctx, start_worker)
+    else:
+        serve_werkzeug(app, '127.0.0.1', port, werkzeug_ssl_context(ssl_ctx, args.client_ca), args.workers, start_worker)
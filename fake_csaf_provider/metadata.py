@@ -1,15 +1,46 @@
 import flask
 
-from .consts import directory_listing_base_path, rolie_feed_path_white
-from .state import get_config
-from .util import domain, now
+from .cache import CachedResponse, get_cached, send_cached
+from .consts import openpgp_public_key_path
+from .dirlisting import directory_listing_path
+from .files import get_corpus_index
+from .rolie import feed_path, feeds
+from .signing import armored_public_key, load_signing_key
+from .state import Config, current_base_url, current_config, get_corpus_version, get_latest_release_date
+from .util import now
+
+# The provider metadata schema only knows TLP 1.0 labels, so TLP 2.0 directories are listed under their counterparts,
+# and any other directory as unlabeled.
+METADATA_TLP_LABELS = {
+    'white': 'WHITE',
+    'clear': 'WHITE',
+    'green': 'GREEN',
+    'amber': 'AMBER',
+    'amber+strict': 'AMBER',
+    'red': 'RED',
+}
+
+
+def metadata_tlp_label(tlp: str) -> str:
+    return METADATA_TLP_LABELS.get(tlp, 'UNLABELED')
+
 
 def provider_metadata():
-    canonical_url = f"https://{domain}/obscure/path/to/provider-metadata.json"
+    """Rendered once per configuration and corpus change, and served as bytes from then on."""
+    config = current_config()
+    base_url = current_base_url()
+    version = (config.version, get_corpus_version())
+    return send_cached(get_cached(f'provider_metadata/{base_url}', version, lambda: _render_metadata(config, base_url)))
+
+
+def _render_metadata(config: Config, base_url: str) -> CachedResponse:
+    # The metadata changes with the newest advisory, not with every request.
+    latest = get_latest_release_date()
+    canonical_url = f"{base_url}/obscure/path/to/provider-metadata.json"
     metadata = {
         "canonical_url": canonical_url,
         "distributions": [],
-        "last_updated": now(),
+        "last_updated": latest.replace(microsecond=0).isoformat() if latest else now(),
         "list_on_CSAF_aggregators": True,
         "metadata_version": "2.0",
         "mirror_on_CSAF_aggregators": True,
@@ -18,28 +49,43 @@ def provider_metadata():
             "contact_details": "Contact.",
             "issuing_authority": "Test.",
             "name": "Test-Vendor",
-            "namespace": f"https://{domain}"
+            "namespace": base_url
         },
         "role": "csaf_provider"
     }
-    offer_dirlisting = get_config('directory_listing')
-    if offer_dirlisting:
-        dirlisting = {
-            "directory_url": f"https://{domain}/{directory_listing_base_path}/"
-        }
-        metadata["distributions"].append(dirlisting)
-    offer_rolie = get_config('rolie_feed')
-    if offer_rolie:
+    key = load_signing_key()
+    if key is not None:
+        metadata["public_openpgp_keys"] = [
+            {
+                "fingerprint": key.fingerprint.hex().upper(),
+                "url": f"{base_url}{openpgp_public_key_path}"
+            }
+        ]
+    if config.directory_listing:
+        for tlp in get_corpus_index().tlps():
+            dirlisting = {
+                "directory_url": f"{base_url}{directory_listing_path(tlp)}/"
+            }
+            metadata["distributions"].append(dirlisting)
+    if config.rolie_feed:
         rolie = {
         "rolie": {
             "feeds": [
                 {
-                    "summary": "WHITE advisories",
-                    "tlp_label": "WHITE",
-                    "url": f"https://{domain}/{rolie_feed_path_white}"
+                    "summary": f"{tlp.upper()} advisories {year}" if year else f"{tlp.upper()} advisories",
+                    "tlp_label": metadata_tlp_label(tlp),
+                    "url": f"{base_url}{feed_path(tlp, year)}"
                 }
+                for tlp, year in feeds(config)
             ]
         }
         }
         metadata["distributions"].append(rolie)
-    return flask.jsonify(metadata)
+    return CachedResponse(f"{flask.json.dumps(metadata, separators=(',', ':'))}\n".encode('utf-8'), 'application/json', latest)
+
+
+def public_key_response():
+    """The public key the advisories are signed with, listed in the metadata."""
+    if load_signing_key() is None:
+        flask.abort(404)
+    return flask.Response(armored_public_key(), mimetype='application/pgp-keys')
@@ -0,0 +1,244 @@
+"""
+Request metrics in the Prometheus text exposition format.
+
+Recording only touches a few dicts under one lock per request. With several worker processes, each worker
+periodically writes a snapshot of its metrics to a shared directory, and /metrics sums up all snapshots.
+"""
+
+import bisect
+import flask
+import json
+import os
+import threading
+import time
+from pathlib import Path
+
+
+# Upper bounds of the latency histogram buckets, in seconds.
+BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+FLUSH_INTERVAL_SECONDS = 1.0
+
+_requests: dict[tuple[str, str, str], int] = {}
+_durations: dict[str, list] = {}  # route -> [count per bucket (the last one being +Inf), sum]
+_bytes: dict[str, int] = {}
+_caches: dict[tuple[str, str], int] = {}
+_rate_limited = 0
+_faults_rejected = 0
+_lock = threading.Lock()
+_dirty = False
+
+_metrics_dir: Path | None = None
+
+
+def use_metrics_dir(path: Path):
+    """Share metrics between worker processes via snapshots in this directory. Must be called before serving."""
+    global _metrics_dir
+    _metrics_dir = path
+
+
+def _route() -> str:
+    rule = flask.request.url_rule
+    return rule.rule if rule else 'unmatched'
+
+
+def start_request():
+    flask.g.metrics_started = time.perf_counter()
+
+
+def finish_request(response, server_timing: bool):
+    """Record the finished request. Its duration is the time until the response headers are ready."""
+    started = getattr(flask.g, 'metrics_started', None)
+    if started is None:
+        return response
+    duration = time.perf_counter() - started
+    route = _route()
+    status = response.status_code
+    size = response.content_length
+    if size is None and response.is_streamed and not response.direct_passthrough:
+        # The size of a streamed body is only known once it is sent.
+        response.response = _counting(response.response, route)
+    global _rate_limited, _dirty
+    with _lock:
+        key = (route, flask.request.method, str(status))
+        _requests[key] = _requests.get(key, 0) + 1
+        histogram = _durations.get(route)
+        if histogram is None:
+            histogram = _durations[route] = [[0] * (len(BUCKETS) + 1), 0.0]
+        histogram[0][bisect.bisect_left(BUCKETS, duration)] += 1
+        histogram[1] += duration
+        if size:
+            _bytes[route] = _bytes.get(route, 0) + size
+        if status == 429:
+            _rate_limited += 1
+        _dirty = True
+    if server_timing:
+        timing = f'app;dur={duration * 1000:.3f}'
+        cache = getattr(flask.g, 'metrics_cache', None)
+        if cache:
+            timing += f', cache;desc="{cache}"'
+        response.headers['Server-Timing'] = timing
+    return response
+
+
+def _counting(chunks, route: str):
+    global _dirty
+    sent = 0
+    try:
+        for chunk in chunks:
+            sent += len(chunk)
+            yield chunk
+    finally:
+        with _lock:
+            _bytes[route] = _bytes.get(route, 0) + sent
+            _dirty = True
+
+
+def record_fault_rejected():
+    """Count a request rejected instead of slowed down, see faults.limit_slow_requests()."""
+    global _faults_rejected, _dirty
+    with _lock:
+        _faults_rejected += 1
+        _dirty = True
+
+
+def record_cache(cache: str, hit: bool):
+    """Count a lookup in one of the response caches."""
+    global _dirty
+    result = 'hit' if hit else 'miss'
+    with _lock:
+        _caches[(cache, result)] = _caches.get((cache, result), 0) + 1
+        _dirty = True
+    if flask.has_request_context():
+        flask.g.metrics_cache = result
+
+
+def _snapshot() -> dict:
+    with _lock:
+        return {
+            'requests': [[*key, count] for key, count in _requests.items()],
+            'durations': [[route, list(histogram[0]), histogram[1]] for route, histogram in _durations.items()],
+            'bytes': [[route, size] for route, size in _bytes.items()],
+            'caches': [[*key, count] for key, count in _caches.items()],
+            'rate_limited': _rate_limited,
+            'faults_rejected': _faults_rejected,
+        }
+
+
+def _snapshot_path(pid: int) -> Path:
+    return _metrics_dir / f'metrics-{pid}.json'
+
+
+def flush():
+    """Write this process' snapshot for the other workers to see."""
+    global _dirty
+    if _metrics_dir is None:
+        return
+    with _lock:
+        _dirty = False
+    path = _snapshot_path(os.getpid())
+    temp_path = path.with_suffix('.tmp')
+    temp_path.write_text(json.dumps(_snapshot()))
+    os.replace(temp_path, path)
+
+
+def _flush_periodically():
+    while True:
+        time.sleep(FLUSH_INTERVAL_SECONDS)
+        if _dirty:
+            try:
+                flush()
+            except OSError as err:
+                print(f"Could not write metrics: {err}")
+
+
+def start_metrics_flusher() -> threading.Thread | None:
+    if _metrics_dir is None:
+        return None
+    thread = threading.Thread(target=_flush_periodically, name='metrics-flusher', daemon=True)
+    thread.start()
+    return thread
+
+
+def _collect() -> list[dict]:
+    if _metrics_dir is None:
+        return [_snapshot()]
+    flush()
+    snapshots = []
+    # Snapshots of exited workers are kept, so that counters never go backwards.
+    for path in _metrics_dir.glob('metrics-*.json'):
+        try:
+            snapshots.append(json.loads(path.read_text()))
+        except (OSError, ValueError):
+            continue
+    return snapshots
+
+
+def _escape(value) -> str:
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _labels(**labels) -> str:
+    return '{' + ','.join(f'{name}="{_escape(value)}"' for name, value in labels.items()) + '}'
+
+
+def render_metrics() -> str:
+    requests: dict[tuple, int] = {}
+    durations: dict[str, list] = {}
+    sent: dict[str, int] = {}
+    caches: dict[tuple, int] = {}
+    rate_limited = 0
+    faults_rejected = 0
+    for snapshot in _collect():
+        for route, method, status, count in snapshot['requests']:
+            requests[(route, method, status)] = requests.get((route, method, status), 0) + count
+        for route, counts, total in snapshot['durations']:
+            histogram = durations.setdefault(route, [[0] * (len(BUCKETS) + 1), 0.0])
+            histogram[0] = [a + b for a, b in zip(histogram[0], counts)]
+            histogram[1] += total
+        for route, size in snapshot['bytes']:
+            sent[route] = sent.get(route, 0) + size
+        for cache, result, count in snapshot['caches']:
+            caches[(cache, result)] = caches.get((cache, result), 0) + count
+        rate_limited += snapshot['rate_limited']
+        faults_rejected += snapshot.get('faults_rejected', 0)
+
+    lines = [
+        '# HELP fake_csaf_requests_total Requests handled, by route, method and status.',
+        '# TYPE fake_csaf_requests_total counter',
+    ]
+    for (route, method, status), count in sorted(requests.items()):
+        lines.append(f'fake_csaf_requests_total{_labels(route=route, method=method, status=status)} {count}')
+    lines += [
+        '# HELP fake_csaf_request_duration_seconds Time until the response headers were ready, by route.',
+        '# TYPE fake_csaf_request_duration_seconds histogram',
+    ]
+    for route, (counts, total) in sorted(durations.items()):
+        cumulative = 0
+        for bound, count in zip((*BUCKETS, '+Inf'), counts):
+            cumulative += count
+            lines.append(f'fake_csaf_request_duration_seconds_bucket{_labels(route=route, le=bound)} {cumulative}')
+        lines.append(f'fake_csaf_request_duration_seconds_sum{_labels(route=route)} {total}')
+        lines.append(f'fake_csaf_request_duration_seconds_count{_labels(route=route)} {cumulative}')
+    lines += [
+        '# HELP fake_csaf_response_bytes_total Response body bytes sent, by route.',
+        '# TYPE fake_csaf_response_bytes_total counter',
+    ]
+    for route, size in sorted(sent.items()):
+        lines.append(f'fake_csaf_response_bytes_total{_labels(route=route)} {size}')
+    lines += [
+        '# HELP fake_csaf_rate_limited_total Requests rejected by the rate limit.',
+        '# TYPE fake_csaf_rate_limited_total counter',
+        f'fake_csaf_rate_limited_total {rate_limited}',
+        '# HELP fake_csaf_faults_rejected_total Requests rejected instead of slowed down, as all slots for slowed requests were taken.',
+        '# TYPE fake_csaf_faults_rejected_total counter',
+        f'fake_csaf_faults_rejected_total {faults_rejected}',
+        '# HELP fake_csaf_cache_requests_total Lookups in the response caches, by cache and result.',
+        '# TYPE fake_csaf_cache_requests_total counter',
+    ]
+    for (cache, result), count in sorted(caches.items()):
+        lines.append(f'fake_csaf_cache_requests_total{_labels(cache=cache, result=result)} {count}')
+    return '\n'.join(lines) + '\n'
+
+
+def metrics_response():
+    return flask.Response(render_metrics(), mimetype='text/plain; version=0.0.4')
@@ -0,0 +1,137 @@
+"""
+The few OpenPGP (RFC 4880) structures the provider needs: an RSA public key with a user ID, and detached v4
+signatures of documents, both ASCII armored. Built with the RSA primitives of the cryptography package, so that
+no OpenPGP implementation needs to be installed.
+"""
+
+import base64
+import hashlib
+import struct
+
+from cryptography.hazmat.primitives import hashes
+from cryptography.hazmat.primitives.asymmetric import padding, rsa
+from cryptography.hazmat.primitives.asymmetric.utils import Prehashed
+
+
+PUBLIC_KEY_ALGORITHM_RSA = 1
+HASH_ALGORITHM_SHA512 = 10
+SIGNATURE_BINARY_DOCUMENT = 0x00
+SIGNATURE_POSITIVE_CERTIFICATION = 0x13
+
+
+def _length(length: int) -> bytes:
+    # New format packet and subpacket lengths, RFC 4880, section 4.2.2.
+    if length < 192:
+        return bytes([length])
+    if length < 8384:
+        length -= 192
+        return bytes([(length >> 8) + 192, length & 0xFF])
+    return b'\xff' + struct.pack('>I', length)
+
+
+def _packet(tag: int, body: bytes) -> bytes:
+    return bytes([0xC0 | tag]) + _length(len(body)) + body
+
+
+def _subpacket(kind: int, data: bytes) -> bytes:
+    return _length(len(data) + 1) + bytes([kind]) + data
+
+
+def _mpi(value: int) -> bytes:
+    bits = value.bit_length()
+    return struct.pack('>H', bits) + value.to_bytes((bits + 7) // 8, 'big')
+
+
+def _crc24_table() -> list[int]:
+    table = []
+    for byte in range(256):
+        crc = byte << 16
+        for _ in range(8):
+            crc <<= 1
+            if crc & 0x1000000:
+                crc ^= 0x1864CFB
+        table.append(crc & 0xFFFFFF)
+    return table
+
+
+_CRC24_TABLE = _crc24_table()
+
+
+def _crc24(data: bytes) -> int:
+    crc = 0xB704CE
+    for byte in data:
+        crc = ((crc << 8) & 0xFFFFFF) ^ _CRC24_TABLE[(crc >> 16) ^ byte]
+    return crc
+
+
+def armor(kind: str, data: bytes) -> bytes:
+    """ASCII armor, e.g. armor('SIGNATURE', packets), RFC 4880, section 6.2."""
+    encoded = base64.b64encode(data).decode('ascii')
+    lines = [encoded[i:i + 64] for i in range(0, len(encoded), 64)]
+    checksum = base64.b64encode(_crc24(data).to_bytes(3, 'big')).decode('ascii')
+    return (f'-----BEGIN PGP {kind}-----\n\n' + '\n'.join(lines) + f'\n={checksum}\n-----END PGP {kind}-----\n').encode('ascii')
+
+
+def dearmor(armored: bytes) -> bytes:
+    lines = armored.decode('ascii').strip().splitlines()
+    body = lines[lines.index('') + 1:-1]
+    return base64.b64decode(''.join(line for line in body if not line.startswith('=')))
+
+
+class SigningKey:
+    """An RSA key as OpenPGP v4 key, identified by its creation time, which is part of its fingerprint."""
+
+    def __init__(self, private_key: rsa.RSAPrivateKey, created: int):
+        self.private_key = private_key
+        self.created = created
+        numbers = private_key.public_key().public_numbers()
+        self.public_key_body = (
+            bytes([4]) + struct.pack('>I', created) + bytes([PUBLIC_KEY_ALGORITHM_RSA]) + _mpi(numbers.n) + _mpi(numbers.e)
+        )
+        self.fingerprint = hashlib.sha1(self._public_key_prefix()).digest()
+        self.key_id = self.fingerprint[-8:]
+
+    def _public_key_prefix(self) -> bytes:
+        return b'\x99' + struct.pack('>H', len(self.public_key_body)) + self.public_key_body
+
+    def _signature(self, kind: int, prefix: bytes, data: bytes, created: int, subpackets: bytes = b'') -> bytes:
+        """A v4 signature packet over prefix and data, RFC 4880, section 5.2.3."""
+        hashed = _subpacket(2, struct.pack('>I', created)) + _subpacket(33, b'\x04' + self.fingerprint) + subpackets
+        head = bytes([4, kind, PUBLIC_KEY_ALGORITHM_RSA, HASH_ALGORITHM_SHA512]) + struct.pack('>H', len(hashed)) + hashed
+        digest = hashlib.sha512(prefix)
+        digest.update(data)
+        digest.update(head)
+        digest.update(b'\x04\xff' + struct.pack('>I', len(head)))
+        digest = digest.digest()
+        signature = self.private_key.sign(digest, padding.PKCS1v15(), Prehashed(hashes.SHA512()))
+        unhashed = _subpacket(16, self.key_id)
+        return _packet(2, head + struct.pack('>H', len(unhashed)) + unhashed + digest[:2]
+                       + _mpi(int.from_bytes(signature, 'big')))
+
+    def sign(self, data: bytes, created: int) -> bytes:
+        """The binary detached signature of a document."""
+        return self._signature(SIGNATURE_BINARY_DOCUMENT, b'', data, created)
+
+    def public_key(self, user_id: str) -> bytes:
+        """The binary transferable public key: the key, a user ID, and the user ID's self-signature."""
+        uid = user_id.encode('utf-8')
+        certification = self._signature(
+            SIGNATURE_POSITIVE_CERTIFICATION,
+            self._public_key_prefix(),
+            b'\xb4' + struct.pack('>I', len(uid)) + uid,
+            self.created,
+            # Usable for certifying and signing, preferring SHA-512 and SHA-256.
+            _subpacket(27, b'\x03') + _subpacket(21, bytes([HASH_ALGORITHM_SHA512, 8])),
+        )
+        return _packet(6, self.public_key_body) + _packet(13, uid) + certification
+
+
+def corrupt(signature: bytes) -> bytes:
+    """A copy of a binary signature that is still well-formed, but no longer verifies."""
+    return signature[:-1] + bytes([signature[-1] ^ 0x01])
+
+
+def read_creation_time(public_key: bytes) -> int:
+    """The creation time of the first key in a binary transferable public key."""
+    header = 1 + (1 if public_key[1] < 192 else 2 if public_key[1] < 224 else 5)
+    return struct.unpack('>I', public_key[header + 1:header + 5])[0]
@@ -0,0 +1,164 @@
+"""
+Packs the corpus in 'csafs/some' into a single file, which the server memory-maps with `--pack`.
+
+A pack holds every advisory and its sidecars back to back, followed by an index of their offsets and of the fields
+the server would otherwise parse from each advisory. Opening it decodes only that index, without reading or parsing
+any advisory, and documents are served as slices of the mapping: no directory walks, stats or opens per file, and the
+page cache is shared by all worker processes.
+
+Layout, all integers little-endian:
+
+    header   b'CSAFPACK', version (u32), count (u64), spans offset (u64), index offset (u64), index length (u64)
+    blobs    the advisories and sidecars
+    spans    offset and length (u64 each) of the advisory and of its .asc, .sha256 and .sha512, per advisory,
+             with offset 0 for a missing sidecar
+    index    JSON list with one row of advisory fields per advisory, in the same order, see _row()
+"""
+
+import argparse
+import json
+import mmap
+import os
+import struct
+import sys
+import time
+from array import array
+from pathlib import Path
+
+from .corpus import SIDECAR_SUFFIXES, CorpusEntry, CorpusIndex, apply_advisory_fields, find_tlps, scan_corpus
+
+
+MAGIC = b'CSAFPACK'
+VERSION = 2
+HEADER = struct.Struct('<8sIQQQQ')
+# The advisory and its sidecars, in the order their offsets and lengths are kept.
+BLOB_SUFFIXES = ('', *SIDECAR_SUFFIXES)
+SPAN_SIZE = 2 * len(BLOB_SUFFIXES) * 8
+# Bodies are handed to the server in slices of this size.
+CHUNK_SIZE = 64 * 1024
+
+
+class PackSlice:
+    """A response body backed by the mapping. Nothing is read until the server iterates it, and then only in
+    slices, as WSGI servers insist on bytes."""
+
+    def __init__(self, view: memoryview):
+        self.view = view
+
+    def __len__(self) -> int:
+        return len(self.view)
+
+    def __iter__(self):
+        view = self.view
+        for start in range(0, len(view), CHUNK_SIZE):
+            yield bytes(view[start:start + CHUNK_SIZE])
+
+
+class Pack:
+    """A memory-mapped pack. Like generate.VirtualCorpus, it provides the index and the bytes of the corpus."""
+
+    def __init__(self, path: Path):
+        self.path = path
+        with open(path, 'rb') as f:
+            # The mapping stays valid after the file is closed.
+            self._map = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, version, count, spans_offset, index_offset, index_length = HEADER.unpack_from(self._map, 0)
+        if magic != MAGIC or version != VERSION:
+            raise ValueError(f"{path} is not a pack of version {VERSION}, rebuild it with 'python -m fake_csaf_provider.pack'")
+        self._view = memoryview(self._map)
+        self._index = (index_offset, index_length)
+        # Offset and length of each blob of each advisory, at entry.location.
+        self._spans = array('Q')
+        self._spans.frombytes(self._view[spans_offset:spans_offset + count * SPAN_SIZE])
+        if sys.byteorder == 'big':
+            self._spans.byteswap()
+
+    def index(self) -> CorpusIndex:
+        started = time.perf_counter()
+        offset, length = self._index
+        entries = []
+        spans = self._spans
+        width = 2 * len(BLOB_SUFFIXES)
+        for location, (tlp, year, filename, mtime, fields, sha256) in enumerate(json.loads(self._view[offset:offset + length].tobytes())):
+            entry = CorpusEntry(tlp, year, filename)
+            apply_advisory_fields(entry, (*fields, bytes.fromhex(sha256) if sha256 else None))
+            position = location * width
+            entry.mtime = mtime
+            entry.size = spans[position + 1]
+            entry.asc = spans[position + 2] != 0
+            entry.sha256 = spans[position + 4] != 0
+            entry.sha512 = spans[position + 6] != 0
+            entry.location = location
+            entries.append(entry)
+        print(f"Opened pack {self.path} of {len(entries)} CSAF documents in {time.perf_counter() - started:.2f}s")
+        return CorpusIndex(entries)
+
+    def view(self, entry: CorpusEntry, suffix: str = '') -> memoryview:
+        """The advisory, or its sidecar, as a slice of the mapping. Copies nothing."""
+        position = (entry.location * len(BLOB_SUFFIXES) + BLOB_SUFFIXES.index(suffix)) * 2
+        offset, length = self._spans[position], self._spans[position + 1]
+        return self._view[offset:offset + length]
+
+    def read(self, entry: CorpusEntry, suffix: str = '') -> bytes:
+        return self.view(entry, suffix).tobytes()
+
+
+def _row(entry: CorpusEntry) -> list:
+    # The fields are stored as read_advisory_fields() returns them, so that they are applied the same way.
+    fields = [
+        entry.id,
+        entry.current_release_date.isoformat() if entry.current_release_date else None,
+        entry.initial_release_date.isoformat() if entry.initial_release_date else None,
+        entry.tlp_label,
+    ]
+    return [entry.tlp, entry.year, entry.filename, entry.mtime, fields, entry.hexdigest()]
+
+
+def build_pack(csaf_dir: Path, output: Path, cache_path: Path | None = None, workers: int | None = None) -> int:
+    """Pack the advisories below csaf_dir, indexed as the server would index them. Returns how many were packed."""
+    index = scan_corpus(csaf_dir, find_tlps(csaf_dir), cache_path=cache_path, workers=workers)
+    rows = []
+    spans = array('Q')
+    temp_path = output.with_name(f'{output.name}.{os.getpid()}.tmp')
+    with open(temp_path, 'wb') as f:
+        f.write(HEADER.pack(MAGIC, VERSION, 0, 0, 0, 0))
+        for tlp in index.tlps():
+            for entry in sorted(index.entries(tlp), key=lambda e: e.key):
+                for suffix in BLOB_SUFFIXES:
+                    if suffix and not entry.has_sidecar(suffix):
+                        spans.extend((0, 0))
+                        continue
+                    data = (csaf_dir / f'{entry.relative_path}{suffix}').read_bytes()
+                    spans.extend((f.tell(), len(data)))
+                    f.write(data)
+                rows.append(_row(entry))
+        if sys.byteorder == 'big':
+            spans.byteswap()
+        spans_offset = f.tell()
+        f.write(spans.tobytes())
+        index_offset = f.tell()
+        f.write(json.dumps(rows, separators=(',', ':')).encode('utf-8'))
+        index_length = f.tell() - index_offset
+        f.seek(0)
+        f.write(HEADER.pack(MAGIC, VERSION, len(rows), spans_offset, index_offset, index_length))
+    os.replace(temp_path, output)
+    return len(rows)
+
+
+def parse_args():
+    csafs_dir = Path(__file__).resolve().parents[1] / 'csafs'
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--input', type=Path, default=csafs_dir / 'some', help="Corpus directory to pack.")
+    parser.add_argument('--output', type=Path, default=csafs_dir / 'some.pack', help="Pack file to write.")
+    parser.add_argument('--workers', type=int, default=None, help="Number of worker processes for reading advisories.")
+    return parser.parse_args()
+
+
+if __name__ == '__main__':
+    args = parse_args()
+    started = time.perf_counter()
+    # The index cache of the server is reused, so that only advisories changed since its last scan are parsed.
+    cache_path = args.input.parent / f'{args.input.name}.index.sqlite'
+    packed = build_pack(args.input, args.output, cache_path, args.workers)
+    print(f"Packed {packed} CSAF documents into {args.output} ({args.output.stat().st_size} bytes) "
+          f"in {time.perf_counter() - started:.2f}s")
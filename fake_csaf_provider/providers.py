@@ -0,0 +1,73 @@
+"""
+Virtual providers, so that one server process can mimic many CSAF providers, e.g. for testing aggregators.
+
+A request is routed to a provider by a path prefix, '/providers/<name>/...', or by its Host header,
+'<name>.providers.localhost:34443'. Everything else goes to the default provider at 'localhost:34443'. Each provider has
+its own configuration, rate limits and faults, see state.py, while the corpus index and the rendered listings,
+feed entries and compressed documents are shared by all of them.
+"""
+
+import re
+
+from .consts import domain, port
+
+
+# Where the route of a request is kept in its WSGI environ.
+ENVIRON_KEY = 'fake_csaf_provider.provider'
+BASE_URL_KEY = 'fake_csaf_provider.base_url'
+DEFAULT_PROVIDER = 'default'
+DEFAULT_BASE_URL = f'https://{domain}'
+PATH_PREFIX = '/providers'
+# Certificates cannot cover '*.localhost', as wildcards need at least two labels below them.
+HOST_SUFFIX = '.providers.localhost'
+
+_NAME = re.compile(r'[a-z0-9](?:[a-z0-9-]{0,61}[a-z0-9])?')
+
+
+def validate_provider_name(name: str) -> str:
+    """A provider name doubles as a DNS label, and must not shadow the default provider."""
+    if not _NAME.fullmatch(name) or name == DEFAULT_PROVIDER:
+        raise ValueError(f"invalid provider name {name!r}: expected a lowercase DNS label other than {DEFAULT_PROVIDER!r}")
+    return name
+
+
+def route_request(environ: dict, names) -> bool:
+    """Record the provider and base URL of the request in its environ, moving a path prefix to SCRIPT_NAME.
+
+    Returns False for a path prefix naming an unknown provider.
+    """
+    path = environ.get('PATH_INFO', '')
+    if path.startswith(f'{PATH_PREFIX}/'):
+        name, _, rest = path[len(PATH_PREFIX) + 1:].partition('/')
+        if name not in names:
+            return False
+        environ['SCRIPT_NAME'] = f"{environ.get('SCRIPT_NAME', '')}{PATH_PREFIX}/{name}"
+        environ['PATH_INFO'] = f'/{rest}'
+        environ[ENVIRON_KEY] = name
+        environ[BASE_URL_KEY] = f'{DEFAULT_BASE_URL}{PATH_PREFIX}/{name}'
+        return True
+    host = environ.get('HTTP_HOST', '').lower().partition(':')[0]
+    name = host.removesuffix(HOST_SUFFIX)
+    if name != host and name in names:
+        environ[ENVIRON_KEY] = name
+        environ[BASE_URL_KEY] = f'https://{name}{HOST_SUFFIX}:{port}'
+    else:
+        environ[ENVIRON_KEY] = DEFAULT_PROVIDER
+        environ[BASE_URL_KEY] = DEFAULT_BASE_URL
+    return True
+
+
+class ProviderMiddleware:
+    """Routes requests to their provider before faults are drawn and the Flask app sees them."""
+
+    def __init__(self, app, get_names):
+        self.app = app
+        self.get_names = get_names
+
+    def __call__(self, environ, start_response):
+        # Already routed by the ASGI variant, which draws faults itself.
+        if ENVIRON_KEY in environ or route_request(environ, self.get_names()):
+            return self.app(environ, start_response)
+        body = b'{"error":"Unknown provider"}\n'
+        start_response('404 Not Found', [('Content-Type', 'application/json'), ('Content-Length', str(len(body)))])
+        return [body]
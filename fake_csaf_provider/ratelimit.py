@@ -0,0 +1,92 @@
+"""
+Rate-limiting algorithms.
+
+Each algorithm is a function of a client's previous state (None for a new client), the current time,
+the limit and the period. It returns the client's new state, whether the request is allowed, the number
+of remaining requests and the time at which the limit resets. Every check costs amortized constant time,
+and the state is plain data, so that it can be kept in memory as well as be shared between processes.
+"""
+
+import collections
+import math
+import threading
+
+
+def sliding_log(state, now: float, limit: int, period: float):
+    """Exact: remembers the timestamps of at most `limit` allowed requests."""
+    log = state if isinstance(state, collections.deque) else collections.deque(state or (), maxlen=limit)
+    cutoff = now - period
+    while log and log[0] <= cutoff:
+        log.popleft()
+    allowed = len(log) < limit
+    if allowed:
+        log.append(now)
+    reset = log[0] + period if log else now + period
+    return log, allowed, limit - len(log), reset
+
+
+def sliding_window(state, now: float, limit: int, period: float):
+    """Approximate: weighs the count of the previous fixed window by how much of it still overlaps the sliding window."""
+    window = math.floor(now / period) * period
+    window_start, previous, current = state or (window, 0, 0)
+    if window_start != window:
+        previous = current if window_start == window - period else 0
+        current = 0
+    estimate = previous * (1 - (now - window) / period) + current
+    allowed = estimate + 1 <= limit
+    if allowed:
+        current += 1
+        estimate += 1
+    remaining = max(0, math.floor(limit - estimate))
+    return (window, previous, current), allowed, remaining, window + period
+
+
+def token_bucket(state, now: float, limit: int, period: float):
+    """Allows bursts of up to `limit` requests, refilling at `limit` tokens per period."""
+    rate = limit / period
+    tokens, last = state or (limit, now)
+    tokens = min(limit, tokens + (now - last) * rate)
+    allowed = tokens >= 1
+    if allowed:
+        tokens -= 1
+    return (tokens, now), allowed, math.floor(tokens), now + (limit - tokens) / rate
+
+
+ALGORITHMS = {
+    'sliding_log': sliding_log,
+    'sliding_window': sliding_window,
+    'token_bucket': token_bucket,
+}
+DEFAULT_ALGORITHM = 'sliding_log'
+
+
+def get_algorithm(name: str):
+    return ALGORITHMS.get(name, ALGORITHMS[DEFAULT_ALGORITHM])
+
+
+class RateLimitStore:
+    """Per-client state in least-recently-seen order, so that idle clients can be evicted from the front in O(1)."""
+
+    def __init__(self):
+        self._clients: collections.OrderedDict[str, tuple[float, object]] = collections.OrderedDict()
+        self._lock = threading.Lock()
+
+    def hit(self, client: str, algorithm, now: float, limit: int, period: float):
+        with self._lock:
+            entry = self._clients.pop(client, None)
+            state, allowed, remaining, reset = algorithm(entry[1] if entry else None, now, limit, period)
+            self._clients[client] = (now, state)
+            # A client idle for a whole period is indistinguishable from a new one.
+            while self._clients:
+                oldest = next(iter(self._clients.values()))
+                if oldest[0] > now - period:
+                    break
+                self._clients.popitem(last=False)
+        return allowed, remaining, reset
+
+    def clear(self):
+        with self._lock:
+            self._clients.clear()
+
+    def __len__(self) -> int:
+        return len(self._clients)
@@ -0,0 +1,115 @@
+"""
+Replay a request journal against the server, for load tests that reproduce recorded traffic.
+
+The journal is fetched from /journal/dump, e.g. `curl --cacert crypto/ca.crt.pem -o requests.journal
+https://localhost:34443/journal/dump`. Its GET and HEAD requests are re-issued at the offsets they were recorded
+at, scaled by --speed, to the same provider, and on behalf of the same client via X-Forwarded-For, so that rate
+limits and the journal of the replay attribute them as before. Requests that overlapped are issued concurrently,
+over pooled keep-alive connections.
+"""
+
+import argparse
+import asyncio
+import json
+import ssl
+import time
+import urllib.parse
+from pathlib import Path
+
+from .benchmark import Connection, HTTPError, make_ssl_context, percentile
+from .consts import port
+from .journal import JournalRecord, decode
+
+
+REPLAYED_METHODS = ('GET', 'HEAD')
+
+
+async def replay(records: list[JournalRecord], args, ssl_context: ssl.SSLContext) -> dict:
+    """Issue the records' requests on their original schedule, divided by args.speed, or at once for speed 0."""
+    idle: dict[str, list[Connection]] = {}
+    slots = asyncio.Semaphore(args.concurrency)
+    latencies = []
+    lags = []
+    statuses = {}
+    errors = 0
+    matched = 0
+    transferred = 0
+    first = records[0].time if records else 0.0
+    started = time.perf_counter()
+
+    async def issue(record: JournalRecord):
+        nonlocal errors, matched, transferred
+        due = (record.time - first) / args.speed if args.speed else 0.0
+        delay = due - (time.perf_counter() - started)
+        if delay > 0:
+            await asyncio.sleep(delay)
+        async with slots:
+            lags.append(max(0.0, time.perf_counter() - started - due))
+            url = urllib.parse.urlsplit(record.base_url)
+            pool = idle.setdefault(url.netloc, [])
+            connection = pool.pop() if pool else Connection(args.host, args.port, ssl_context, url.netloc)
+            headers = {} if args.anonymous else {'X-Forwarded-For': record.client}
+            request_started = time.perf_counter()
+            try:
+                status, _, body = await connection.request(record.method, f'{url.path}{record.path}', headers)
+            except (OSError, HTTPError, asyncio.IncompleteReadError, ValueError):
+                errors += 1
+                connection.close()
+                return
+            latencies.append(time.perf_counter() - request_started)
+            pool.append(connection)
+        statuses[status] = statuses.get(status, 0) + 1
+        transferred += len(body)
+        if status == record.status:
+            matched += 1
+
+    try:
+        await asyncio.gather(*(issue(record) for record in records))
+    finally:
+        for pool in idle.values():
+            for connection in pool:
+                connection.close()
+    elapsed = time.perf_counter() - started
+    latencies.sort()
+    lags.sort()
+    milliseconds = [latency * 1000 for latency in latencies]
+    return {
+        'requests': len(records),
+        'errors': errors,
+        'statuses': {str(status): count for status, count in sorted(statuses.items())},
+        'same_status': matched,
+        'recorded_seconds': round(records[-1].time - first, 3) if records else 0.0,
+        'seconds': round(elapsed, 3),
+        'requests_per_second': round(len(latencies) / elapsed, 1) if elapsed else 0.0,
+        'megabytes_per_second': round(transferred / elapsed / 1e6, 2) if elapsed else 0.0,
+        'latency_ms': {
+            'p50': round(percentile(milliseconds, 0.50), 3),
+            'p95': round(percentile(milliseconds, 0.95), 3),
+            'p99': round(percentile(milliseconds, 0.99), 3),
+            'max': round(milliseconds[-1], 3) if milliseconds else 0.0,
+        },
+        # How far behind schedule requests were issued, e.g. because --concurrency was exhausted.
+        'lag_ms_p99': round(percentile(lags, 0.99) * 1000, 3),
+    }
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('journal', type=Path, help="Journal file, as downloaded from /journal/dump.")
+    parser.add_argument('--speed', type=float, default=1.0,
+                        help="Replay this many times faster than recorded, e.g. 0.5 for half the rate. 0 issues all requests at once.")
+    parser.add_argument('--concurrency', type=int, default=64, help="Maximum number of requests in flight.")
+    parser.add_argument('--host', default='127.0.0.1', help="Address to connect to, whatever the recorded provider's host.")
+    parser.add_argument('--port', type=int, default=port)
+    parser.add_argument('--anonymous', action='store_true', help="Send all requests as this client, without X-Forwarded-For.")
+    return parser.parse_args()
+
+
+if __name__ == '__main__':
+    args = parse_args()
+    if args.speed < 0:
+        raise SystemExit("--speed must not be negative")
+    recorded, records = decode(args.journal.read_bytes())
+    records = [record for record in records if record.method in REPLAYED_METHODS]
+    print(f"Replaying {len(records)} of {recorded} recorded requests at {args.speed or 'full'} speed")
+    print(json.dumps(asyncio.run(replay(records, args, make_ssl_context())), indent=2))
@@ -1,26 +1,116 @@
 import flask
+import itertools
+import json
+import math
+import threading
 
-from .consts import rolie_feed_path_white, rolie_feed_csaf_dir_white
-from .files import csaf_file_exists, find_white_advisory_files, read_csaf_id
-from .state import get_current_release_date, get_latest_release_date
-from .util import domain, now
+from .cache import encode_lines, send_rendered
+from .consts import rolie_feed_csaf_dir_pattern, rolie_feed_dir_pattern
+from .files import get_corpus_index, offers_sidecar
+from .providers import DEFAULT_BASE_URL
+from .state import Config, current_base_url, current_config, get_corpus_version
+from .util import now
 
-def rolie_feed():
-    updated = get_latest_release_date()
+
+def feed_path(tlp: str, year: str | None = None) -> str:
+    name = f'some-feed-{year}.json' if year else 'some-feed.json'
+    return f'{rolie_feed_dir_pattern.format(tlp=tlp)}/{name}'
+
+
+def parse_feed_name(feed_name: str) -> tuple[bool, str | None]:
+    """Split 'some-feed.json' or 'some-feed-<year>.json' into (valid, year)."""
+    if feed_name == 'some-feed.json':
+        return True, None
+    year = feed_name.removeprefix('some-feed-').removesuffix('.json')
+    if feed_name == f'some-feed-{year}.json' and year.isdigit():
+        return True, year
+    return False, None
+
+
+def feeds(config: Config) -> list[tuple[str, str | None]]:
+    """All (tlp, year) feeds in the layout of config, year being None for a feed covering the whole TLP."""
+    index = get_corpus_index()
+    split_by_year = config.rolie_feed_split == 'year'
+    result = []
+    for tlp in index.tlps():
+        if split_by_year:
+            result.extend((tlp, year) for year in index.years(tlp))
+        else:
+            result.append((tlp, None))
+    return result
+
+
+def rolie_feed(tlp: str, year: str | None = None):
+    config = current_config()
+    if (tlp, year) not in feeds(config):
+        flask.abort(404)
+    page = flask.request.args.get('page', '1')
+    if not page.isdigit() or int(page) < 1:
+        flask.abort(404)
+    page = int(page)
+
+    index = get_corpus_index()
+    # Newest first, so that pages stay stable while new advisories are only ever added to the front.
+    entries = index.newest_first(tlp, year)
+    page_size = config.rolie_feed_page_size
+    if page_size > 0:
+        last_page = max(1, math.ceil(len(entries) / page_size))
+        start, stop = (page - 1) * page_size, min(page * page_size, len(entries))
+    else:
+        last_page = 1
+        start, stop = 0, len(entries)
+    if page > last_page:
+        flask.abort(404)
+
+    base_url = current_base_url()
+    links = _page_links(base_url, tlp, year, page, last_page, page_size > 0)
+    updated = entries[start].current_release_date if start < stop else None
+    # Each TLP's feeds are only invalidated by changes to its own advisories.
+    fingerprint = index.fingerprint(tlp)
+    version = (fingerprint, config.version)
+    return send_rendered(
+        f'rolie_feed/{base_url}/{tlp}/{year}/{page}', version, stop - start,
+        lambda: _feed_chunks(tlp, year, entries, start, stop, links, updated, (config.hashes_from_index, config.signatures), base_url),
+        # The configuration decides which sidecar links are listed, so it is part of the ETag, too.
+        'application/json', f'{fingerprint}-{config.version}-{tlp}-{year}-{page}-{page_size}', updated,
+    )
+
+
+def _page_href(base_url: str, tlp: str, year: str | None, page: int) -> str:
+    href = f"{base_url}{feed_path(tlp, year)}"
+    return href if page == 1 else f"{href}?page={page}"
+
+
+def _page_links(base_url: str, tlp: str, year: str | None, page: int, last_page: int, paged: bool) -> list[dict]:
+    links = [
+        {
+            "rel": "self",
+            "href": _page_href(base_url, tlp, year, page)
+        }
+    ]
+    if paged:
+        # Paging as in RFC 5005, section 3.
+        links.append({"rel": "first", "href": _page_href(base_url, tlp, year, 1)})
+        links.append({"rel": "last", "href": _page_href(base_url, tlp, year, last_page)})
+        if page > 1:
+            links.append({"rel": "previous", "href": _page_href(base_url, tlp, year, page - 1)})
+        if page < last_page:
+            links.append({"rel": "next", "href": _page_href(base_url, tlp, year, page + 1)})
+    return links
+
+
+def _feed_chunks(tlp: str, year: str | None, entries: list, start: int, stop: int, links: list[dict], updated,
+                 sidecars: tuple[bool, str], base_url: str):
     if updated:
         updated_str = updated.replace(microsecond=0).isoformat()
     else:
         updated_str = now()
+    label = tlp.upper()
     rolie = {
       "feed": {
-        "id": "csaf-feed-tlp-white",
-        "title": "CSAF feed (TLP:WHITE)",
-        "link": [
-          {
-            "rel": "self",
-            "href": f"https://{domain}/{rolie_feed_path_white}"
-          }
-        ],
+        "id": f"csaf-feed-tlp-{tlp}-{year}" if year else f"csaf-feed-tlp-{tlp}",
+        "title": f"CSAF feed (TLP:{label}, {year})" if year else f"CSAF feed (TLP:{label})",
+        "link": links,
         "category": [
           {
             "scheme": "urn:ietf:params:rolie:category:information-type",
@@ -31,47 +121,94 @@ def rolie_feed():
         "entry": []
       }
     }
-    for year, file in find_white_advisory_files():
-      date = get_current_release_date(year, file)
-      if date:
-        updated_str = date.replace(microsecond=0).isoformat()
-      else:
-        updated_str = now()
-      id = read_csaf_id(year, file)
-      entry = {
-          "id": f"{id}",
-          "title": f"{id}",
-          "link": [
-            {
-              "rel": "self",
-              "href": f"https://{domain}{rolie_feed_csaf_dir_white}/{year}/{file}"
-            }
-          ],
-          "published": updated_str, # This is not technically correct, but irrelevant for our purposes.
-          "updated": updated_str,
-          "content": {
-            "type": "application/json",
-            "src": f"https://{domain}{rolie_feed_csaf_dir_white}/{year}/{file}"
-          },
-          "format": {
-            "schema": "https://docs.oasis-open.org/csaf/csaf/v2.0/csaf_json_schema.json",
-            "version": "2.0"
+    # "entry" is the last member, so the rendered entries can be streamed in at its empty list.
+    prefix, suffix = json.dumps(rolie).rsplit('[]', 1)
+    yield (prefix + '[').encode('utf-8')
+    fragments = (
+        (',' if position else '') + _entry_fragment(entry, sidecars)
+        for position, entry in enumerate(itertools.islice(entries, start, stop))
+    )
+    chunks = encode_lines(fragments, lines_per_chunk=200)
+    if base_url != DEFAULT_BASE_URL:
+        # The fragments are shared by all providers and link to the default one, so they are rebased in bulk.
+        default, base = DEFAULT_BASE_URL.encode('utf-8'), base_url.encode('utf-8')
+        chunks = (chunk.replace(default, base) for chunk in chunks)
+    yield from chunks
+    yield (']' + suffix).encode('utf-8')
+
+
+# Serialized feed entries, keyed by advisory and the options deciding which sidecars are linked. A fragment is reused
+# as long as the index still holds the very entry object it was rendered from, so after a corpus change only changed
+# entries are rendered.
+_entry_fragments: dict[tuple[tuple[str, str, str], tuple[bool, str]], tuple[object, str]] = {}
+_entry_fragments_lock = threading.Lock()
+_entry_fragments_version = None
+
+
+def _entry_fragment(feed_entry, sidecars: tuple[bool, str]) -> str:
+    global _entry_fragments_version
+    with _entry_fragments_lock:
+        version = get_corpus_version()
+        if version != _entry_fragments_version:
+            # Drop the fragments of removed or changed advisories, once per corpus change.
+            index = get_corpus_index()
+            for key, (entry, _) in list(_entry_fragments.items()):
+                if index.get(*key[0]) is not entry:
+                    del _entry_fragments[key]
+            _entry_fragments_version = version
+        cached = _entry_fragments.get((feed_entry.key, sidecars))
+    if cached and cached[0] is feed_entry:
+        return cached[1]
+    fragment = _render_entry(feed_entry, sidecars)
+    with _entry_fragments_lock:
+        _entry_fragments[(feed_entry.key, sidecars)] = (feed_entry, fragment)
+    return fragment
+
+
+def _render_entry(feed_entry, sidecars: tuple[bool, str]) -> str:
+    """sidecars are the hashes_from_index and signatures options, which decide what the entry links to."""
+    year = feed_entry.year
+    file = feed_entry.filename
+    csaf_dir = rolie_feed_csaf_dir_pattern.format(tlp=feed_entry.tlp)
+    date = feed_entry.current_release_date
+    if date:
+      updated_str = date.replace(microsecond=0).isoformat()
+    else:
+      updated_str = now()
+    id = feed_entry.id
+    entry = {
+        "id": f"{id}",
+        "title": f"{id}",
+        "link": [
+          {
+            "rel": "self",
+            "href": f"{DEFAULT_BASE_URL}{csaf_dir}/{year}/{file}"
           }
+        ],
+        "published": updated_str, # This is not technically correct, but irrelevant for our purposes.
+        "updated": updated_str,
+        "content": {
+          "type": "application/json",
+          "src": f"{DEFAULT_BASE_URL}{csaf_dir}/{year}/{file}"
+        },
+        "format": {
+          "schema": "https://docs.oasis-open.org/csaf/csaf/v2.0/csaf_json_schema.json",
+          "version": "2.0"
         }
-      if csaf_file_exists("white", year, f"{file}.asc"):
-          entry["link"].append({
-              "rel": "signature",
-              "href": f"https://{domain}{rolie_feed_csaf_dir_white}/{year}/{file}.asc"
-          })
-      if csaf_file_exists("white", year, f"{file}.sha256"):
-          entry["link"].append({
-              "rel": "hash",
-              "href": f"https://{domain}{rolie_feed_csaf_dir_white}/{year}/{file}.sha256"
-          })
-      if csaf_file_exists("white", year, f"{file}.sha512"):
-          entry["link"].append({
-              "rel": "hash",
-              "href": f"https://{domain}{rolie_feed_csaf_dir_white}/{year}/{file}.sha512"
-          })
-      rolie['feed']['entry'].append(entry)
-    return flask.jsonify(rolie)
+      }
+    if offers_sidecar(feed_entry, '.asc', *sidecars):
+        entry["link"].append({
+            "rel": "signature",
+            "href": f"{DEFAULT_BASE_URL}{csaf_dir}/{year}/{file}.asc"
+        })
+    if offers_sidecar(feed_entry, '.sha256', *sidecars):
+        entry["link"].append({
+            "rel": "hash",
+            "href": f"{DEFAULT_BASE_URL}{csaf_dir}/{year}/{file}.sha256"
+        })
+    if offers_sidecar(feed_entry, '.sha512', *sidecars):
+        entry["link"].append({
+            "rel": "hash",
+            "href": f"{DEFAULT_BASE_URL}{csaf_dir}/{year}/{file}.sha512"
+        })
+    return json.dumps(entry)
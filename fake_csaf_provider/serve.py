@@ -0,0 +1,120 @@
+"""
+Serving backends for load tests, as an alternative to Flask's single-process development server.
+"""
+
+import os
+import signal
+import ssl
+import sys
+
+from werkzeug.serving import WSGIRequestHandler, make_server
+
+
+BACKENDS = ['gunicorn', 'werkzeug', 'hypercorn', 'uvicorn']
+
+
+class QuietRequestHandler(WSGIRequestHandler):
+    def log_request(self, *args, **kwargs):
+        # Logging every request to stderr costs more than serving most of them.
+        pass
+
+
+def werkzeug_ssl_context(ssl_context, client_ca: str | None):
+    """The ssl_context for werkzeug, additionally asking clients for a certificate issued by client_ca, if given."""
+    if client_ca is None:
+        return ssl_context
+    context = ssl.SSLContext(ssl.PROTOCOL_TLS_SERVER)
+    context.load_cert_chain(*ssl_context)
+    context.load_verify_locations(client_ca)
+    # Optional, so that clients without a certificate can still fetch the public advisories.
+    context.verify_mode = ssl.CERT_OPTIONAL
+    return context
+
+
+def serve_werkzeug(app, host: str, port: int, ssl_context, workers: int, on_worker_start):
+    """Pre-fork server: the listening socket is bound once, then shared by worker processes that each serve it with threads.
+
+    Werkzeug closes the connection after every response, use the gunicorn backend to test keep-alive.
+    """
+    server = make_server(host, port, app, threaded=True, request_handler=QuietRequestHandler, ssl_context=ssl_context)
+    children = []
+    for _ in range(workers - 1):
+        pid = os.fork()
+        if pid == 0:
+            signal.signal(signal.SIGTERM, signal.SIG_DFL)
+            on_worker_start()
+            server.serve_forever()
+            os._exit(0)
+        children.append(pid)
+
+    # Turn SIGTERM (as sent by scripts/stop.sh) into a regular exit, so that the workers are taken down as well.
+    signal.signal(signal.SIGTERM, lambda *_: sys.exit(0))
+    print(f"Serving on https://{host}:{port} with {workers} worker process(es)")
+    on_worker_start()
+    try:
+        server.serve_forever()
+    finally:
+        for pid in children:
+            try:
+                os.kill(pid, signal.SIGTERM)
+            except ProcessLookupError:
+                pass
+
+
+def serve_gunicorn(app, host: str, port: int, ssl_context, workers: int, threads: int, on_worker_start, client_ca: str | None = None):
+    try:
+        from gunicorn.app.base import BaseApplication
+    except ImportError as err:
+        raise RuntimeError("The gunicorn backend requires gunicorn, have you run scripts/update.sh?") from err
+
+    cert, key = ssl_context
+
+    class Application(BaseApplication):
+        def load_config(self):
+            self.cfg.set('bind', f'{host}:{port}')
+            self.cfg.set('workers', workers)
+            self.cfg.set('threads', threads)
+            self.cfg.set('worker_class', 'gthread')
+            self.cfg.set('keepalive', 75)
+            self.cfg.set('certfile', cert)
+            self.cfg.set('keyfile', key)
+            if client_ca:
+                self.cfg.set('ca_certs', client_ca)
+                self.cfg.set('cert_reqs', ssl.CERT_OPTIONAL)
+            self.cfg.set('post_fork', lambda server, worker: on_worker_start())
+
+        def load(self):
+            return app
+
+    Application().run()
+
+
+def serve_hypercorn(app, host: str, port: int, ssl_context, on_worker_start):
+    """Single process, but speaks HTTP/2 (negotiated via ALPN) in addition to HTTP/1.1."""
+    try:
+        import asyncio
+        from hypercorn.asyncio import serve
+        from hypercorn.config import Config
+        from hypercorn.middleware import AsyncioWSGIMiddleware
+    except ImportError as err:
+        raise RuntimeError("The hypercorn backend requires 'pip install hypercorn'") from err
+
+    config = Config()
+    config.bind = [f'{host}:{port}']
+    config.certfile, config.keyfile = ssl_context
+    config.alpn_protocols = ['h2', 'http/1.1']
+    config.keep_alive_timeout = 75
+    on_worker_start()
+    asyncio.run(serve(AsyncioWSGIMiddleware(app), config))
+
+
+def serve_uvicorn(asgi_app, host: str, port: int, ssl_context, on_worker_start):
+    """Single process on asyncio, holding thousands of keep-alive connections without a thread each."""
+    try:
+        import uvicorn
+    except ImportError as err:
+        raise RuntimeError("The uvicorn backend requires 'pip install uvicorn'") from err
+
+    on_worker_start()
+    uvicorn.run(asgi_app, host=host, port=port, ssl_certfile=ssl_context[0], ssl_keyfile=ssl_context[1],
+                timeout_keep_alive=75, backlog=2048, access_log=False, log_level='warning')
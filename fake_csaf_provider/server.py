@@ -1,32 +1,60 @@
 import flask
 
-from .consts import directory_listing_base_path, rolie_feed_csaf_dir_white, rolie_feed_path_white
+from .compression import compress_response
+from .consts import admin_paths, directory_listing_base_path, openpgp_public_key_path, rolie_feed_csaf_dir_pattern, rolie_feed_dir_pattern
 from .dirlisting import changes_csv, index_txt
-from .files import send_csaf
-from .metadata import provider_metadata
-from .rolie import rolie_feed
-from .state import configure, offer_if_enabled, rate_limit_headers, get_retry_after_seconds, log_request
-from .util import security_txt_content
+from .faults import ENVIRON_KEY as FAULT_ENVIRON_KEY, FaultMiddleware
+from .files import get_corpus_index, send_csaf
+from .journal import dump_response, finish_request as finish_journal_request, journal_response, start_request as start_journal_request
+from .metadata import provider_metadata, public_key_response
+from .metrics import finish_request, metrics_response, record_fault_rejected, start_request
+from .providers import ProviderMiddleware
+from .rolie import parse_feed_name, rolie_feed
+from .state import (check_rate_limit, configure, current_base_url, current_config, get_fault_rules, get_provider_names,
+                    is_access_allowed, offer_if_enabled, get_retry_after_seconds)
+from .util import security_txt
 
 
 app = flask.Flask(__name__)
+# Outermost, so that faults are drawn from the rules of the provider a request is routed to.
+app.wsgi_app = ProviderMiddleware(FaultMiddleware(app.wsgi_app, get_fault_rules), get_provider_names)
 
 
 @app.before_request
-def enforce_rate_limit():
-    if flask.request.path == '/config':
-        return None
+def start_request_metrics():
+    start_request()
+
+
+# Registered first, so that it runs after all other after_request hooks and sees the final response.
+@app.after_request
+def record_request_metrics(response):
+    return finish_request(response, current_config().server_timing)
+
+
+@app.before_request
+def start_request_journal():
+    start_journal_request()
+
+
+@app.after_request
+def record_request_journal(response):
+    return finish_journal_request(response, client_address())
+
 
+def client_address() -> str:
     client = flask.request.headers.get('X-Forwarded-For', None)
     if client:
-        client = client.split(',')[0].strip()
-    else:
-        client = flask.request.remote_addr or 'unknown'
+        return client.split(',')[0].strip()
+    return flask.request.remote_addr or 'unknown'
+
+
+@app.before_request
+def enforce_rate_limit():
+    if flask.request.path in admin_paths:
+        return None
 
-    log_request(client)
-    headers = rate_limit_headers(client)
+    is_allowed, headers = check_rate_limit(client_address())
     flask.g.rate_limit_headers = headers # Stored for after_request
-    is_allowed = int(headers.get('X-RateLimit-Remaining', 100)) > 0
     if not is_allowed:
         retry_after = str(get_retry_after_seconds())
         resp = flask.jsonify({"error": "Too Many Requests"})
@@ -35,6 +63,36 @@ def enforce_rate_limit():
         return resp
 
 
+@app.before_request
+def inject_error():
+    fault = flask.request.environ.get(FAULT_ENVIRON_KEY)
+    if fault and fault.rejected:
+        record_fault_rejected()
+        resp = flask.jsonify({"error": "Too many slowed requests"})
+        resp.status_code = fault.error_status
+        resp.headers['Retry-After'] = '1'
+        return resp
+    if fault and fault.error_status:
+        resp = flask.jsonify({"error": "Injected fault"})
+        resp.status_code = fault.error_status
+        return resp
+
+
+@app.before_request
+def enforce_access_control():
+    tlp = (flask.request.view_args or {}).get('tlp')
+    if tlp is None or is_access_allowed(tlp, flask.request.environ):
+        return None
+    if current_config().authorizations:
+        resp = flask.jsonify({"error": "Unauthorized"})
+        resp.status_code = 401
+        resp.headers['WWW-Authenticate'] = f'Basic realm="TLP:{tlp.upper()}", charset="UTF-8"'
+    else:
+        resp = flask.jsonify({"error": "Forbidden"})
+        resp.status_code = 403
+    return resp
+
+
 @app.after_request
 def attach_rate_limit_headers(response):
     headers = getattr(flask.g, "rate_limit_headers", None)
@@ -44,29 +102,49 @@ def attach_rate_limit_headers(response):
     return response
 
 
+@app.after_request
+def compress_dynamic_response(response):
+    return compress_response(response, flask.request)
+
+
 @app.route('/config', methods=['PATCH'])
 def configure_state():
     return configure()
 
 
+@app.route('/metrics', methods=['GET'])
+def metrics():
+    return metrics_response()
+
+
+@app.route('/journal', methods=['GET'])
+def journal():
+    return journal_response(len(get_corpus_index()))
+
+
+@app.route('/journal/dump', methods=['GET'])
+def journal_dump():
+    return dump_response()
+
+
 @app.route('/.well-known/csaf/provider-metadata.json', methods=['GET'])
 def well_known_meta():
-    return offer_if_enabled('well_known_meta', provider_metadata())
+    return offer_if_enabled('well_known_meta', provider_metadata)
 
 
 @app.route('/security/data/csaf/provider-metadata.json', methods=['GET'])
 def security_data_meta():
-    return offer_if_enabled('security_data_meta', provider_metadata())
+    return offer_if_enabled('security_data_meta', provider_metadata)
 
 
 @app.route('/advisories/csaf/provider-metadata.json', methods=['GET'])
 def advisories_csaf_meta():
-    return offer_if_enabled('advisories_csaf_meta', provider_metadata())
+    return offer_if_enabled('advisories_csaf_meta', provider_metadata)
 
 
 @app.route('/security/csaf/provider-metadata.json', methods=['GET'])
 def security_csaf_meta():
-    return offer_if_enabled('security_csaf_meta', provider_metadata())
+    return offer_if_enabled('security_csaf_meta', provider_metadata)
 
 
 @app.route('/obscure/path/to/provider-metadata.json', methods=['GET'])
@@ -74,36 +152,50 @@ def obscure_meta():
     return provider_metadata()
 
 
+@app.route(openpgp_public_key_path, methods=['GET'])
+def openpgp_public_key():
+    return public_key_response()
+
+
 @app.route('/.well-known/security.txt', methods=['GET'])
 def well_known_security_txt():
-    return offer_if_enabled('well_known_security_txt', security_txt_content('/.well-known/security.txt'))
+    return offer_if_enabled('well_known_security_txt', lambda: security_txt(current_base_url(), '/.well-known/security.txt'))
 
 
 @app.route('/security.txt', methods=['GET'])
 def root_security_txt():
-    return offer_if_enabled('root_security_txt', security_txt_content('/security.txt'))
+    return offer_if_enabled('root_security_txt', lambda: security_txt(current_base_url(), '/security.txt'))
 
 
-@app.route(f'{directory_listing_base_path}/index.txt', methods=['GET'])
-def directory_listing_index():
-    return offer_if_enabled('directory_listing', index_txt())
+# TLP:WHITE is listed at the base path itself, see dirlisting.directory_listing_path().
+@app.route(f'{directory_listing_base_path}/index.txt', methods=['GET'], defaults={'tlp': 'white'})
+@app.route(f'{directory_listing_base_path}/<string:tlp>/index.txt', methods=['GET'])
+def directory_listing_index(tlp):
+    return offer_if_enabled('directory_listing', lambda: index_txt(tlp))
 
 
-@app.route(f'{directory_listing_base_path}/changes.csv', methods=['GET'])
-def directory_listing_changes():
-    return offer_if_enabled('directory_listing', changes_csv())
+@app.route(f'{directory_listing_base_path}/changes.csv', methods=['GET'], defaults={'tlp': 'white'})
+@app.route(f'{directory_listing_base_path}/<string:tlp>/changes.csv', methods=['GET'])
+def directory_listing_changes(tlp):
+    return offer_if_enabled('directory_listing', lambda: changes_csv(tlp))
 
 
-@app.route(f'{directory_listing_base_path}/<string:year>/<string:filename>', methods=['GET'])
-def dir_listing_csaf(year, filename):
-    return send_csaf("white", year, filename)
+@app.route(f'{directory_listing_base_path}/<string:year>/<string:filename>', methods=['GET'], defaults={'tlp': 'white'})
+@app.route(f'{directory_listing_base_path}/<string:tlp>/<string:year>/<string:filename>', methods=['GET'])
+def dir_listing_csaf(tlp, year, filename):
+    config = current_config()
+    return send_csaf(tlp, year, filename, config.hashes_from_index, config.signatures)
 
 
-@app.route(rolie_feed_path_white, methods=['GET'])
-def rolie_feed_endpoint():
-    return offer_if_enabled('rolie_feed', rolie_feed())
+@app.route(f"{rolie_feed_dir_pattern.format(tlp='<string:tlp>')}/<string:feed_name>", methods=['GET'])
+def rolie_feed_endpoint(tlp, feed_name):
+    valid, year = parse_feed_name(feed_name)
+    if not valid:
+        flask.abort(404)
+    return offer_if_enabled('rolie_feed', lambda: rolie_feed(tlp, year))
 
 
-@app.route(f'{rolie_feed_csaf_dir_white}/<string:year>/<string:filename>', methods=['GET'])
-def rolie_feed_csaf(year, filename):
-    return send_csaf("white", year, filename)
+@app.route(f"{rolie_feed_csaf_dir_pattern.format(tlp='<string:tlp>')}/<string:year>/<string:filename>", methods=['GET'])
+def rolie_feed_csaf(tlp, year, filename):
+    config = current_config()
+    return send_csaf(tlp, year, filename, config.hashes_from_index, config.signatures)
@@ -0,0 +1,70 @@
+"""
+Writes the .sha256 and .sha512 sidecars of all advisories in 'csafs/some', e.g. for those faked by scripts/setup.sh.
+
+The hashes are computed while indexing, in the same parallel read that parses the advisories, and are cached along
+with the index, so only added or changed advisories are read at all. A sidecar is written if it is missing or older
+than its advisory, and inherits the advisory's mtime, so that unchanged advisories are skipped on the next run.
+
+With --sign, the advisories are also signed with the key created by `python -m fake_openpgp_key.main`, in parallel,
+and their .asc sidecars are written the same way. Signatures are cached, so unchanged advisories are not signed again.
+
+Alternatively, `scripts/configure.sh --hashes-from-index` makes the server offer the hashes of every advisory
+straight from its index, without any sidecars on disk.
+"""
+
+import argparse
+import os
+import time
+
+from .corpus import HASH_SUFFIXES
+from .files import corpus_path, get_corpus_index, get_signature_cache, initialize_corpus_index, sha512_hexdigest
+from .signing import sign_all, signature
+
+
+def write_sidecars(workers: int | None = None, sign: bool = False) -> tuple[int, int]:
+    """Write all missing and outdated sidecars. Returns how many were written and how many were up to date."""
+    initialize_corpus_index(workers)
+    written = skipped = 0
+    index = get_corpus_index()
+    entries = [entry for tlp in index.tlps() for entry in index.entries(tlp)]
+    suffixes = HASH_SUFFIXES
+    if sign:
+        cache = get_signature_cache()
+        signed = sign_all(cache, [(entry.digest, corpus_path(entry)) for entry in entries], workers)
+        print(f"Signed {signed} advisories")
+        suffixes += ('.asc',)
+    for entry in entries:
+        for suffix in suffixes:
+            path = corpus_path(entry, suffix)
+            try:
+                up_to_date = path.stat().st_mtime >= entry.mtime
+            except FileNotFoundError:
+                up_to_date = False
+            if up_to_date:
+                skipped += 1
+                continue
+            if suffix == '.asc':
+                content = signature(cache, entry.digest, corpus_path(entry).read_bytes)
+            else:
+                hexdigest = entry.hexdigest() if suffix == '.sha256' else sha512_hexdigest(entry)
+                content = f'{hexdigest}  {entry.filename}\n'.encode('ascii')
+            temp_path = path.with_name(f'{path.name}.{os.getpid()}.tmp')
+            temp_path.write_bytes(content)
+            os.utime(temp_path, (entry.mtime, entry.mtime))
+            os.replace(temp_path, path)
+            written += 1
+    return written, skipped
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--workers', type=int, default=None, help="Number of worker processes for reading and signing advisories.")
+    parser.add_argument('--sign', action='store_true', help="Also sign the advisories and write their .asc files.")
+    return parser.parse_args()
+
+
+if __name__ == '__main__':
+    args = parse_args()
+    started = time.perf_counter()
+    written, skipped = write_sidecars(args.workers, args.sign)
+    print(f"Wrote {written} sidecars in {time.perf_counter() - started:.2f}s, {skipped} were up to date")
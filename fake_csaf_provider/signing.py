@@ -0,0 +1,124 @@
+"""
+Detached OpenPGP signatures of the advisories, made with the test key created by `python -m fake_openpgp_key.main`.
+
+Signatures are cached in SQLite, keyed by signing key and SHA-256 of the advisory, so that an advisory is only
+signed again after it changed, and signing happens once for all worker processes. The server signs advisories on
+their first request. `python -m fake_csaf_provider.sidecars --sign` signs the whole corpus up front, in parallel.
+"""
+
+import concurrent.futures
+import os
+import sqlite3
+import threading
+import time
+from pathlib import Path
+
+from cryptography.hazmat.primitives import serialization
+
+from .openpgp import SigningKey, armor, corrupt, dearmor, read_creation_time
+
+
+crypto_dir = Path(__file__).resolve().parents[1] / 'crypto'
+private_key_path = crypto_dir / 'openpgp.key.pem'
+public_key_path = crypto_dir / 'openpgp.pub.asc'
+# What the .asc files of the advisories are: those on disk, signatures made with the test key, signatures
+# made with the test key that do not verify, or none at all.
+SIGNATURE_MODES = ('disk', 'valid', 'invalid', 'missing')
+# Below this many advisories to sign, starting worker processes costs more than it saves.
+PARALLEL_SIGNING_THRESHOLD = 64
+
+_key: SigningKey | None = None
+_key_lock = threading.Lock()
+
+
+def load_signing_key() -> SigningKey | None:
+    """The test signing key, or None if it has not been generated."""
+    global _key
+    with _key_lock:
+        if _key is None and private_key_path.exists() and public_key_path.exists():
+            private_key = serialization.load_pem_private_key(private_key_path.read_bytes(), password=None)
+            _key = SigningKey(private_key, read_creation_time(dearmor(public_key_path.read_bytes())))
+        return _key
+
+
+def armored_public_key() -> bytes:
+    return public_key_path.read_bytes()
+
+
+class SignatureCache:
+    """Binary signatures, keyed by key fingerprint and advisory SHA-256, in a SQLite file shared by all processes."""
+
+    def __init__(self, path: Path):
+        self.path = path
+        self._local = threading.local()
+
+    def _connect(self) -> sqlite3.Connection:
+        # Connections must neither be shared between threads nor survive a fork.
+        connection = getattr(self._local, 'connection', None)
+        if connection is None or self._local.pid != os.getpid():
+            connection = sqlite3.connect(self.path, timeout=10, isolation_level=None)
+            connection.execute("PRAGMA journal_mode=WAL")
+            connection.execute(
+                "CREATE TABLE IF NOT EXISTS signatures (key BLOB, sha256 BLOB, signature BLOB, PRIMARY KEY (key, sha256))"
+            )
+            self._local.connection = connection
+            self._local.pid = os.getpid()
+        return connection
+
+    def get(self, key: bytes, sha256: bytes) -> bytes | None:
+        row = self._connect().execute("SELECT signature FROM signatures WHERE key = ? AND sha256 = ?", (key, sha256)).fetchone()
+        return row[0] if row else None
+
+    def known(self, key: bytes) -> set[bytes]:
+        """The SHA-256 digests of all advisories signed with the key."""
+        return {row[0] for row in self._connect().execute("SELECT sha256 FROM signatures WHERE key = ?", (key,))}
+
+    def store(self, key: bytes, signatures: list[tuple[bytes, bytes]]):
+        connection = self._connect()
+        with connection:
+            connection.execute("BEGIN")
+            connection.executemany("INSERT OR REPLACE INTO signatures VALUES (?, ?, ?)", ((key, *row) for row in signatures))
+
+
+def signature(cache: SignatureCache, sha256: bytes, read, valid: bool = True) -> bytes | None:
+    """The armored signature of the advisory with the given SHA-256, or None without a signing key.
+
+    read() returns the advisory, and is only called if it has not been signed before.
+    """
+    key = load_signing_key()
+    if key is None:
+        return None
+    binary = cache.get(key.fingerprint, sha256)
+    if binary is None:
+        binary = key.sign(read(), int(time.time()))
+        cache.store(key.fingerprint, [(sha256, binary)])
+    return armor('SIGNATURE', binary if valid else corrupt(binary))
+
+
+def _sign_file(job: tuple[str, int]) -> bytes:
+    # Runs in worker processes, which load the key once each.
+    path, created = job
+    with open(path, 'rb') as f:
+        return load_signing_key().sign(f.read(), created)
+
+
+def sign_all(cache: SignatureCache, advisories: list[tuple[bytes, Path]], workers: int | None = None) -> int:
+    """Sign the given (sha256, path) advisories that have not been signed yet, in parallel. Returns how many were signed."""
+    key = load_signing_key()
+    if key is None:
+        raise FileNotFoundError(f"OpenPGP key not found: {private_key_path}\nHave you run 'python -m fake_openpgp_key.main'?")
+    known = cache.known(key.fingerprint)
+    pending = {}
+    for sha256, path in advisories:
+        if sha256 not in known:
+            pending.setdefault(sha256, str(path))
+    created = int(time.time())
+    jobs = [(path, created) for path in pending.values()]
+    if len(jobs) >= PARALLEL_SIGNING_THRESHOLD:
+        with concurrent.futures.ProcessPoolExecutor(max_workers=workers) as pool:
+            chunksize = max(1, len(jobs) // ((workers or os.cpu_count() or 1) * 8))
+            signatures = list(pool.map(_sign_file, jobs, chunksize=chunksize))
+    else:
+        signatures = [_sign_file(job) for job in jobs]
+    cache.store(key.fingerprint, list(zip(pending, signatures)))
+    return len(jobs)
@@ -1,49 +1,216 @@
 import datetime
 import flask
 import threading
+from typing import NamedTuple
 
-from .files import collect_current_release_dates
-
-_state = {
-    "well_known_meta": False,
-    "security_data_meta": False,
-    "advisories_csaf_meta": False,
-    "security_csaf_meta": False,
-    "security_txt": False,
-    "directory_listing": False,
-    "rolie_feed": False,
-    "rate_limit_requests": 0,
-    "rate_limit_period_seconds": 0,
+from .access import PUBLIC_TLPS, basic_authorizations, is_authorized, normalize_fingerprint
+from .backends import InMemoryBackend
+from .faults import FaultRule, parse_faults
+from .files import get_corpus_index, initialize_corpus_index, refresh_corpus_index, use_pack, use_virtual_corpus
+from .providers import BASE_URL_KEY, DEFAULT_BASE_URL, DEFAULT_PROVIDER, ENVIRON_KEY as PROVIDER_ENVIRON_KEY, validate_provider_name
+from .ratelimit import ALGORITHMS, DEFAULT_ALGORITHM, get_algorithm
+from .signing import SIGNATURE_MODES, load_signing_key
+
+class Config(NamedTuple):
+    """A validated configuration. Immutable, and replaced as a whole, so handlers read it with a single reference load."""
+
+    well_known_meta: bool = False
+    security_data_meta: bool = False
+    advisories_csaf_meta: bool = False
+    security_csaf_meta: bool = False
+    well_known_security_txt: bool = False
+    root_security_txt: bool = False
+    directory_listing: bool = False
+    rolie_feed: bool = False
+    rolie_feed_split: str = 'none'
+    rolie_feed_page_size: int = 0
+    rate_limit_requests: int = 0
+    rate_limit_period_seconds: int = 0
+    rate_limit_algorithm: str = DEFAULT_ALGORITHM
+    server_timing: bool = False
+    hashes_from_index: bool = False
+    signatures: str = 'disk'
+    faults: tuple = ()
+    public_tlps: tuple[str, ...] = PUBLIC_TLPS
+    basic_auth_users: tuple[tuple[str, str], ...] = ()
+    client_cert_sha256: tuple[str, ...] = ()
+    # Derived once per configuration change, not part of what /config accepts.
+    version: int = 0
+    fault_rules: tuple[FaultRule, ...] = ()
+    authorizations: frozenset[str] = frozenset()
+    client_cert_fingerprints: frozenset[str] = frozenset()
+
+
+def _flag(value) -> bool:
+    if not isinstance(value, bool):
+        raise ValueError("expected true or false")
+    return value
+
+
+def _count(value) -> int:
+    if isinstance(value, bool) or not isinstance(value, int) or value < 0:
+        raise ValueError("expected a non-negative integer")
+    return value
+
+
+def _one_of(*choices):
+    def validate(value) -> str:
+        if value not in choices:
+            raise ValueError(f"expected one of {', '.join(choices)}")
+        return value
+    return validate
+
+
+def _faults(value) -> tuple:
+    parse_faults(value)
+    return tuple(value)
+
+
+def _signatures(value) -> str:
+    value = _one_of(*SIGNATURE_MODES)(value)
+    if value in ('valid', 'invalid') and load_signing_key() is None:
+        raise ValueError("no OpenPGP key to sign with, run 'python -m fake_openpgp_key.main' first")
+    return value
+
+
+def _names(value) -> tuple[str, ...]:
+    if not isinstance(value, list) or not all(isinstance(name, str) for name in value):
+        raise ValueError("expected a list of strings")
+    return tuple(name.lower() for name in value)
+
+
+def _users(value) -> dict[str, str]:
+    if not isinstance(value, dict) or not all(isinstance(password, str) for password in value.values()):
+        raise ValueError("expected an object mapping user names to passwords")
+    if any(':' in user for user in value):
+        raise ValueError("user names must not contain ':'")
+    return value
+
+
+def _fingerprints(value) -> tuple[str, ...]:
+    if not isinstance(value, list) or not all(isinstance(fingerprint, str) for fingerprint in value):
+        raise ValueError("expected a list of SHA-256 fingerprints")
+    return tuple(normalize_fingerprint(fingerprint) for fingerprint in value)
+
+
+# How each key accepted by /config is validated.
+_schema = {
+    'well_known_meta': _flag,
+    'security_data_meta': _flag,
+    'advisories_csaf_meta': _flag,
+    'security_csaf_meta': _flag,
+    'well_known_security_txt': _flag,
+    'root_security_txt': _flag,
+    'directory_listing': _flag,
+    'rolie_feed': _flag,
+    'rolie_feed_split': _one_of('none', 'year'),
+    'rolie_feed_page_size': _count,
+    'rate_limit_requests': _count,
+    'rate_limit_period_seconds': _count,
+    'rate_limit_algorithm': _one_of(*ALGORITHMS),
+    'server_timing': _flag,
+    'hashes_from_index': _flag,
+    'signatures': _signatures,
+    'faults': _faults,
+    'public_tlps': _names,
+    'basic_auth_users': _users,
+    'client_cert_sha256': _fingerprints,
 }
-_state_lock = threading.Lock()
+
+
+def validate_config(json: dict) -> dict:
+    """Check a /config body against the schema. Raises ValueError naming the first offending key."""
+    unknown = sorted(set(json) - set(_schema))
+    if unknown:
+        raise ValueError(f"unknown keys: {', '.join(unknown)}")
+    config = {}
+    for key, validate in _schema.items():
+        if key in json:
+            try:
+                config[key] = validate(json[key])
+            except ValueError as err:
+                raise ValueError(f"invalid {key}: {err}") from None
+    return config
+
+
+def _build_config(config: dict, version: int) -> Config:
+    faults = tuple(config.get('faults', ()))
+    users = config.get('basic_auth_users', {})
+    lists = {key: tuple(config[key]) for key in ('public_tlps', 'client_cert_sha256') if key in config}
+    return Config(
+        **{**config, **lists, 'faults': faults, 'basic_auth_users': tuple(sorted(users.items()))},
+        version=version,
+        fault_rules=tuple(parse_faults(list(faults))),
+        authorizations=basic_authorizations(users),
+        client_cert_fingerprints=frozenset(config.get('client_cert_sha256', ())),
+    )
+
+
+class Provider:
+    """A virtual provider, see providers.py. Only its configuration and rate limits are its own."""
+
+    def __init__(self, name: str, backend):
+        self.name = name
+        self.backend = backend
+        # Local snapshot of the configuration held by the backend, replaced whenever the backend's version changes.
+        self.config = Config()
+        self.config_lock = threading.Lock()
+
+    def set_state(self, json: dict):
+        """Validate and publish a new configuration. Keys left out are reset to their defaults."""
+        config = validate_config(json)
+        config['faults'] = list(config.get('faults', ()))
+        self.backend.publish_config(config)
+        self.backend.clear_rate_limits()
+
+    def current_config(self) -> Config:
+        """The current configuration. Costs a reference load and a version check, unless the configuration just changed."""
+        config = self.config
+        version = self.backend.config_version()
+        if version != config.version:
+            config = self._reload_config(version)
+        return config
+
+    def _reload_config(self, version: int) -> Config:
+        with self.config_lock:
+            if self.config.version != version:
+                self.config = _build_config(self.backend.load_config(), version)
+            return self.config
+
+
+_default_provider = Provider(DEFAULT_PROVIDER, InMemoryBackend())
+_providers = {DEFAULT_PROVIDER: _default_provider}
 
 _cache = {
-    "current_release_dates": None,
+    "version": 0,
 }
 _cache_lock = threading.Lock()
 
-_rate_limit_store: dict[str, list[float]] = {}
-_rate_limit_lock = threading.Lock()
+def use_providers(names: list[str], make_backend=lambda name: InMemoryBackend()):
+    """Host the named virtual providers next to the default one, each keeping configuration and rate-limit bookkeeping
+    in a backend made by make_backend(name). Must be called before serving."""
+    global _default_provider, _providers
+    providers = {name: Provider(name, make_backend(name)) for name in [DEFAULT_PROVIDER, *map(validate_provider_name, names)]}
+    _default_provider = providers[DEFAULT_PROVIDER]
+    _providers = providers
+
+
+def get_provider_names():
+    return _providers.keys()
+
+
+def provider_for(environ: dict) -> Provider:
+    return _providers.get(environ.get(PROVIDER_ENVIRON_KEY), _default_provider)
 
-def set_state(json: dict):
-    with _state_lock:
-        _state['well_known_meta'] = json.get('well_known_meta', False)
-        _state['security_data_meta'] = json.get('security_data_meta', False)
-        _state['advisories_csaf_meta'] = json.get('advisories_csaf_meta', False)
-        _state['security_csaf_meta'] = json.get('security_csaf_meta', False)
-        _state['well_known_security_txt'] = json.get('well_known_security_txt', False)
-        _state['root_security_txt'] = json.get('root_security_txt', False)
-        _state['directory_listing'] = json.get('directory_listing', False)
-        _state['rolie_feed'] = json.get('rolie_feed', False)
-        _state['rate_limit_requests'] = json.get('rate_limit_requests', 0)
-        _state['rate_limit_period_seconds'] = json.get('rate_limit_period_seconds', 0)
 
-    with _rate_limit_lock:
-        _rate_limit_store.clear()
+def current_config() -> Config:
+    """The configuration of the provider the current request was routed to."""
+    return provider_for(flask.request.environ).current_config()
 
-def get_config(key: str):
-    with _state_lock:
-        return _state.get(key, False)
+
+def current_base_url() -> str:
+    """The URL the current request's provider is served at, which the documents it renders link to."""
+    return flask.request.environ.get(BASE_URL_KEY, DEFAULT_BASE_URL)
 
 
 def configure():
@@ -55,87 +222,95 @@ def configure():
     body = flask.request.get_json()
     if not isinstance(body, dict):
         return flask.jsonify({"error": "expected JSON object"}), 400
-    set_state(body)
-    return "Configured server", 200        
+    try:
+        provider_for(flask.request.environ).set_state(body)
+    except ValueError as err:
+        return flask.jsonify({"error": str(err)}), 400
+    return "Configured server", 200
+
+
+def get_fault_rules(environ: dict) -> tuple[FaultRule, ...]:
+    return provider_for(environ).current_config().fault_rules
 
 
-def offer_if_enabled(feature_name, return_value):
-    with _state_lock:
-        offer = _state.get(feature_name, False)
-        if not offer:
-            flask.abort(404)
-    return return_value
+def is_access_allowed(tlp: str, environ: dict) -> bool:
+    """Whether the request may access the advisories, feeds and listings of the TLP."""
+    config = current_config()
+    if tlp in config.public_tlps:
+        return True
+    return is_authorized(environ, config.authorizations, config.client_cert_fingerprints)
 
 
-def initialize_current_release_dates():
-    dates = collect_current_release_dates()
+def offer_if_enabled(feature_name, respond):
+    """Answer with respond(), unless the feature is disabled. Bodies of disabled routes are never computed."""
+    if not getattr(current_config(), feature_name):
+        flask.abort(404)
+    return respond()
+
+
+def initialize_corpus():
+    initialize_corpus_index()
     with _cache_lock:
-        _cache['current_release_dates'] = dates
+        _cache['version'] += 1
 
 
-def get_current_release_date(year: str, filename: str) -> datetime.datetime | None:
+def initialize_virtual_corpus(virtual_corpus):
+    use_virtual_corpus(virtual_corpus)
     with _cache_lock:
-        dates = _cache['current_release_dates']
-        if not dates:
-            return None
-        return dates.get((year, filename))
+        _cache['version'] += 1
 
 
-def get_sorted_release_dates() -> dict[(str, str), datetime.datetime]:
-    sorted_dates = {}
+def initialize_pack(pack):
+    use_pack(pack)
     with _cache_lock:
-        dates = _cache['current_release_dates']
-        if not dates:
-            return sorted_dates
-        sorted_list = sorted(dates.items(), key=lambda item: item[1], reverse=True)
-        return sorted_list
+        _cache['version'] += 1
 
 
-def get_latest_release_date() -> datetime.datetime | None:
+def refresh_corpus():
+    if refresh_corpus_index():
+        with _cache_lock:
+            _cache['version'] += 1
+
+
+def get_corpus_version() -> int:
     with _cache_lock:
-        dates = _cache['current_release_dates']
-        if not dates:
-            return None
-        return max(dates.values())
+        return _cache['version']
 
 
-def log_request(remote_addr: str):
-    now = datetime.datetime.now(datetime.timezone.utc).timestamp()
-    with _rate_limit_lock:
-        timestamps = _rate_limit_store.setdefault(remote_addr, [])
-        timestamps.append(now)
+def get_current_release_date(tlp: str, year: str, filename: str) -> datetime.datetime | None:
+    entry = get_corpus_index().get(tlp, year, filename)
+    if not entry:
+        return None
+    return entry.current_release_date
+
+
+def get_latest_release_date() -> datetime.datetime | None:
+    """The newest release date over all TLPs."""
+    index = get_corpus_index()
+    dated = (index.sorted_by_release_date(tlp) for tlp in index.tlps())
+    return max((entries[0].current_release_date for entries in dated if entries), default=None)
 
 
-def rate_limit_headers(remote_addr: str) -> dict[str, str]:
-    with _state_lock:
-        limit = int(_state.get('rate_limit_requests', 0))
-        period = int(_state.get('rate_limit_period_seconds', 0))
+def check_rate_limit(remote_addr: str) -> tuple[bool, dict[str, str]]:
+    """Count the request against the client's rate limit. Returns whether it is allowed, and the headers to send."""
+    provider = provider_for(flask.request.environ)
+    config = provider.current_config()
+    limit = config.rate_limit_requests
+    period = config.rate_limit_period_seconds
     enabled = limit > 0 and period > 0
 
     headers = {}
     if not enabled:
-        return headers
+        return True, headers
 
     now = datetime.datetime.now(datetime.timezone.utc).timestamp()
-    cutoff = now - period
-
-    with _rate_limit_lock:
-        timestamps = _rate_limit_store.setdefault(remote_addr, [])
-        while timestamps and timestamps[0] < cutoff:
-            timestamps.pop(0)
-        remaining = max(0, limit - len(timestamps))
-        headers['X-RateLimit-Limit'] = str(limit)
-        headers['X-RateLimit-Remaining'] = str(remaining)
-        if timestamps:
-            reset_time = timestamps[0] + period
-            headers['X-RateLimit-Reset'] = str(int(reset_time))
-        else:
-            headers['X-RateLimit-Reset'] = str(int(now + period))
-    return headers
+    allowed, remaining, reset = provider.backend.hit_rate_limit(remote_addr, get_algorithm(config.rate_limit_algorithm), now, limit, period)
+    headers['X-RateLimit-Limit'] = str(limit)
+    headers['X-RateLimit-Remaining'] = str(remaining)
+    headers['X-RateLimit-Reset'] = str(int(reset))
+    return allowed, headers
 
 
 def get_retry_after_seconds() -> int:
-    with _state_lock:
-        period = int(_state.get('rate_limit_period_seconds', 0))
-    return period
+    return current_config().rate_limit_period_seconds
 
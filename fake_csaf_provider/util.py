@@ -1,34 +1,43 @@
 import datetime
 
-from .consts import domain
+from .cache import CachedResponse, get_cached, send_cached
 
 
 def now():
     return datetime.datetime.now(datetime.timezone.utc).replace(microsecond=0).isoformat()
 
 
-def security_txt_content(canonical_path: str):
+def security_txt(base_url: str, canonical_path: str):
+    """Rendered once a day, which keeps the expiry date moving, and served as bytes in between."""
+    today = datetime.datetime.now(datetime.timezone.utc).date()
+    return send_cached(get_cached(
+        f'security_txt/{base_url}{canonical_path}', today,
+        lambda: CachedResponse(security_txt_content(base_url, canonical_path).encode('utf-8'), 'text/plain'),
+    ))
+
+
+def security_txt_content(base_url: str, canonical_path: str):
     expires = (datetime.datetime.now(datetime.timezone.utc) + datetime.timedelta(days=30)).replace(microsecond=0).isoformat()
     # Most of this is just example content.
     # Only the URLs behind Canonical and CSAF are supported.
     return f"""
 # Our canonical URI.
-Canonical: https://{domain}{canonical_path}
+Canonical: {base_url}{canonical_path}
 
 # Our security addresses.
 Contact: mailto:info@example.com
 
 # Our security acknowledgements page.
-Acknowledgments: https://{domain}/acknowledgments
+Acknowledgments: {base_url}/acknowledgments
 
 # Our preferred languages.
 Preferred-Languages: en, de
 
 # Our security policy.
-Policy: https://{domain}/policy
+Policy: {base_url}/policy
 
 # Our security advisories
-CSAF: https://{domain}/obscure/path/to/provider-metadata.json
+CSAF: {base_url}/obscure/path/to/provider-metadata.json
 
 Expires: {expires}
 """
@@ -0,0 +1,24 @@
+import threading
+import time
+
+from .state import refresh_corpus
+
+
+def _poll(interval_seconds: float):
+    while True:
+        time.sleep(interval_seconds)
+        try:
+            refresh_corpus()
+        except Exception as err:
+            # Keeps polling, as the server would otherwise serve a frozen index without notice.
+            print(f"Could not refresh the corpus index: {err!r}")
+
+
+def start_corpus_watcher(interval_seconds: float) -> threading.Thread:
+    """Poll the corpus for added, changed and removed advisories in the background.
+
+    Polling only lists directories and compares mtime and size; advisories are re-read only when they changed.
+    """
+    thread = threading.Thread(target=_poll, args=(interval_seconds,), name='corpus-watcher', daemon=True)
+    thread.start()
+    return thread
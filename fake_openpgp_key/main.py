@@ -0,0 +1,55 @@
+"""Generate a test OpenPGP key for signing CSAF documents.
+
+Produces:
+- openpgp.key.pem (RSA private key of the signing key)
+- openpgp.pub.asc (ASCII armored OpenPGP public key, as published by the provider)
+"""
+
+
+from __future__ import annotations
+
+import time
+from pathlib import Path
+
+from cryptography.hazmat.primitives import serialization
+from cryptography.hazmat.primitives.asymmetric import rsa
+
+from fake_csaf_provider.openpgp import SigningKey, armor
+
+
+OUTDIR = Path("./crypto")
+KEY_SIZE = 2048
+USER_ID = "Test-Vendor CSAF Signing Key <info@example.com>"
+
+
+def main() -> None:
+    outdir: Path = OUTDIR
+    outdir.mkdir(parents=True, exist_ok=True)
+
+    files = {
+        "private_key": outdir / "openpgp.key.pem",
+        "public_key": outdir / "openpgp.pub.asc",
+    }
+
+    private_key = rsa.generate_private_key(public_exponent=65537, key_size=KEY_SIZE)
+    key = SigningKey(private_key, int(time.time()))
+
+    files["private_key"].write_bytes(private_key.private_bytes(
+        encoding=serialization.Encoding.PEM,
+        format=serialization.PrivateFormat.TraditionalOpenSSL,
+        encryption_algorithm=serialization.NoEncryption(),
+    ))
+    try:
+        files["private_key"].chmod(0o600)
+    except Exception:
+        pass
+    files["public_key"].write_bytes(armor("PUBLIC KEY BLOCK", key.public_key(USER_ID)))
+
+    print(f"Fingerprint: {key.fingerprint.hex().upper()}")
+    print("Wrote:")
+    for k, p in files.items():
+        print(f" - {p}")
+
+
+if __name__ == "__main__":
+    main()
@@ -27,7 +27,8 @@ OUTDIR = Path("./crypto")
 DAYS = 365
 KEY_SIZE = 2048
 COMMON_NAME = "localhost"
-SAN = ["localhost", "127.0.0.1", "::1"]
+# The wildcard covers the virtual providers, see fake_csaf_provider/providers.py.
+SAN = ["localhost", "*.providers.localhost", "127.0.0.1", "::1"]
 CA_NAME = "Fake Local CA"
 
 
@@ -21,9 +21,33 @@ root_security_txt=0
 directory_listing=0
 # Offer a ROLIE feed for CSAF documents
 rolie_feed=0
+# Split the ROLIE feed into one feed per year
+rolie_feed_split="none"
+# Split each ROLIE feed into pages of this many entries (0 disables paging)
+rolie_feed_page_size=0
 # Set a rate limit
 rate_limit_requests=0
 rate_limit_period_seconds=0
+# Rate limiting algorithm: sliding_log, sliding_window or token_bucket
+rate_limit_algorithm="sliding_log"
+# Add Server-Timing headers to every response
+server_timing=0
+# Offer the .sha256 and .sha512 files of every advisory, computed while indexing, even where they do not exist on disk
+hashes_from_index=0
+# Serve the .asc files from disk, sign the advisories with the key of 'python -m fake_openpgp_key.main' (valid),
+# serve signatures made with that key that do not verify (invalid), or serve no signatures at all (missing)
+signatures="disk"
+# Inject latency, bandwidth caps, errors, resets and truncation, as a JSON list of rules (see fake_csaf_provider/faults.py)
+faults="[]"
+# TLPs whose advisories, feeds and listings are served without authorization, as a comma-separated list.
+# All other TLP directories, e.g. amber, amber+strict, red and unlabeled, require it.
+public_tlps="clear,green,white"
+# Basic auth users authorized for the protected TLPs, as JSON object members
+basic_auth_users=""
+# SHA-256 fingerprints of client certificates authorized for the protected TLPs, as JSON list items
+client_cert_sha256=""
+# Configure the virtual provider of this name (see 'python -m fake_csaf_provider.main --provider') instead of the default one
+provider=""
 # Verify the configuration after applying it
 verify=0
 
@@ -62,6 +86,18 @@ while [[ $# -gt 0 ]]; do
             rolie_feed=1
             shift
             ;;
+        --rolie-split-by-year)
+            rolie_feed_split="year"
+            shift
+            ;;
+        --rolie-page-size)
+            if [[ $# -lt 2 ]]; then
+                echo "Error: --rolie-page-size requires one argument: <entries_per_page>"
+                exit 1
+            fi
+            rolie_feed_page_size="$2"
+            shift 2
+            ;;
         --rate-limit)
             if [[ $# -lt 3 ]]; then
                 echo "Error: --rate-limit requires two arguments: <requests> <period_seconds>"
@@ -71,6 +107,46 @@ while [[ $# -gt 0 ]]; do
             rate_limit_period_seconds="$3"
             shift 3
             ;;
+        --rate-limit-algorithm)
+            if [[ $# -lt 2 ]]; then
+                echo "Error: --rate-limit-algorithm requires one argument: <sliding_log|sliding_window|token_bucket>"
+                exit 1
+            fi
+            rate_limit_algorithm="$2"
+            shift 2
+            ;;
+        --faults)
+            if [[ $# -lt 2 ]]; then
+                echo "Error: --faults requires one argument: <json_list_of_rules>"
+                exit 1
+            fi
+            faults="$2"
+            shift 2
+            ;;
+        --public-tlps)
+            if [[ $# -lt 2 ]]; then
+                echo "Error: --public-tlps requires one argument: <comma_separated_tlps>"
+                exit 1
+            fi
+            public_tlps="$2"
+            shift 2
+            ;;
+        --basic-auth)
+            if [[ $# -lt 3 ]]; then
+                echo "Error: --basic-auth requires two arguments: <user> <password>"
+                exit 1
+            fi
+            basic_auth_users="${basic_auth_users:+$basic_auth_users, }\"$2\": \"$3\""
+            shift 3
+            ;;
+        --client-cert-sha256)
+            if [[ $# -lt 2 ]]; then
+                echo "Error: --client-cert-sha256 requires one argument: <fingerprint>"
+                exit 1
+            fi
+            client_cert_sha256="${client_cert_sha256:+$client_cert_sha256, }\"$2\""
+            shift 2
+            ;;
         --all)
             well_known_meta=1
             security_data_meta=1
@@ -83,6 +159,30 @@ while [[ $# -gt 0 ]]; do
             rolie_feed=1
             shift
             ;;
+        --server-timing)
+            server_timing=1
+            shift
+            ;;
+        --hashes-from-index)
+            hashes_from_index=1
+            shift
+            ;;
+        --signatures)
+            if [[ $# -lt 2 ]]; then
+                echo "Error: --signatures requires one argument: <disk|valid|invalid|missing>"
+                exit 1
+            fi
+            signatures="$2"
+            shift 2
+            ;;
+        --provider)
+            if [[ $# -lt 2 ]]; then
+                echo "Error: --provider requires one argument: <name>"
+                exit 1
+            fi
+            provider="$2"
+            shift 2
+            ;;
         --verify)
             verify=1
             shift
@@ -99,6 +199,18 @@ to_bool() {
     [ "$1" -eq 1 ] && echo true || echo false
 }
 
+to_list() {
+    local items=""
+    local item
+    IFS=',' read -ra parts <<< "$1"
+    for item in "${parts[@]}"; do
+        items="${items:+$items, }\"$item\""
+    done
+    echo "[$items]"
+}
+
+base_url="${SERVER}${provider:+/providers/$provider}"
+
 payload=$(cat <<JSON
 {
     "well_known_meta": $(to_bool "$well_known_meta"),
@@ -109,8 +221,18 @@ payload=$(cat <<JSON
     "root_security_txt": $(to_bool "$root_security_txt"),
     "directory_listing": $(to_bool "$directory_listing"),
     "rolie_feed": $(to_bool "$rolie_feed"),
+    "rolie_feed_split": "$rolie_feed_split",
+    "rolie_feed_page_size": $rolie_feed_page_size,
     "rate_limit_requests": $rate_limit_requests,
-    "rate_limit_period_seconds": $rate_limit_period_seconds
+    "rate_limit_period_seconds": $rate_limit_period_seconds,
+    "rate_limit_algorithm": "$rate_limit_algorithm",
+    "server_timing": $(to_bool "$server_timing"),
+    "hashes_from_index": $(to_bool "$hashes_from_index"),
+    "signatures": "$signatures",
+    "faults": $faults,
+    "public_tlps": $(to_list "$public_tlps"),
+    "basic_auth_users": {$basic_auth_users},
+    "client_cert_sha256": [$client_cert_sha256]
 }
 JSON
 )
@@ -120,7 +242,7 @@ function configure_server() {
         -H "Content-Type: application/json" \
         -d "$payload" \
         --cacert "${CERT_PATH}" \
-        "${SERVER}/config"
+        "${base_url}/config"
 }
 
 configure_server
@@ -138,7 +260,7 @@ function expect_url() {
     if [ "$expect_url_to_exist" -eq 0 ]; then
         expected_code="404"
     fi
-    local actual_code=$(curl --cacert "${CERT_PATH}" -o /dev/null -s -w "%{http_code}" "${SERVER}${path}")
+    local actual_code=$(curl --cacert "${CERT_PATH}" -o /dev/null -s -w "%{http_code}" "${base_url}${path}")
     if [ "$actual_code" -ne "$expected_code" ]; then
         echo "Expected HTTP status code $expected_code for ${path}, but got $actual_code"
         return 1
@@ -152,7 +274,7 @@ function test_rate_limit() {
             return 1
         fi
         local code=0
-        local url="${SERVER}/obscure/path/to/provider-metadata.json"
+        local url="${base_url}/obscure/path/to/provider-metadata.json"
         for i in $(seq 1 $((rate_limit_requests + 1))); do
             local code=$(curl --cacert "${CERT_PATH}" -o /dev/null -s -w "%{http_code}" "${url}")
         done
@@ -181,7 +303,9 @@ expect_url "/.well-known/security.txt" "$well_known_security_txt"
 expect_url "/security.txt" "$root_security_txt"
 expect_url "/some-csaf-base-path/index.txt" "$directory_listing"
 expect_url "/some-csaf-base-path/changes.csv" "$directory_listing"
-expect_url "/some-white-rolie-dir/some-feed.json" "$rolie_feed"
+if [ "$rolie_feed_split" == "none" ]; then
+    expect_url "/some-white-rolie-dir/some-feed.json" "$rolie_feed"
+fi
 
 test_rate_limit
 
@@ -10,7 +10,7 @@ fi
 
 venv_py=$(./scripts/get_python_cmd.sh)
 
-$venv_py -m fake_csaf_provider.main &
+$venv_py -m fake_csaf_provider.main "$@" &
 echo $! > /tmp/fake_csaf_provider.pid
 
 sleep 1
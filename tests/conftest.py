@@ -0,0 +1,61 @@
+import json
+import time
+
+import pytest
+from cryptography.hazmat.primitives.asymmetric import rsa
+
+from fake_csaf_provider import files, signing, state
+from fake_csaf_provider.openpgp import SigningKey
+from fake_csaf_provider.server import app
+
+
+def write_advisory(path, tracking_id: str, label: str = 'WHITE', released: str = '2023-04-13T10:00:00Z'):
+    path.parent.mkdir(parents=True, exist_ok=True)
+    path.write_text(json.dumps({
+        "document": {
+            "distribution": {"tlp": {"label": label}},
+            "tracking": {
+                "id": tracking_id,
+                "current_release_date": released,
+                "initial_release_date": "2023-01-01T00:00:00Z",
+            },
+        },
+    }))
+
+
+@pytest.fixture
+def corpus_dir(tmp_path):
+    """A small corpus laid out like 'csafs/some', with one advisory per TLP directory."""
+    csaf_dir = tmp_path / 'some'
+    for tlp in ('white', 'clear', 'green', 'amber', 'amber+strict', 'red', 'unlabeled'):
+        label = tlp.upper().partition('+')[0]
+        write_advisory(csaf_dir / tlp / '2023' / f'{tlp}-2023-0001.json', f'{label}-2023-0001', label)
+    return csaf_dir
+
+
+@pytest.fixture
+def client(corpus_dir, monkeypatch):
+    """A test client of the server, serving corpus_dir as the directory-tree corpus."""
+    monkeypatch.setattr(files, '_csaf_dir', corpus_dir)
+    monkeypatch.setattr(files, '_signature_cache', None)
+    monkeypatch.setattr(files, '_pack', None)
+    monkeypatch.setattr(files, '_virtual_corpus', None)
+    state.use_providers([])
+    state.initialize_corpus()
+    return app.test_client()
+
+
+@pytest.fixture(scope='session')
+def session_signing_key():
+    return SigningKey(rsa.generate_private_key(public_exponent=65537, key_size=2048), int(time.time()))
+
+
+@pytest.fixture
+def signing_key(session_signing_key, monkeypatch):
+    monkeypatch.setattr(signing, '_key', session_signing_key)
+    return session_signing_key
+
+
+def configure(client, **config):
+    response = client.patch('/config', json=config)
+    assert response.status_code == 200, response.get_json()
@@ -0,0 +1,71 @@
+import base64
+
+import pytest
+
+from conftest import configure
+
+
+def document(tlp: str) -> str:
+    return f'/some-csaf-base-path/{tlp}/2023/{tlp}-2023-0001.json'
+
+
+def basic(user: str, password: str) -> dict:
+    return {'Authorization': 'Basic ' + base64.b64encode(f'{user}:{password}'.encode()).decode()}
+
+
+@pytest.mark.parametrize('tlp', ['clear', 'green'])
+def test_public_tlps_need_no_authorization(client, tlp):
+    configure(client, directory_listing=True, basic_auth_users={'alice': 'secret'})
+
+    assert client.get(document(tlp)).status_code == 200
+    assert client.get('/some-csaf-base-path/2023/white-2023-0001.json').status_code == 200
+
+
+@pytest.mark.parametrize('tlp', ['amber', 'amber+strict', 'red', 'unlabeled'])
+def test_other_tlps_are_forbidden_without_authorized_users(client, tlp):
+    configure(client, directory_listing=True)
+
+    assert client.get(document(tlp)).status_code == 403
+    assert client.get(f'/some-csaf-base-path/{tlp}/index.txt').status_code == 403
+
+
+@pytest.mark.parametrize('tlp', ['amber', 'amber+strict', 'red', 'unlabeled'])
+def test_basic_auth_per_tlp(client, tlp):
+    configure(client, directory_listing=True, rolie_feed=True, basic_auth_users={'alice': 'secret'})
+
+    missing = client.get(document(tlp))
+    assert missing.status_code == 401
+    assert missing.headers['WWW-Authenticate'].startswith('Basic realm=')
+    assert client.get(document(tlp), headers=basic('alice', 'wrong')).status_code == 401
+    assert client.get(document(tlp), headers=basic('mallory', 'secret')).status_code == 401
+    assert client.get(document(tlp), headers=basic('alice', 'secret')).status_code == 200
+    assert client.get(f'/some-csaf-base-path/{tlp}/index.txt', headers=basic('alice', 'secret')).status_code == 200
+    assert client.get(f'/some-{tlp}-rolie-dir/some-feed.json').status_code == 401
+    assert client.get(f'/some-{tlp}-rolie-dir/some-feed.json', headers=basic('alice', 'secret')).status_code == 200
+
+
+def test_public_tlps_can_be_configured(client):
+    configure(client, directory_listing=True, public_tlps=['amber'], basic_auth_users={'alice': 'secret'})
+
+    assert client.get(document('amber')).status_code == 200
+    assert client.get(document('green')).status_code == 401
+
+
+def test_metadata_lists_schema_tlp_labels(client):
+    configure(client, well_known_meta=True, rolie_feed=True)
+
+    metadata = client.get('/.well-known/csaf/provider-metadata.json').get_json()
+    labels = {
+        feed['url'].split('/')[3]: feed['tlp_label']
+        for distribution in metadata['distributions'] for feed in distribution.get('rolie', {}).get('feeds', [])
+    }
+
+    assert labels == {
+        'some-white-rolie-dir': 'WHITE',
+        'some-clear-rolie-dir': 'WHITE',
+        'some-green-rolie-dir': 'GREEN',
+        'some-amber-rolie-dir': 'AMBER',
+        'some-amber+strict-rolie-dir': 'AMBER',
+        'some-red-rolie-dir': 'RED',
+        'some-unlabeled-rolie-dir': 'UNLABELED',
+    }
@@ -0,0 +1,86 @@
+import gzip
+import hashlib
+import json
+
+import pytest
+
+from fake_csaf_provider import cache, state
+from conftest import configure, write_advisory
+
+
+GZIP = {'Accept-Encoding': 'gzip'}
+DOCUMENT = '/some-csaf-base-path/2023/white-2023-0001.json'
+LARGE_DOCUMENT = '/some-csaf-base-path/2023/white-2023-large.json'
+
+
+@pytest.fixture
+def large_corpus(client, corpus_dir):
+    """Adds advisories, one of which large enough to be compressed, and enough for the feed to be compressed."""
+    path = corpus_dir / 'white' / '2023' / 'white-2023-large.json'
+    path.write_text(json.dumps({
+        "document": {
+            "distribution": {"tlp": {"label": "WHITE"}},
+            "notes": [{"category": "summary", "text": "A" * 4096}],
+            "tracking": {"id": "WHITE-2023-LARGE", "current_release_date": "2023-04-13T10:00:00Z",
+                         "initial_release_date": "2023-01-01T00:00:00Z"},
+        },
+    }))
+    for number in range(2, 20):
+        write_advisory(corpus_dir / 'white' / '2023' / f'white-2023-{number:04}.json', f'WHITE-2023-{number:04}')
+    state.initialize_corpus()
+    return path.read_bytes()
+
+
+def test_large_advisory_is_sent_compressed(client, large_corpus):
+    configure(client, directory_listing=True)
+
+    plain = client.get(LARGE_DOCUMENT)
+    compressed = client.get(LARGE_DOCUMENT, headers=GZIP)
+
+    assert 'Content-Encoding' not in plain.headers
+    assert plain.data == large_corpus
+    assert compressed.headers['Content-Encoding'] == 'gzip'
+    assert gzip.decompress(compressed.data) == large_corpus
+    assert len(compressed.data) < len(large_corpus)
+    assert compressed.headers['ETag'] == f'"{hashlib.sha256(large_corpus).hexdigest()}-gzip"'
+    assert 'Accept-Encoding' in compressed.headers['Vary']
+    headers = {**GZIP, 'If-None-Match': compressed.headers['ETag']}
+    assert client.get(LARGE_DOCUMENT, headers=headers).status_code == 304
+    # The compressed variant is cached, and served again unchanged.
+    assert client.get(LARGE_DOCUMENT, headers=GZIP).data == compressed.data
+
+
+def test_small_advisory_is_sent_as_is(client):
+    configure(client, directory_listing=True)
+
+    response = client.get(DOCUMENT, headers=GZIP)
+
+    assert response.status_code == 200
+    assert 'Content-Encoding' not in response.headers
+
+
+def test_cached_feed_is_sent_compressed(client, large_corpus):
+    configure(client, rolie_feed=True)
+    path = '/some-white-rolie-dir/some-feed.json'
+
+    plain = client.get(path)
+    compressed = client.get(path, headers=GZIP)
+
+    assert compressed.headers['Content-Encoding'] == 'gzip'
+    assert gzip.decompress(compressed.data) == plain.data
+    assert compressed.headers['ETag'] != plain.headers['ETag']
+    assert client.get(path, headers={**GZIP, 'If-None-Match': compressed.headers['ETag']}).status_code == 304
+
+
+def test_streamed_listing_is_sent_compressed(client, large_corpus, monkeypatch):
+    monkeypatch.setattr(cache, 'streaming_threshold_entries', 0)
+    configure(client, directory_listing=True)
+    path = '/some-csaf-base-path/index.txt'
+
+    plain = client.get(path)
+    compressed = client.get(path, headers=GZIP)
+
+    assert plain.is_streamed
+    assert compressed.headers['Content-Encoding'] == 'gzip'
+    assert gzip.decompress(compressed.data) == plain.data
+    assert b'2023/white-2023-large.json' in plain.data
@@ -0,0 +1,57 @@
+import pytest
+
+from conftest import configure
+
+
+INDEX = '/some-csaf-base-path/index.txt'
+
+
+@pytest.mark.parametrize('config, error', [
+    ({'directory_listing': True, 'rolie_fed': True}, 'unknown keys: rolie_fed'),
+    ({'directory_listing': 'yes'}, 'invalid directory_listing'),
+    ({'rate_limit_requests': -1}, 'invalid rate_limit_requests'),
+    ({'rate_limit_requests': True}, 'invalid rate_limit_requests'),
+    ({'rate_limit_period_seconds': 1.5}, 'invalid rate_limit_period_seconds'),
+    ({'rate_limit_algorithm': 'fixed_window'}, 'invalid rate_limit_algorithm'),
+    ({'rolie_feed_split': 'month'}, 'invalid rolie_feed_split'),
+    ({'signatures': 'forged'}, 'invalid signatures'),
+    ({'faults': [{'path': '/*', 'error_rate': 2}]}, 'invalid faults'),
+    ({'public_tlps': 'white'}, 'invalid public_tlps'),
+    ({'basic_auth_users': {'a:b': 'secret'}}, 'invalid basic_auth_users'),
+    ({'client_cert_sha256': 'AB:CD'}, 'invalid client_cert_sha256'),
+])
+def test_invalid_config_is_rejected_and_keeps_the_previous_one(client, config, error):
+    configure(client, directory_listing=True)
+
+    response = client.patch('/config', json=config)
+
+    assert response.status_code == 400
+    assert error in response.get_json()['error']
+    assert client.get(INDEX).status_code == 200
+
+
+@pytest.mark.parametrize('body, content_type', [
+    ('directory_listing=true', 'application/x-www-form-urlencoded'),
+    ('[{"directory_listing": true}]', 'application/json'),
+    ('"directory_listing"', 'application/json'),
+])
+def test_config_must_be_a_json_object(client, body, content_type):
+    response = client.patch('/config', data=body, content_type=content_type)
+
+    assert response.status_code == 400
+    assert client.get(INDEX).status_code == 404
+
+
+def test_left_out_keys_are_reset_to_their_defaults(client):
+    configure(client, directory_listing=True)
+    assert client.get(INDEX).status_code == 200
+
+    configure(client, well_known_meta=True)
+
+    assert client.get(INDEX).status_code == 404
+    assert client.get('/.well-known/csaf/provider-metadata.json').status_code == 200
+
+
+def test_config_only_accepts_patch(client):
+    assert client.get('/config').status_code == 405
+    assert client.post('/config', json={}).status_code == 405
@@ -0,0 +1,60 @@
+import hashlib
+import json
+import os
+
+from fake_csaf_provider.corpus import scan_corpus, update_corpus
+
+
+def write_advisory(path, tracking_id: str):
+    path.parent.mkdir(parents=True, exist_ok=True)
+    path.write_text(json.dumps({
+        "document": {
+            "distribution": {"tlp": {"label": "WHITE"}},
+            "tracking": {
+                "id": tracking_id,
+                "current_release_date": "2023-04-13T10:00:00Z",
+                "initial_release_date": "2023-01-01T00:00:00Z",
+            },
+        },
+    }))
+
+
+def test_refresh_drops_advisory_that_no_longer_parses(tmp_path):
+    path = tmp_path / 'white' / '2023' / 'a.json'
+    write_advisory(path, 'A')
+    write_advisory(tmp_path / 'white' / '2023' / 'b.json', 'B')
+    index = scan_corpus(tmp_path, ['white'])
+    assert index.get('white', '2023', 'a.json') is not None
+
+    path.write_text('{"document": ')
+    os.utime(path, (0, 0))
+    updated = update_corpus(index, tmp_path, ['white'])
+
+    assert updated is not None
+    assert updated.get('white', '2023', 'a.json') is None
+    assert updated.get('white', '2023', 'b.json').id == 'B'
+
+
+def test_scan_indexes_malformed_advisories_without_fields(tmp_path):
+    year_dir = tmp_path / 'white' / '2023'
+    write_advisory(year_dir / 'good.json', 'GOOD')
+    (year_dir / 'list.json').write_text('{"document": []}')
+    (year_dir / 'tracking.json').write_text('{"document": {"tracking": "x", "distribution": {"tlp": 1}}}')
+
+    index = scan_corpus(tmp_path, ['white'])
+
+    assert index.get('white', '2023', 'good.json').id == 'GOOD'
+    for filename in ('list.json', 'tracking.json'):
+        entry = index.get('white', '2023', filename)
+        assert entry.id == ''
+        assert entry.current_release_date is None
+        assert entry.tlp_label is None
+
+
+def test_scan_keeps_the_sha256_digest(tmp_path):
+    path = tmp_path / 'white' / '2023' / 'a.json'
+    write_advisory(path, 'A')
+
+    index = scan_corpus(tmp_path, ['white'])
+
+    assert index.get('white', '2023', 'a.json').digest == hashlib.sha256(path.read_bytes()).digest()
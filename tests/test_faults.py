@@ -0,0 +1,66 @@
+import threading
+
+from fake_csaf_provider import faults
+from conftest import configure
+
+
+DOCUMENT = '/some-csaf-base-path/2023/white-2023-0001.json'
+
+
+def rejected_total(client) -> int:
+    for line in client.get('/metrics').text.splitlines():
+        if line.startswith('fake_csaf_faults_rejected_total '):
+            return int(line.split()[1])
+    return 0
+
+
+def test_slowed_requests_beyond_the_limit_are_rejected_visibly(client, monkeypatch):
+    slots = threading.BoundedSemaphore(1)
+    monkeypatch.setattr(faults, '_slow_slots', slots)
+    configure(client, directory_listing=True, faults=[{"path": "/some-csaf-base-path/*", "latency_ms": 1}])
+
+    rejected = rejected_total(client)
+    assert client.get(DOCUMENT).status_code == 200
+    # Another request holds the only slot.
+    slots.acquire()
+    response = client.get(DOCUMENT)
+    slots.release()
+
+    assert response.status_code == 503
+    assert response.headers['Retry-After'] == '1'
+    assert rejected_total(client) == rejected + 1
+    assert client.get(DOCUMENT).status_code == 200
+
+
+def test_admin_paths_are_never_faulted(client):
+    configure(client, directory_listing=True, faults=[{"path": "*", "error_rate": 1, "error_status": 500}])
+
+    assert client.get(DOCUMENT).status_code == 500
+    for path in ('/metrics', '/journal', '/journal/dump'):
+        assert client.get(path).status_code == 200, path
+    configure(client)
+
+
+def test_throttled_body_releases_its_slot_when_closed_unread(monkeypatch):
+    slots = threading.BoundedSemaphore(1)
+    monkeypatch.setattr(faults, '_slow_slots', slots)
+    closed = []
+
+    class Body(list):
+        def close(self):
+            closed.append(True)
+
+    def app(environ, start_response):
+        start_response('200 OK', [('Content-Length', '5')])
+        return Body([b'hello'])
+
+    rules = faults.parse_faults([{"path": "/*", "bandwidth_bytes_per_second": 1000}])
+    middleware = faults.FaultMiddleware(app, lambda environ: rules)
+    body = middleware({'PATH_INFO': '/slow'}, lambda status, headers, exc_info=None: None)
+    assert not slots.acquire(blocking=False)
+
+    # A server that never iterates the body, e.g. because the client went away, still closes it.
+    body.close()
+
+    assert closed == [True]
+    assert slots.acquire(blocking=False)
@@ -0,0 +1,71 @@
+import pytest
+
+from fake_csaf_provider import state
+from conftest import configure, write_advisory
+
+
+FEED = '/some-white-rolie-dir/some-feed.json'
+BASE_URL = 'https://localhost:34443'
+# Newest first, as feeds and changes.csv list them.
+RELEASES = [
+    ('2024', 'WHITE-2024-0002', '2024-03-01T00:00:00Z'),
+    ('2024', 'WHITE-2024-0001', '2024-01-01T00:00:00Z'),
+    ('2023', 'WHITE-2023-0003', '2023-09-01T00:00:00Z'),
+    ('2023', 'WHITE-2023-0002', '2023-06-01T00:00:00Z'),
+    ('2023', 'WHITE-2023-0001', '2023-04-13T10:00:00Z'),
+]
+
+
+@pytest.fixture
+def dated_corpus(client, corpus_dir):
+    for year, tracking_id, released in RELEASES[:-1]:
+        write_advisory(corpus_dir / 'white' / year / f'{tracking_id.lower()}.json', tracking_id, released=released)
+    state.initialize_corpus()
+    return client
+
+
+def ids(feed) -> list[str]:
+    return [entry['id'] for entry in feed['feed']['entry']]
+
+
+def links(feed) -> dict[str, str]:
+    return {link['rel']: link['href'].removeprefix(BASE_URL) for link in feed['feed']['link']}
+
+
+def test_paged_feed(dated_corpus):
+    configure(dated_corpus, rolie_feed=True, rolie_feed_page_size=2)
+
+    pages = [dated_corpus.get(FEED if page == 1 else f'{FEED}?page={page}').get_json() for page in (1, 2, 3)]
+
+    assert [entry for page in pages for entry in ids(page)] == [tracking_id for _, tracking_id, _ in RELEASES]
+    assert links(pages[0]) == {'self': FEED, 'first': FEED, 'last': f'{FEED}?page=3', 'next': f'{FEED}?page=2'}
+    assert links(pages[1])['previous'] == FEED
+    assert links(pages[1])['next'] == f'{FEED}?page=3'
+    assert 'next' not in links(pages[2])
+    for page in ('4', '0', 'x'):
+        assert dated_corpus.get(f'{FEED}?page={page}').status_code == 404
+
+
+def test_feeds_split_by_year(dated_corpus):
+    configure(dated_corpus, rolie_feed=True, rolie_feed_split='year')
+
+    feed = dated_corpus.get('/some-white-rolie-dir/some-feed-2024.json').get_json()
+
+    assert ids(feed) == ['WHITE-2024-0002', 'WHITE-2024-0001']
+    assert dated_corpus.get(FEED).status_code == 404
+    assert dated_corpus.get('/some-white-rolie-dir/some-feed-2022.json').status_code == 404
+
+
+def test_changes_since(dated_corpus):
+    configure(dated_corpus, directory_listing=True)
+    path = '/some-csaf-base-path/changes.csv'
+
+    everything = dated_corpus.get(path).text.splitlines()
+    recent = dated_corpus.get(f'{path}?since=2023-07-01T00:00:00Z').text.splitlines()
+
+    assert len(everything) == len(RELEASES)
+    assert recent == everything[:3]
+    assert recent[0] == '"2024/white-2024-0002.json","2024-03-01T00:00:00+00:00"'
+    # Without a time zone, UTC is assumed.
+    assert dated_corpus.get(f'{path}?since=2024-03-01T00:00:00').text == '\n'
+    assert dated_corpus.get(f'{path}?since=yesterday').status_code == 400
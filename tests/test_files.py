@@ -0,0 +1,62 @@
+import hashlib
+
+from conftest import configure
+
+
+DOCUMENT = '/some-csaf-base-path/2023/white-2023-0001.json'
+
+
+def test_hashes_from_index(client, corpus_dir):
+    configure(client, directory_listing=True, hashes_from_index=True)
+    data = (corpus_dir / 'white' / '2023' / 'white-2023-0001.json').read_bytes()
+
+    sha256 = client.get(f'{DOCUMENT}.sha256')
+    sha512 = client.get(f'{DOCUMENT}.sha512')
+
+    assert sha256.text == f'{hashlib.sha256(data).hexdigest()}  white-2023-0001.json\n'
+    assert sha512.text == f'{hashlib.sha512(data).hexdigest()}  white-2023-0001.json\n'
+    assert client.get(f'{DOCUMENT}.sha512', headers={'If-None-Match': sha512.headers['ETag']}).status_code == 304
+
+
+def test_hash_sidecars_are_not_offered_without_hashes_from_index(client):
+    configure(client, directory_listing=True)
+
+    assert client.get(f'{DOCUMENT}.sha256').status_code == 404
+    assert client.get(f'{DOCUMENT}.sha512').status_code == 404
+
+
+def test_advisory_is_answered_conditionally(client, corpus_dir):
+    configure(client, directory_listing=True)
+    data = (corpus_dir / 'white' / '2023' / 'white-2023-0001.json').read_bytes()
+
+    response = client.get(DOCUMENT)
+
+    assert response.status_code == 200
+    assert response.data == data
+    assert response.headers['ETag'] == f'"{hashlib.sha256(data).hexdigest()}"'
+    assert response.headers['Accept-Ranges'] == 'bytes'
+    for headers in ({'If-None-Match': response.headers['ETag']}, {'If-Modified-Since': response.headers['Last-Modified']}):
+        unchanged = client.get(DOCUMENT, headers=headers)
+        assert unchanged.status_code == 304
+        assert unchanged.data == b''
+        assert unchanged.headers['ETag'] == response.headers['ETag']
+    assert client.get(DOCUMENT, headers={'If-None-Match': '"other"'}).status_code == 200
+
+
+def test_advisory_ranges(client, corpus_dir):
+    configure(client, directory_listing=True)
+    data = (corpus_dir / 'white' / '2023' / 'white-2023-0001.json').read_bytes()
+
+    response = client.get(DOCUMENT, headers={'Range': 'bytes=0-9'})
+    tail = client.get(DOCUMENT, headers={'Range': 'bytes=-5'})
+
+    assert response.status_code == 206
+    assert response.data == data[:10]
+    assert response.headers['Content-Range'] == f'bytes 0-9/{len(data)}'
+    assert tail.status_code == 206
+    assert tail.data == data[-5:]
+    assert client.get(DOCUMENT, headers={'Range': f'bytes={len(data)}-'}).status_code == 416
+    # A range of an advisory that changed since is answered with all of it.
+    stale = client.get(DOCUMENT, headers={'Range': 'bytes=0-9', 'If-Range': '"other"'})
+    assert stale.status_code == 200
+    assert stale.data == data
@@ -0,0 +1,131 @@
+import argparse
+import asyncio
+
+import pytest
+
+from fake_csaf_provider import journal, replay
+from fake_csaf_provider.journal import Journal, JournalRecord, decode, encode, summarize
+from conftest import configure
+
+
+DOCUMENT = '/some-csaf-base-path/2023/white-2023-0001.json'
+
+
+def record(time: float, client: str = '10.0.0.1', document: str = 'white/2023/a.json', status: int = 200,
+           base_url: str = 'https://localhost:34443', method: str = 'GET') -> JournalRecord:
+    path = f'/some-csaf-base-path/{document.partition("/")[2]}' if document else '/some-csaf-base-path/index.txt'
+    route = '/some-csaf-base-path/<year>/<filename>' if document else '/some-csaf-base-path/index.txt'
+    return JournalRecord(time, 0.001, client, 'default', base_url, method, path, route, document, status, 100)
+
+
+@pytest.fixture
+def journal_client(client, monkeypatch):
+    monkeypatch.setattr(journal, '_journal', Journal(16))
+    monkeypatch.setattr(journal, '_journal_dir', None)
+    return client
+
+
+def test_ring_keeps_the_last_records():
+    ring = Journal(3)
+    for time in range(5):
+        ring.append(record(float(time)))
+
+    recorded, records = ring.snapshot()
+
+    assert recorded == 5
+    assert [r.time for r in records] == [2.0, 3.0, 4.0]
+
+
+def test_encode_round_trip():
+    records = [record(1.0), record(2.5, client='10.0.0.2', document='', status=304), record(3.0, document='white/2023/ä.json')]
+
+    recorded, decoded = decode(encode(7, records))
+
+    assert recorded == 7
+    assert [r._replace(latency=pytest.approx(r.latency)) for r in decoded] == records
+
+
+def test_decode_rejects_other_files():
+    with pytest.raises(ValueError):
+        decode(b'CSAFPACK' + bytes(28))
+
+
+def test_summary_counts_downloads_and_coverage():
+    records = [
+        record(1.0, document='white/2023/a.json'),
+        record(2.0, document='white/2023/a.json'),
+        record(3.0, document='white/2023/b.json', status=304),
+        record(4.0, document='white/2023/c.json', status=404),
+        record(5.0, client='10.0.0.2', document=''),
+    ]
+
+    first, second = summarize(records, corpus_size=4)
+
+    assert first['client'] == '10.0.0.1'
+    assert (first['requests'], first['bytes'], first['errors']) == (4, 400, 1)
+    assert (first['downloads'], first['duplicate_downloads'], first['documents']) == (2, 1, 2)
+    assert first['coverage'] == 0.5
+    assert (first['first'], first['last']) == (1.0, 4.0)
+    assert (second['requests'], second['documents'], second['coverage']) == (1, 0, 0.0)
+
+
+def test_server_journals_requests_per_client(journal_client):
+    configure(journal_client, directory_listing=True)
+    crawler = {'X-Forwarded-For': '192.0.2.1'}
+    for _ in range(2):
+        journal_client.get(DOCUMENT, headers=crawler)
+    journal_client.get('/some-csaf-base-path/index.txt', headers=crawler)
+    journal_client.get(DOCUMENT)
+
+    summary = journal_client.get('/journal?client=192.0.2.1').get_json()
+    recorded, records = decode(journal_client.get('/journal/dump').data)
+
+    (crawled,) = summary['clients']
+    assert (crawled['requests'], crawled['downloads'], crawled['duplicate_downloads']) == (3, 2, 1)
+    assert crawled['coverage'] == round(1 / summary['corpus_documents'], 6)
+    # The configuration counts, the journal's own endpoints do not.
+    assert recorded == summary['recorded'] == 5
+    assert [r.path for r in records][1:] == [DOCUMENT, DOCUMENT, '/some-csaf-base-path/index.txt', DOCUMENT]
+    assert records[1].document == 'white/2023/white-2023-0001.json'
+    assert records[3].size == len(journal_client.get('/some-csaf-base-path/index.txt').data)
+
+
+def test_disabled_journal(client, monkeypatch):
+    monkeypatch.setattr(journal, '_journal', None)
+
+    assert client.get('/journal').status_code == 404
+    assert client.get('/journal/dump').status_code == 404
+
+
+def test_replay_reissues_requests_per_provider_and_client(monkeypatch):
+    issued = []
+
+    class Connection:
+        def __init__(self, host, port, ssl_context, host_header=None):
+            self.host_header = host_header
+
+        async def request(self, method, path, headers=None):
+            issued.append((self.host_header, method, path, headers))
+            return 200, {}, b'{}'
+
+        def close(self):
+            pass
+
+    monkeypatch.setattr(replay, 'Connection', Connection)
+    records = [
+        record(10.0, client='192.0.2.1'),
+        record(10.0, client='192.0.2.2', base_url='https://alpha.providers.localhost:34443', status=404),
+        record(10.1, client='192.0.2.1', base_url='https://localhost:34443/providers/beta', method='HEAD'),
+    ]
+    args = argparse.Namespace(speed=0, concurrency=4, host='127.0.0.1', port=34443, anonymous=False)
+
+    result = asyncio.run(replay.replay(records, args, None))
+
+    assert result['requests'] == 3
+    assert result['statuses'] == {'200': 3}
+    assert result['same_status'] == 2
+    assert sorted(issued) == [
+        ('alpha.providers.localhost:34443', 'GET', '/some-csaf-base-path/2023/a.json', {'X-Forwarded-For': '192.0.2.2'}),
+        ('localhost:34443', 'GET', '/some-csaf-base-path/2023/a.json', {'X-Forwarded-For': '192.0.2.1'}),
+        ('localhost:34443', 'HEAD', '/providers/beta/some-csaf-base-path/2023/a.json', {'X-Forwarded-For': '192.0.2.1'}),
+    ]
@@ -0,0 +1,66 @@
+import shutil
+
+import pytest
+
+from fake_csaf_provider import state
+from fake_csaf_provider.corpus import find_tlps, scan_corpus
+from fake_csaf_provider.pack import Pack, build_pack
+from conftest import configure
+
+
+DOCUMENT = '/some-csaf-base-path/2023/white-2023-0001.json'
+
+
+@pytest.fixture
+def pack_path(corpus_dir, tmp_path):
+    (corpus_dir / 'white' / '2023' / 'white-2023-0001.json.sha256').write_text('0' * 64 + '  white-2023-0001.json\n')
+    path = tmp_path / 'some.pack'
+    build_pack(corpus_dir, path)
+    return path
+
+
+def test_pack_round_trip(corpus_dir, pack_path):
+    scanned = scan_corpus(corpus_dir, find_tlps(corpus_dir))
+    pack = Pack(pack_path)
+
+    index = pack.index()
+
+    assert len(index) == len(scanned)
+    for tlp in scanned.tlps():
+        for expected in scanned.entries(tlp):
+            entry = index.get(*expected.key)
+            for field in ('id', 'current_release_date', 'initial_release_date', 'tlp_label', 'mtime', 'size', 'digest',
+                          'asc', 'sha256', 'sha512'):
+                assert getattr(entry, field) == getattr(expected, field), (expected.key, field)
+            assert pack.read(entry) == (corpus_dir / expected.relative_path).read_bytes()
+    entry = index.get('white', '2023', 'white-2023-0001.json')
+    assert pack.read(entry, '.sha256') == (corpus_dir / 'white' / '2023' / 'white-2023-0001.json.sha256').read_bytes()
+
+
+def test_pack_of_another_version_is_rejected(pack_path):
+    with open(pack_path, 'r+b') as f:
+        f.seek(8)
+        f.write(b'\xff')
+
+    with pytest.raises(ValueError, match='rebuild it'):
+        Pack(pack_path)
+
+
+def test_server_serves_the_pack_without_the_directory_tree(client, corpus_dir, pack_path):
+    data = (corpus_dir / 'white' / '2023' / 'white-2023-0001.json').read_bytes()
+    sidecar = (corpus_dir / 'white' / '2023' / 'white-2023-0001.json.sha256').read_bytes()
+    configure(client, directory_listing=True)
+    tree_etag = client.get(DOCUMENT).headers['ETag']
+    shutil.rmtree(corpus_dir)
+
+    state.initialize_pack(Pack(pack_path))
+
+    response = client.get(DOCUMENT)
+    assert response.status_code == 200
+    assert response.data == data
+    assert response.headers['ETag'] == tree_etag
+    assert client.get(DOCUMENT, headers={'If-None-Match': tree_etag}).status_code == 304
+    assert client.get(DOCUMENT, headers={'Range': 'bytes=2-5'}).data == data[2:6]
+    assert client.get(f'{DOCUMENT}.sha256').data == sidecar
+    assert client.get(f'{DOCUMENT}.sha512').status_code == 404
+    assert b'2023/white-2023-0001.json' in client.get('/some-csaf-base-path/index.txt').data
@@ -0,0 +1,64 @@
+import pytest
+
+from fake_csaf_provider import state
+from fake_csaf_provider.providers import validate_provider_name
+
+
+INDEX = '/some-csaf-base-path/index.txt'
+METADATA = '/.well-known/csaf/provider-metadata.json'
+ALPHA_HOST = {'Host': 'alpha.providers.localhost:34443'}
+
+
+@pytest.fixture
+def providers(client):
+    state.use_providers(['alpha', 'beta'])
+    return client
+
+
+@pytest.mark.parametrize('name', ['default', 'Alpha', '-alpha', 'alpha_beta', 'a' * 64, ''])
+def test_invalid_provider_names(name):
+    with pytest.raises(ValueError):
+        validate_provider_name(name)
+
+
+def test_each_provider_has_its_own_config(providers):
+    response = providers.patch('/providers/alpha/config', json={'directory_listing': True})
+    assert response.status_code == 200
+
+    assert providers.get(f'/providers/alpha{INDEX}').status_code == 200
+    assert providers.get(INDEX, headers=ALPHA_HOST).status_code == 200
+    assert providers.get(INDEX).status_code == 404
+    assert providers.get(f'/providers/beta{INDEX}').status_code == 404
+
+
+def test_unknown_provider(providers):
+    response = providers.get(f'/providers/gamma{INDEX}')
+
+    assert response.status_code == 404
+    assert response.get_json() == {'error': 'Unknown provider'}
+    # An unknown host falls back to the default provider.
+    assert providers.get(METADATA, headers={'Host': 'gamma.providers.localhost:34443'}).status_code == 404
+
+
+def test_metadata_links_to_the_provider(providers):
+    assert providers.patch('/config', json={'well_known_meta': True}, headers=ALPHA_HOST).status_code == 200
+    assert providers.patch('/config', json={'well_known_meta': True}).status_code == 200
+
+    by_path = providers.get(f'/providers/alpha{METADATA}').get_json()
+    by_host = providers.get(METADATA, headers=ALPHA_HOST).get_json()
+    default = providers.get(METADATA).get_json()
+
+    assert by_path['canonical_url'].startswith('https://localhost:34443/providers/alpha/')
+    assert by_host['canonical_url'].startswith('https://alpha.providers.localhost:34443/')
+    assert default['canonical_url'].startswith('https://localhost:34443/')
+    assert '/providers/' not in default['canonical_url']
+
+
+def test_each_provider_has_its_own_rate_limit(providers):
+    config = {'directory_listing': True, 'rate_limit_requests': 1, 'rate_limit_period_seconds': 60}
+    for prefix in ('', '/providers/alpha'):
+        assert providers.patch(f'{prefix}/config', json=config).status_code == 200
+
+    assert providers.get(f'/providers/alpha{INDEX}').status_code == 200
+    assert providers.get(f'/providers/alpha{INDEX}').status_code == 429
+    assert providers.get(INDEX).status_code == 200
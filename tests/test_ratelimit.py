@@ -0,0 +1,107 @@
+import pytest
+
+from fake_csaf_provider.backends import InMemoryBackend, SharedBackend
+from fake_csaf_provider.ratelimit import ALGORITHMS, RateLimitStore, sliding_log, sliding_window, token_bucket
+from conftest import configure
+
+
+LIMIT = 3
+PERIOD = 10.0
+# The start of a fixed window, so that sliding_window's estimate does not depend on where in its window it starts.
+START = 1000.0
+
+
+def hits(algorithm, times, state=None):
+    allowed = []
+    for now in times:
+        state, ok, remaining, reset = algorithm(state, now, LIMIT, PERIOD)
+        allowed.append(ok)
+    return allowed, state
+
+
+@pytest.mark.parametrize('algorithm', ALGORITHMS.values())
+def test_exactly_the_limit_is_allowed(algorithm):
+    state = None
+    for expected_remaining in range(LIMIT - 1, -1, -1):
+        state, allowed, remaining, reset = algorithm(state, START, LIMIT, PERIOD)
+        assert allowed
+        assert remaining == expected_remaining
+        assert START < reset <= START + PERIOD
+
+    state, allowed, remaining, reset = algorithm(state, START, LIMIT, PERIOD)
+
+    assert not allowed
+    assert remaining == 0
+
+
+def test_sliding_log_frees_a_request_exactly_one_period_later():
+    allowed, state = hits(sliding_log, [START, START + 1, START + 2, START + 3])
+    assert allowed == [True, True, True, False]
+
+    allowed, _ = hits(sliding_log, [START + PERIOD - 0.001, START + PERIOD, START + PERIOD], state)
+
+    assert allowed == [False, True, False]
+
+
+def test_sliding_window_weighs_the_previous_window():
+    allowed, state = hits(sliding_window, [START] * LIMIT)
+    assert allowed == [True] * LIMIT
+
+    # The previous window still counts fully at the start of the next one, and half of it halfway through.
+    assert hits(sliding_window, [START + PERIOD], state)[0] == [False]
+    assert hits(sliding_window, [START + PERIOD * 1.5], state)[0] == [True]
+    assert hits(sliding_window, [START + PERIOD * 1.5] * 2, state)[0] == [True, False]
+    # Two windows later, the old requests are forgotten.
+    assert hits(sliding_window, [START + PERIOD * 2] * (LIMIT + 1), state)[0] == [True] * LIMIT + [False]
+
+
+def test_token_bucket_refills_at_the_limit_per_period():
+    allowed, state = hits(token_bucket, [START] * (LIMIT + 1))
+    assert allowed == [True] * LIMIT + [False]
+
+    refill = PERIOD / LIMIT
+    allowed, _ = hits(token_bucket, [START + refill * 0.99, START + refill, START + refill], state)
+
+    assert allowed == [False, True, False]
+
+
+def test_store_forgets_clients_idle_for_a_period():
+    store = RateLimitStore()
+    for client in range(100):
+        store.hit(str(client), sliding_log, START, LIMIT, PERIOD)
+    assert len(store) == 100
+
+    store.hit('late', sliding_log, START + PERIOD, LIMIT, PERIOD)
+
+    assert len(store) == 1
+
+
+@pytest.mark.parametrize('name', ALGORITHMS)
+@pytest.mark.parametrize('make_backend', [lambda tmp_path: InMemoryBackend(),
+                                          lambda tmp_path: SharedBackend(tmp_path / 'state.sqlite')],
+                         ids=['memory', 'shared'])
+def test_backends_keep_the_limit(name, make_backend, tmp_path):
+    backend = make_backend(tmp_path)
+    algorithm = ALGORITHMS[name]
+
+    allowed = [backend.hit_rate_limit('client', algorithm, START, LIMIT, PERIOD)[0] for _ in range(LIMIT + 1)]
+
+    assert allowed == [True] * LIMIT + [False]
+    assert backend.hit_rate_limit('other', algorithm, START, LIMIT, PERIOD)[0]
+    backend.clear_rate_limits()
+    assert backend.hit_rate_limit('client', algorithm, START, LIMIT, PERIOD)[0]
+
+
+@pytest.mark.parametrize('name', ALGORITHMS)
+def test_requests_beyond_the_limit_are_answered_with_429(client, name):
+    configure(client, directory_listing=True, rate_limit_requests=LIMIT, rate_limit_period_seconds=60,
+              rate_limit_algorithm=name)
+
+    responses = [client.get('/some-csaf-base-path/index.txt') for _ in range(LIMIT + 1)]
+
+    assert [response.status_code for response in responses] == [200] * LIMIT + [429]
+    assert responses[0].headers['X-RateLimit-Limit'] == str(LIMIT)
+    assert responses[LIMIT - 1].headers['X-RateLimit-Remaining'] == '0'
+    assert responses[LIMIT].headers['Retry-After'] == '60'
+    for path in ('/metrics', '/journal'):
+        assert client.get(path).status_code == 200, path
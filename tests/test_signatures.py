@@ -0,0 +1,117 @@
+import hashlib
+import struct
+
+from cryptography.hazmat.primitives import hashes
+from cryptography.hazmat.primitives.asymmetric import padding
+from cryptography.hazmat.primitives.asymmetric.utils import Prehashed
+
+from fake_csaf_provider.openpgp import dearmor
+from conftest import configure
+
+
+DOCUMENT = '/some-csaf-base-path/2023/white-2023-0001.json'
+
+
+def verifies(key, armored: bytes, data: bytes) -> bool:
+    """Check a detached v4 signature packet as an OpenPGP implementation would, RFC 4880, section 5.2.4."""
+    packet = dearmor(armored)
+    assert packet[0] == 0xC0 | 2
+    body = packet[2:] if packet[1] < 192 else packet[3:]
+    (hashed_length,) = struct.unpack('>H', body[4:6])
+    head = body[:6 + hashed_length]
+    rest = body[6 + hashed_length:]
+    (unhashed_length,) = struct.unpack('>H', rest[:2])
+    rest = rest[2 + unhashed_length:]
+    digest = hashlib.sha512(data + head + b'\x04\xff' + struct.pack('>I', len(head))).digest()
+    if rest[:2] != digest[:2]:
+        return False
+    signature = rest[4:].rjust(key.private_key.key_size // 8, b'\x00')
+    try:
+        key.private_key.public_key().verify(signature, digest, padding.PKCS1v15(), Prehashed(hashes.SHA512()))
+    except Exception:
+        return False
+    return True
+
+
+def test_valid_signature_of_directory_tree_advisory(client, corpus_dir, signing_key):
+    configure(client, directory_listing=True, signatures='valid')
+
+    response = client.get(f'{DOCUMENT}.asc')
+
+    assert response.status_code == 200
+    assert response.mimetype == 'application/pgp-signature'
+    assert verifies(signing_key, response.data, (corpus_dir / 'white' / '2023' / 'white-2023-0001.json').read_bytes())
+    # Served from the signature cache the second time.
+    assert client.get(f'{DOCUMENT}.asc').data == response.data
+
+
+def test_invalid_signature_does_not_verify(client, corpus_dir, signing_key):
+    configure(client, directory_listing=True, signatures='invalid')
+
+    response = client.get(f'{DOCUMENT}.asc')
+
+    assert response.status_code == 200
+    assert not verifies(signing_key, response.data, (corpus_dir / 'white' / '2023' / 'white-2023-0001.json').read_bytes())
+
+
+def test_missing_signatures(client, signing_key):
+    configure(client, directory_listing=True, signatures='missing')
+
+    assert client.get(f'{DOCUMENT}.asc').status_code == 404
+    assert client.get(DOCUMENT).status_code == 200
+
+
+def test_signatures_need_a_key(client, monkeypatch):
+    from fake_csaf_provider import signing
+    monkeypatch.setattr(signing, '_key', None)
+    monkeypatch.setattr(signing, 'private_key_path', signing.crypto_dir / 'does-not-exist.pem')
+
+    response = client.patch('/config', json={'signatures': 'valid'})
+
+    assert response.status_code == 400
+
+
+def test_generated_advisories_are_signed_on_request_only(client, signing_key, tmp_path, monkeypatch):
+    from fake_csaf_provider import files, state
+    from fake_csaf_provider.generate import VirtualCorpus
+    monkeypatch.setattr(files.tempfile, 'gettempdir', lambda: str(tmp_path))
+    virtual_corpus = VirtualCorpus(3)
+    state.initialize_virtual_corpus(virtual_corpus)
+    entry = files.get_corpus_index().entries('white')[0]
+    path = f'/some-csaf-base-path/{entry.year}/{entry.filename}'
+
+    configure(client, directory_listing=True)
+    assert client.get(f'{path}.sha256').status_code == 200
+    assert client.get(f'{path}.asc').status_code == 404
+
+    configure(client, directory_listing=True, signatures='valid')
+    response = client.get(f'{path}.asc')
+    assert response.status_code == 200
+    assert verifies(signing_key, response.data, virtual_corpus.read(entry))
+
+
+def test_no_signature_is_offered_without_a_digest(client, signing_key):
+    from fake_csaf_provider import files
+    files.get_corpus_index().get('white', '2023', 'white-2023-0001.json').digest = None
+    configure(client, directory_listing=True, rolie_feed=True, signatures='valid')
+
+    assert client.get(f'{DOCUMENT}.asc').status_code == 404
+    feed = client.get('/some-white-rolie-dir/some-feed.json').text
+    assert 'white-2023-0001.json.asc' not in feed
+    assert 'white-2023-0001.json' in feed
+
+
+def test_sidecars_sign_writes_signatures_that_are_served(client, corpus_dir, signing_key):
+    from fake_csaf_provider.sidecars import write_sidecars
+    advisories = sorted(corpus_dir.glob('*/*/*.json'))
+
+    written, skipped = write_sidecars(sign=True)
+
+    assert (written, skipped) == (3 * len(advisories), 0)
+    for path in advisories:
+        assert verifies(signing_key, path.with_name(f'{path.name}.asc').read_bytes(), path.read_bytes())
+    assert write_sidecars(sign=True) == (0, 3 * len(advisories))
+
+    configure(client, directory_listing=True)
+    path = corpus_dir / 'white' / '2023' / 'white-2023-0001.json.asc'
+    assert client.get(f'{DOCUMENT}.asc').data == path.read_bytes()